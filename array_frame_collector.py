@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import numpy as np
+from ppo.config import Config
+from ppo.gae import compute_gae
+
+
+# Fields of one frame in Config.DATA_SPLIT_SHAPE order, the sample layout of NumpyData2SampleData in definition.py:
+# feature + legal_action, reward_sum, advantage, action x 6, prob x 6, is_train, sub_action x 6, lstm_cell, lstm_hidden
+# 单帧各字段按Config.DATA_SPLIT_SHAPE的顺序排列，即definition.py中NumpyData2SampleData的样本布局
+FEATURE_INDEX = 0
+REWARD_SUM_INDEX = 1
+ADVANTAGE_INDEX = 2
+ACTION_INDEX = 3
+PROB_INDEX = 9
+IS_TRAIN_INDEX = 15
+SUB_ACTION_INDEX = 16
+LSTM_CELL_INDEX = 22
+LSTM_HIDDEN_INDEX = 23
+
+# Offset of each field in a sample row, a field holds LSTM_TIME_STEPS frames except the lstm state of the segment
+# 各字段在样本行中的偏移，除分段的lstm状态外每个字段包含LSTM_TIME_STEPS帧
+SPLIT_WIDTHS = Config.DATA_SPLIT_SHAPE
+SPLIT_SIZES = [shape[0] for shape in Config.data_shapes]
+SPLIT_OFFSETS = np.cumsum([0] + SPLIT_SIZES[:-1]).tolist()
+FRAME_DIM = sum(SPLIT_WIDTHS[:LSTM_CELL_INDEX])
+
+
+# Positions in the sample row of the FRAME_DIM values of the frame at each step of a segment
+# 分段中每一步的帧的FRAME_DIM个值在样本行中的位置
+def _frame_positions():
+    positions = np.empty((Config.LSTM_TIME_STEPS, FRAME_DIM), dtype=np.int64)
+    for step in range(Config.LSTM_TIME_STEPS):
+        parts = [
+            np.arange(SPLIT_OFFSETS[j] + step * SPLIT_WIDTHS[j], SPLIT_OFFSETS[j] + (step + 1) * SPLIT_WIDTHS[j])
+            for j in range(LSTM_CELL_INDEX)
+        ]
+        positions[step] = np.concatenate(parts)
+    return positions
+
+
+FRAME_POSITIONS = _frame_positions()
+
+# Bound of the reward a frame passes to the frame before it, the one of FrameCollector._clip_reward
+# 每帧传给上一帧的reward的上下界，与FrameCollector._clip_reward相同
+REWARD_CLIP = 100.0
+
+
+def clip_reward(reward):
+    return min(max(reward, -REWARD_CLIP), REWARD_CLIP)
+
+
+# FrameCollector backend writing every frame straight into a preallocated float32 buffer of sample rows per agent.
+# Row s of the buffer is the Config.SAMPLE_DIM sample of frames [s * LSTM_TIME_STEPS, (s + 1) * LSTM_TIME_STEPS),
+# so sample_process returns views of the buffer without copying. Buffers grow by doubling and are kept across reset.
+# Like FrameCollector, the reward of a frame is the clipped reward of the next frame, 0 for the newest frame, and
+# save_last_frame sets the reward of the last one as it is.
+# 每个智能体一个预分配的float32样本行缓冲区，每帧直接写入缓冲区的FrameCollector后端。
+# 缓冲区第s行即第[s * LSTM_TIME_STEPS, (s + 1) * LSTM_TIME_STEPS)帧组成的Config.SAMPLE_DIM维样本，sample_process直接返回缓冲区的视图。
+# 缓冲区按倍数增长，reset时保留。与FrameCollector一样，每帧的reward为下一帧裁剪后的reward，最新一帧为0，
+# save_last_frame将最后一帧的reward直接设置为给定值
+class ArrayFrameCollector:
+    def __init__(self, num_agents, init_segments=64):
+        self.init_segments = init_segments
+        self.rows = []
+        self.values = []
+        self.reset(num_agents)
+
+    def reset(self, num_agents):
+        self.num_agents = num_agents
+        while len(self.rows) < num_agents:
+            self.rows.append(np.zeros((self.init_segments, Config.SAMPLE_DIM), dtype=np.float32))
+            self.values.append(np.zeros(self.init_segments * Config.LSTM_TIME_STEPS, dtype=np.float32))
+        self.frame_cnts = [0] * num_agents
+
+    def __len__(self):
+        return max(self.frame_cnts)
+
+    def _grow(self, agent_id):
+        rows, values = self.rows[agent_id], self.values[agent_id]
+        new_rows = np.zeros((2 * len(rows), Config.SAMPLE_DIM), dtype=np.float32)
+        new_rows[: len(rows)] = rows
+        new_values = np.zeros(2 * len(values), dtype=np.float32)
+        new_values[: len(values)] = values
+        self.rows[agent_id], self.values[agent_id] = new_rows, new_values
+
+    def save_frame(self, frame, agent_id):
+        frame_cnt = self.frame_cnts[agent_id]
+        segment, step = divmod(frame_cnt, Config.LSTM_TIME_STEPS)
+        if segment >= len(self.rows[agent_id]):
+            self._grow(agent_id)
+        row = self.rows[agent_id][segment]
+        row[FRAME_POSITIONS[step]] = np.concatenate(
+            [
+                np.asarray(frame.feature, dtype=np.float32).reshape(-1),
+                np.asarray(frame.legal_action, dtype=np.float32).reshape(-1),
+                (0.0, 0.0),
+                np.asarray(frame.action, dtype=np.float32).reshape(-1),
+                np.asarray(frame.prob, dtype=np.float32).reshape(-1),
+                (frame.is_train,),
+                np.asarray(frame.sub_action, dtype=np.float32).reshape(-1),
+            ]
+        )
+        if step == 0:
+            lstm_offset = SPLIT_OFFSETS[LSTM_CELL_INDEX]
+            row[lstm_offset : lstm_offset + SPLIT_SIZES[LSTM_CELL_INDEX]] = np.reshape(frame.lstm_cell, -1)
+            lstm_offset = SPLIT_OFFSETS[LSTM_HIDDEN_INDEX]
+            row[lstm_offset : lstm_offset + SPLIT_SIZES[LSTM_HIDDEN_INDEX]] = np.reshape(frame.lstm_hidden, -1)
+        self.values[agent_id][frame_cnt] = frame.value
+        # The previous frame takes the clipped reward of this frame
+        # 上一帧使用本帧裁剪后的reward
+        if frame_cnt > 0:
+            self._set_reward(agent_id, frame_cnt - 1, clip_reward(frame.reward))
+        self.frame_cnts[agent_id] = frame_cnt + 1
+
+    def _set_reward(self, agent_id, frame_idx, reward):
+        segment, step = divmod(frame_idx, Config.LSTM_TIME_STEPS)
+        self.rows[agent_id][segment, SPLIT_OFFSETS[REWARD_SUM_INDEX] + step] = reward
+
+    def _get_reward(self, agent_id, frame_idx):
+        segment, step = divmod(frame_idx, Config.LSTM_TIME_STEPS)
+        return self.rows[agent_id][segment, SPLIT_OFFSETS[REWARD_SUM_INDEX] + step]
+
+    def save_last_frame(self, reward, agent_id):
+        if self.frame_cnts[agent_id] > 0:
+            self._set_reward(agent_id, self.frame_cnts[agent_id] - 1, reward)
+
+    # Frames are only appended until reset, so the frame count of each agent is enough to go back to this point
+    # reset之前帧只会追加，每个智能体的帧数即可恢复到此时的状态
+    def snapshot(self):
+        return tuple(self.frame_cnts)
+
+    # Drop the frames saved after snapshot, the reward of its last frame is set again by the next save_frame.
+    # Returns False when the frames of snapshot are no longer there
+    # 丢弃snapshot之后保存的帧，其最后一帧的reward由下一次save_frame重新设置。snapshot的帧已不存在时返回False
+    def restore(self, frame_cnts):
+        if any(frame_cnt > cur_cnt for frame_cnt, cur_cnt in zip(frame_cnts, self.frame_cnts)):
+            return False
+        self.frame_cnts = list(frame_cnts)
+        return True
+
+    # End the episode early at the frame before the last one, whose reward becomes the reward of the last frame
+    # plus GAMMA times its value so GAE bootstraps from that value. Returns whether any frame is left
+    # 在倒数第二帧提前结束对局，其reward改为最后一帧的reward加上GAMMA乘以最后一帧的value，GAE由该value自举。返回是否还有剩余的帧
+    def truncate(self):
+        for agent_id, frame_cnt in enumerate(self.frame_cnts):
+            if frame_cnt >= 2:
+                reward = self._get_reward(agent_id, frame_cnt - 2) + Config.GAMMA * self.values[agent_id][frame_cnt - 1]
+                self._set_reward(agent_id, frame_cnt - 2, reward)
+            self.frame_cnts[agent_id] = max(frame_cnt - 1, 0)
+        return len(self) > 0
+
+    # Column of one per frame field over the first segment_num rows, in frame order
+    # 前segment_num行中单帧宽度为1的字段，按帧顺序排列
+    def _column(self, agent_id, split_index, segment_num):
+        offset = SPLIT_OFFSETS[split_index]
+        return self.rows[agent_id][:segment_num, offset : offset + Config.LSTM_TIME_STEPS]
+
+    # GAE over the frames of all agents at once, then the full segments as views of the buffer, the last partial one is dropped.
+    # Agents are padded to the longest one, the last frame of each agent is done so the padding does not leak into it
+    # 同时计算所有智能体所有帧的GAE，然后以缓冲区视图的形式返回完整的分段，最后不完整的分段被丢弃。
+    # 各智能体补齐到最长的帧数，每个智能体的最后一帧标记为done，补齐部分不会影响其结果
+    def sample_process(self):
+        frame_num = len(self)
+        rewards = np.zeros((self.num_agents, frame_num))
+        values = np.zeros((self.num_agents, frame_num))
+        dones = np.zeros((self.num_agents, frame_num), dtype=bool)
+        for agent_id in range(self.num_agents):
+            frame_cnt = self.frame_cnts[agent_id]
+            if frame_cnt == 0:
+                continue
+            segment_num = -(-frame_cnt // Config.LSTM_TIME_STEPS)
+            rewards[agent_id, :frame_cnt] = self._column(agent_id, REWARD_SUM_INDEX, segment_num).reshape(-1)[:frame_cnt]
+            values[agent_id, :frame_cnt] = self.values[agent_id][:frame_cnt]
+            dones[agent_id, frame_cnt - 1] = True
+        advantages, returns = compute_gae(rewards, values, dones)
+
+        list_agents_samples = []
+        for agent_id in range(self.num_agents):
+            frame_cnt = self.frame_cnts[agent_id]
+            if frame_cnt == 0:
+                list_agents_samples.append([])
+                continue
+            segment_num = -(-frame_cnt // Config.LSTM_TIME_STEPS)
+            padded = np.zeros(segment_num * Config.LSTM_TIME_STEPS)
+            padded[:frame_cnt] = returns[agent_id, :frame_cnt]
+            self._column(agent_id, REWARD_SUM_INDEX, segment_num)[:] = padded.reshape(segment_num, -1)
+            padded[:frame_cnt] = advantages[agent_id, :frame_cnt]
+            self._column(agent_id, ADVANTAGE_INDEX, segment_num)[:] = padded.reshape(segment_num, -1)
+
+            full_segment_num = frame_cnt // Config.LSTM_TIME_STEPS
+            list_agents_samples.append([self.rows[agent_id][s] for s in range(full_segment_num)])
+        return list_agents_samples
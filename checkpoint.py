@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import copy
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+
+# Checkpoint files are named like the ones of agent.save_model, CHECKPOINT_PREFIX, the checkpoint id and ".pkl", so
+# agent.load_model(path=checkpoint_dir, id=checkpoint_id) loads them. Ids are "<milliseconds>-<pid>" so the saves of
+# several actor processes sharing checkpoint_dir never overwrite each other
+# checkpoint文件与agent.save_model的命名相同，为CHECKPOINT_PREFIX加checkpoint id和".pkl"，
+# agent.load_model(path=checkpoint_dir, id=checkpoint_id)可以加载。id为"<毫秒>-<pid>"，共享checkpoint_dir的多个actor进程的保存不会互相覆盖
+CHECKPOINT_PREFIX = "model.ckpt-"
+TMP_DIR_PREFIX = ".tmp-"
+
+
+# Write a state_dict the way agent.save_model does
+# 与agent.save_model相同的方式写入state_dict
+def torch_save(state_dict, path):
+    import torch
+
+    torch.save(state_dict, path)
+
+
+def checkpoint_id_of(file_name):
+    if not file_name.startswith(CHECKPOINT_PREFIX):
+        return None
+    checkpoint_id = file_name[len(CHECKPOINT_PREFIX) :].split(".", 1)[0]
+    timestamp, _, pid = checkpoint_id.partition("-")
+    if not timestamp.isdigit() or not pid.isdigit():
+        return None
+    return checkpoint_id
+
+
+# Ids of the complete checkpoints in checkpoint_dir, the newest first
+# checkpoint_dir中完整checkpoint的id，最新的在前
+def list_checkpoints(checkpoint_dir):
+    try:
+        file_names = os.listdir(checkpoint_dir)
+    except OSError:
+        return []
+    checkpoint_ids = {checkpoint_id_of(file_name) for file_name in file_names} - {None}
+    return sorted(checkpoint_ids, key=lambda checkpoint_id: tuple(map(int, checkpoint_id.split("-"))), reverse=True)
+
+
+# Model checkpoints serialized by a background thread so the actor loop does not stall on serialization and disk I/O.
+# On the calling thread the state_dict of agent.model is copied, so the actor can keep predicting and training, then the
+# background thread writes the copy with write_fn(state_dict, path), torch.save by default, into a temporary directory
+# of checkpoint_dir and renames the file in place, so readers never see a partial checkpoint. It keeps the newest keep
+# checkpoints of checkpoint_dir. Agents without a model are saved with save_model() on the calling thread, since saving
+# the live weights while the actor uses them is a race.
+# At most max_in_flight saves are running or waiting, a new save replaces the newest waiting one (coalesced) or is
+# dropped when only running saves are left (skipped)
+# 在后台线程中序列化模型checkpoint，actor循环不会因为序列化和磁盘读写而停顿。
+# 在调用线程中复制agent.model的state_dict，actor可以继续预测和训练，之后后台线程通过write_fn(state_dict, path)(默认为torch.save)
+# 将副本写入checkpoint_dir中的临时目录，再将文件原地重命名，读取方不会看到不完整的checkpoint。只保留checkpoint_dir中最新的keep个checkpoint。
+# 没有模型的智能体在调用线程中通过save_model()保存，因为在actor使用权重时保存是数据竞争。
+# 最多max_in_flight次保存正在执行或等待，新的保存替换最新的等待中保存(合并)，只剩正在执行的保存时则被丢弃(跳过)
+class AsyncCheckpointer:
+    def __init__(self, checkpoint_dir="", max_in_flight=1, keep=5, logger=None, write_fn=torch_save):
+        self.checkpoint_dir = checkpoint_dir
+        self.write_fn = write_fn
+        self.max_in_flight = max(1, max_in_flight)
+        self.keep = max(1, keep)
+        self.logger = logger
+        self.pending = deque()
+        self.running = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.last_timestamp = 0
+        # Metrics
+        # 监控指标
+        self.saved_cnt = 0
+        self.sync_saved_cnt = 0
+        self.coalesced_cnt = 0
+        self.skipped_cnt = 0
+        self.failed_cnt = 0
+        self.removed_cnt = 0
+        self.snapshot_time = 0.0
+        self.write_time = 0.0
+        self.last_write_time = 0.0
+        self.thread = threading.Thread(target=self._work, name="async_checkpoint", daemon=True)
+        self.thread.start()
+
+    def async_save(self, agent):
+        return bool(self.checkpoint_dir) and hasattr(getattr(agent, "model", None), "state_dict")
+
+    # Id of the next checkpoint of this process, milliseconds increase by at least one per save
+    # 本进程下一个checkpoint的id，每次保存毫秒数至少增加1
+    def next_checkpoint_id(self):
+        self.last_timestamp = max(int(time.time() * 1000), self.last_timestamp + 1)
+        return f"{self.last_timestamp}-{os.getpid()}"
+
+    # Request a checkpoint of agent, returns at once after copying the state_dict, or after save_model without a model
+    # 请求保存agent的checkpoint，复制state_dict后立即返回，没有模型时在save_model完成后返回
+    def save(self, agent):
+        if not self.async_save(agent):
+            agent.save_model()
+            self.sync_saved_cnt += 1
+            return
+        start = time.perf_counter()
+        job = (copy.deepcopy(agent.model.state_dict()), self.next_checkpoint_id())
+        self.snapshot_time += time.perf_counter() - start
+
+        with self.cond:
+            if self.closed:
+                raise Exception("checkpointer is closed")
+            if len(self.pending) + self.running < self.max_in_flight:
+                self.pending.append(job)
+                self.cond.notify()
+            elif self.pending:
+                self.pending[-1] = job
+                self.coalesced_cnt += 1
+            else:
+                self.skipped_cnt += 1
+
+    def _write_snapshot(self, state_dict, checkpoint_id):
+        tmp_dir = os.path.join(self.checkpoint_dir, f"{TMP_DIR_PREFIX}{checkpoint_id}")
+        os.makedirs(tmp_dir)
+        try:
+            file_name = f"{CHECKPOINT_PREFIX}{checkpoint_id}.pkl"
+            tmp_path = os.path.join(tmp_dir, file_name)
+            self.write_fn(state_dict, tmp_path)
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.checkpoint_dir, file_name))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._remove_old_checkpoints()
+
+    # Keep the newest keep checkpoints of checkpoint_dir
+    # 只保留checkpoint_dir中最新的keep个checkpoint
+    def _remove_old_checkpoints(self):
+        old_ids = set(list_checkpoints(self.checkpoint_dir)[self.keep :])
+        if not old_ids:
+            return
+        for file_name in os.listdir(self.checkpoint_dir):
+            if checkpoint_id_of(file_name) in old_ids:
+                try:
+                    os.remove(os.path.join(self.checkpoint_dir, file_name))
+                except OSError:
+                    pass
+        self.removed_cnt += len(old_ids)
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                state_dict, checkpoint_id = self.pending.popleft()
+                self.running += 1
+            start = time.perf_counter()
+            try:
+                self._write_snapshot(state_dict, checkpoint_id)
+                failed = False
+            except Exception as e:
+                failed = True
+                if self.logger:
+                    self.logger.error(f"async checkpoint failed: {e}")
+            cost = time.perf_counter() - start
+            with self.cond:
+                self.running -= 1
+                if failed:
+                    self.failed_cnt += 1
+                else:
+                    self.saved_cnt += 1
+                    self.write_time += cost
+                    self.last_write_time = cost
+                self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {
+                "checkpoint_saved": self.saved_cnt,
+                "checkpoint_sync_saved": self.sync_saved_cnt,
+                "checkpoint_removed": self.removed_cnt,
+                "checkpoint_coalesced": self.coalesced_cnt,
+                "checkpoint_skipped": self.skipped_cnt,
+                "checkpoint_failed": self.failed_cnt,
+                "checkpoint_in_flight": len(self.pending) + self.running,
+                "checkpoint_snapshot_time": round(self.snapshot_time, 3),
+                "checkpoint_write_time": round(self.write_time, 3),
+                "checkpoint_last_write_time": round(self.last_write_time, 3),
+            }
+
+    # Finish the waiting saves and stop the background thread
+    # 完成等待中的保存并停止后台线程
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+        if self.logger:
+            self.logger.info(f"async checkpointer closed, stats:{self.stats()}")
@@ -50,10 +50,95 @@ class GameConfig:
     # Time decay factor, used in reward_manager
     # 时间衰减因子，在reward_manager中使用
     TIME_SCALE_ARG = 20000
+    # Accumulate wall time and calls of each reward item in GameRewardManager, reported at the end of every episode
+    # 在GameRewardManager中累计每个奖励子项的耗时和调用次数，每局结束时上报
+    REWARD_PROFILE = False
     # Evaluation frequency and model save interval configuration, used in workflow
     # 评估频率和模型保存间隔配置，在workflow中使用
     EVAL_FREQ = 10
+    # Actor processes of each host that only play eval episodes, in all their environments, with the newest checkpoint
+    # of CHECKPOINT_DIR or "latest" when there is none, waiting EVAL_ACTOR_INTERVAL seconds between rounds. An actor
+    # takes the eval role through a lock file of the host, the others only produce samples and EVAL_FREQ is not used
+    # 每台主机上只进行评估对局的actor进程数，使用其所有环境和CHECKPOINT_DIR中最新的checkpoint，没有checkpoint时使用"latest"，
+    # 每轮评估之间等待EVAL_ACTOR_INTERVAL秒。actor通过本主机的锁文件获得评估角色，其余actor只产生样本，不使用EVAL_FREQ
+    EVAL_ACTORS = 0
+    EVAL_ACTOR_INTERVAL = 0
     MODEL_SAVE_INTERVAL = 1800
+    # Save the model every MODEL_SAVE_INTERVAL seconds in a background thread, see checkpoint.py. A copy of the
+    # state_dict of agent.model is written into CHECKPOINT_DIR as model.ckpt-<id>.pkl, which keeps the newest
+    # CHECKPOINT_KEEP checkpoints, at most CHECKPOINT_MAX_IN_FLIGHT saves run or wait. Agents without a model are saved
+    # with save_model() in the actor loop. Used in workflow
+    # 每MODEL_SAVE_INTERVAL秒在后台线程中保存模型，见checkpoint.py。agent.model的state_dict副本以model.ckpt-<id>.pkl写入
+    # CHECKPOINT_DIR，只保留最新的CHECKPOINT_KEEP个checkpoint，最多CHECKPOINT_MAX_IN_FLIGHT次保存正在执行或等待。
+    # 没有模型的智能体在actor循环中通过save_model()保存。在workflow中使用
+    ASYNC_CHECKPOINT = False
+    CHECKPOINT_DIR = ""
+    CHECKPOINT_MAX_IN_FLIGHT = 2
+    CHECKPOINT_KEEP = 5
+    # Skip load_model at the start of an episode when the agent already holds the checkpoint, see model_cache.py.
+    # "latest" is loaded again only when the newest model.ckpt-* file of LATEST_MODEL_DIR, where the framework syncs the
+    # checkpoints of the learner, changes. Empty loads "latest" every episode.
+    # The valid model pool is refreshed every MODEL_POOL_REFRESH_INTERVAL seconds. Used in workflow
+    # 对局开始时智能体已持有checkpoint则跳过load_model，见model_cache.py。
+    # 只有LATEST_MODEL_DIR(框架同步learner的checkpoint的目录)中最新的model.ckpt-*文件变化时才重新加载"latest"，为空时每局都加载"latest"。
+    # 有效模型池每MODEL_POOL_REFRESH_INTERVAL秒刷新一次。在workflow中使用
+    MODEL_CACHE = False
+    LATEST_MODEL_DIR = ""
+    MODEL_POOL_REFRESH_INTERVAL = 300
+    # Worker threads running sample_process and learn of finished episodes in the background, 0 runs them in the actor.
+    # sample_process runs in parallel, learn one at a time and never while the actor predicts, loads or saves.
+    # At most SAMPLE_PIPELINE_MAX_PENDING episodes wait for a worker before the actor blocks. Used in workflow
+    # 在后台执行已结束对局的sample_process和learn的工作线程数，0表示在actor中执行。
+    # sample_process并行执行，learn逐个执行，且不与actor的预测、加载和保存同时执行。
+    # 最多SAMPLE_PIPELINE_MAX_PENDING个对局等待工作线程，超过后actor阻塞。在workflow中使用
+    SAMPLE_PIPELINE_WORKERS = 0
+    SAMPLE_PIPELINE_MAX_PENDING = 2
+    # Emit samples every SAMPLE_CHUNK_SEGMENTS * Config.LSTM_TIME_STEPS frames during an episode, 0 emits them at the end
+    # 对局中每SAMPLE_CHUNK_SEGMENTS * Config.LSTM_TIME_STEPS帧输出一次样本，0表示对局结束时输出
+    SAMPLE_CHUNK_SEGMENTS = 0
+    # Collect frames into preallocated float32 sample rows instead of per frame objects, used in workflow
+    # 将帧收集到预分配的float32样本行中而不是逐帧对象，在workflow中使用
+    ARRAY_FRAME_COLLECTOR = False
+    # Compute GAE of the array collector with NumPy for all agents at once instead of a loop over frames, see gae.py
+    # 数组收集器使用NumPy同时计算所有智能体的GAE而不是逐帧循环，见gae.py
+    VECTORIZED_GAE = True
+    # Snapshot the reward managers, the lstm state of the agents and the frame collector of a training environment
+    # every EPISODE_SNAPSHOT_INTERVAL steps, 0 disables it. Only environments declaring supports_resume are snapshotted,
+    # when their env.step fails the episode continues from the last snapshot through env.resume(frame_no). Otherwise with SALVAGE_FAILED_EPISODES the frames of a failed training episode are turned
+    # into truncated samples instead of being discarded. Both need ARRAY_FRAME_COLLECTOR or SAMPLE_CHUNK_SEGMENTS.
+    # Used in workflow
+    # 训练环境每EPISODE_SNAPSHOT_INTERVAL步保存一次奖励管理器、智能体lstm状态和帧收集器的快照，0表示关闭。只为声明了supports_resume的环境
+    # 保存快照，其env.step失败时对局通过env.resume(frame_no)从最近的快照继续。否则开启SALVAGE_FAILED_EPISODES时，失败的训练对局的帧会被截断为样本而不是丢弃。
+    # 二者都需要开启ARRAY_FRAME_COLLECTOR或SAMPLE_CHUNK_SEGMENTS。在workflow中使用
+    EPISODE_SNAPSHOT_INTERVAL = 0
+    SALVAGE_FAILED_EPISODES = False
+    # Decision interval of each hero in env steps, heroes not listed decide every step. An agent predicts and saves a
+    # frame every DECISION_INTERVAL[hero_id] steps and repeats its last action in between, its reward manager sums the
+    # decayed rewards of the skipped steps into the reward of the next decision. Used in workflow
+    # 每个英雄以env步数计的决策间隔，未列出的英雄每步决策。智能体每DECISION_INTERVAL[hero_id]步预测一次并保存一帧，
+    # 其间重复上一次的动作，奖励管理器将跳过的各步衰减后的回报累加到下一次决策的回报中。在workflow中使用
+    DECISION_INTERVAL = {}
+    # Unix socket of the inference server shared by the actors of the host, see inference_server.py. The first actor
+    # of the host to claim it by flock serves it with its agents as model slots and plays no episodes, the agents of
+    # the other actors send their obs_data to it instead of loading and running their own model. Empty predicts in the
+    # actor, so does an actor while the server is unavailable. The server batches at most INFERENCE_MAX_BATCH
+    # observations, waiting at most INFERENCE_MAX_WAIT seconds after the oldest one, actors give up after
+    # INFERENCE_TIMEOUT seconds and predict locally.
+    # Used in workflow and inference_server
+    # 本主机各actor共享的推理服务的unix socket，见inference_server.py。本主机第一个通过flock获得该角色的actor以其智能体为模型槽位提供
+    # 推理服务，不进行对局，其他actor的智能体将obs_data发送给推理服务，而不再加载和运行自己的模型。为空时在actor中预测，推理服务
+    # 不可用时actor同样在本地预测。推理服务每批最多INFERENCE_MAX_BATCH个观测，距最早的观测最多等待INFERENCE_MAX_WAIT秒，
+    # actor等待超过INFERENCE_TIMEOUT秒时放弃并在本地预测。
+    # 在workflow和inference_server中使用
+    INFERENCE_SERVER_ADDRESS = ""
+    INFERENCE_MAX_BATCH = 64
+    INFERENCE_MAX_WAIT = 0.002
+    INFERENCE_TIMEOUT = 10
+    # Time one call in STAGE_STATS_SAMPLE_EVERY of each stage of run_episodes and workflow, and report the latency
+    # histograms, frames and samples per second through monitor at the end of every episode. 1 times every call, 0 disables it
+    # run_episodes和workflow的每个阶段每STAGE_STATS_SAMPLE_EVERY次调用计时一次，每局结束时通过monitor上报耗时直方图、每秒帧数和样本数。
+    # 1表示每次调用都计时，0表示关闭
+    STAGE_STATS_SAMPLE_EVERY = 0
 
 
 # Dimension configuration, used when building the model
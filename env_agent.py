@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import copy
+
+
+# Agent of one environment sharing the model of an agent of the framework, so one agent pair plays several
+# environments. Methods of the agent run with the EnvAgent as self: attributes they set, such as the lstm state and the
+# reward manager set by reset and predict, belong to the environment, attributes never set on the EnvAgent, such as the
+# model, are read from the shared agent. Loading, saving, learning and the model call itself go to the shared agent
+# 与框架的一个智能体共享模型的单环境智能体，一对智能体可以同时进行多个环境的对局。智能体的方法以EnvAgent为self执行：
+# 方法设置的属性，例如reset和预测设置的lstm状态和奖励管理器，属于该环境，EnvAgent上从未设置过的属性(例如模型)从共享的智能体读取。
+# 加载、保存、训练以及模型调用本身交给共享的智能体
+class EnvAgent:
+    def __getattr__(self, name):
+        return getattr(self.__dict__["shared_agent"], name)
+
+    def load_model(self, *args, **kwargs):
+        return self.shared_agent.load_model(*args, **kwargs)
+
+    def save_model(self, *args, **kwargs):
+        return self.shared_agent.save_model(*args, **kwargs)
+
+    def learn(self, *args, **kwargs):
+        return self.shared_agent.learn(*args, **kwargs)
+
+    def predict(self, list_obs_data):
+        return self.shared_agent.predict(list_obs_data)
+
+
+# EnvAgent subclass of each agent class, so the methods of the agent class and isinstance keep working
+# 每个智能体类对应的EnvAgent子类，使智能体类的方法和isinstance照常可用
+ENV_AGENT_CLASSES = {}
+
+
+def env_agent(agent):
+    agent_class = type(agent)
+    env_agent_class = ENV_AGENT_CLASSES.get(agent_class)
+    if env_agent_class is None:
+        env_agent_class = type(f"Env{agent_class.__name__}", (EnvAgent, agent_class), {})
+        ENV_AGENT_CLASSES[agent_class] = env_agent_class
+    view = object.__new__(env_agent_class)
+    view.__dict__["shared_agent"] = agent
+    return view
+
+
+# The agent of the framework behind agent, agent itself when it is not an EnvAgent
+# agent背后框架的智能体，agent不是EnvAgent时为其本身
+def shared_agent_of(agent):
+    return agent.__dict__.get("shared_agent", agent) if isinstance(agent, EnvAgent) else agent
+
+
+# Attributes of an EnvAgent that are not saved by agent_state: the shared agent, and the reward manager, which is
+# snapshotted on its own
+# agent_state不保存的EnvAgent属性：共享的智能体，以及单独保存快照的奖励管理器
+UNSAVED_ATTRIBUTES = ("shared_agent", "reward_manager")
+
+
+# Copy of the per environment state of an EnvAgent, what the methods of the agent set on it such as the lstm state
+# EnvAgent单环境状态的副本，即智能体的方法设置在其上的属性，例如lstm状态
+def agent_state(agent):
+    return {
+        name: copy.deepcopy(value) for name, value in agent.__dict__.items() if name not in UNSAVED_ATTRIBUTES
+    }
+
+
+# Put an EnvAgent back to a state of agent_state, the state can be restored again later
+# 将EnvAgent恢复到agent_state保存的状态，该状态之后可以再次恢复
+def restore_agent_state(agent, state):
+    for name in list(agent.__dict__):
+        if name not in UNSAVED_ATTRIBUTES and name not in state:
+            del agent.__dict__[name]
+    agent.__dict__.update(copy.deepcopy(state))
+
+
+# Predict the actions of several agents with one model call per shared agent, doing for each state_dict what
+# train_predict (is_eval False) and eval_predict (is_eval True) of agent.py do for one:
+#   obs_data = agent.observation_process(state_dict), the features with the lstm state of the agent
+#   list_act_data = agent.predict(list_obs_data), one forward pass of the model over the list
+#   agent.update_status(obs_data, act_data), the new lstm state and what build_frame reads
+#   action = agent.action_process(state_dict, act_data, is_stochastic), sampled in training, argmax in eval
+# 每个共享的智能体只调用一次模型，预测多个智能体的动作，对每个state_dict所做的与agent.py中train_predict(is_eval为False)
+# 和eval_predict(is_eval为True)对单个state_dict所做的相同：
+#   obs_data = agent.observation_process(state_dict)，特征及智能体的lstm状态
+#   list_act_data = agent.predict(list_obs_data)，对整个列表执行一次模型前向
+#   agent.update_status(obs_data, act_data)，新的lstm状态及build_frame读取的数据
+#   action = agent.action_process(state_dict, act_data, is_stochastic)，训练时采样，评估时取最大值
+def predict_actions(agents, state_dicts, is_eval):
+    requests = {}
+    for index, agent in enumerate(agents):
+        requests.setdefault(id(shared_agent_of(agent)), []).append(index)
+    actions = [None] * len(agents)
+    for indices in requests.values():
+        list_obs_data = [agents[index].observation_process(state_dicts[index]) for index in indices]
+        list_act_data = shared_agent_of(agents[indices[0]]).predict(list_obs_data)
+        for index, obs_data, act_data in zip(indices, list_obs_data, list_act_data):
+            agents[index].update_status(obs_data, act_data)
+            actions[index] = agents[index].action_process(state_dicts[index], act_data, not is_eval)
+    return actions
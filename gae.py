@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import argparse
+import time
+import numpy as np
+from ppo.config import GameConfig, Config
+
+
+# Generalized advantage estimation, frame by frame in reverse like FrameCollector
+# rewards, values and dones have shape (agent_num, frame_num) or (frame_num,). The value after a frame is the value
+# of the next frame, 0 after a done frame or after the last frame, so a terminal reward set by save_last_frame
+# is simply the reward of the last frame. Returns advantages and returns (advantages + values)
+# 广义优势估计，与FrameCollector一样逐帧反向计算
+# rewards、values和dones的形状为(agent_num, frame_num)或(frame_num,)。每帧之后的价值为下一帧的value，done帧和最后一帧之后为0，
+# 因此save_last_frame设置的终局奖励就是最后一帧的reward。返回advantages和returns(advantages + values)
+def gae_loop(rewards, values, dones=None, gamma=Config.GAMMA, lamda=Config.LAMDA):
+    rewards = np.atleast_2d(np.asarray(rewards, dtype=np.float64))
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    dones = np.zeros(rewards.shape, dtype=bool) if dones is None else np.atleast_2d(np.asarray(dones, dtype=bool))
+    advantages = np.zeros(rewards.shape)
+    for agent_id in range(rewards.shape[0]):
+        gae, next_value = 0.0, 0.0
+        for i in range(rewards.shape[1] - 1, -1, -1):
+            if dones[agent_id, i]:
+                gae, next_value = 0.0, 0.0
+            delta = -values[agent_id, i] + rewards[agent_id, i] + gamma * next_value
+            gae = gae * gamma * lamda + delta
+            advantages[agent_id, i] = gae
+            next_value = values[agent_id, i]
+    return advantages, advantages + values
+
+
+# Same as gae_loop with NumPy over blocks of frames for all agents at once
+# Inside a block of B frames, advantage[t] = sum over k >= t of (gamma * lamda) ** (k - t) * delta[k] up to the next done,
+# computed as a reverse cumulative sum of delta[k] * (gamma * lamda) ** k. Blocks keep the powers within float64 range
+# and are chained from the last one through the advantage at the start of the following block
+# 与gae_loop相同，使用NumPy按帧块同时计算所有智能体
+# 在B帧的块内，advantage[t]为到下一个done为止k >= t的(gamma * lamda) ** (k - t) * delta[k]之和，用delta[k] * (gamma * lamda) ** k的反向累加和计算。
+# 分块使幂次保持在float64范围内，各块从最后一块开始，通过下一块起始帧的advantage串联
+def gae_vectorized(rewards, values, dones=None, gamma=Config.GAMMA, lamda=Config.LAMDA, block=1024):
+    rewards = np.atleast_2d(np.asarray(rewards, dtype=np.float64))
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    agent_num, frame_num = rewards.shape
+    dones = np.zeros(rewards.shape, dtype=bool) if dones is None else np.atleast_2d(np.asarray(dones, dtype=bool))
+
+    next_values = np.zeros(rewards.shape)
+    next_values[:, :-1] = values[:, 1:]
+    next_values[dones] = 0.0
+    deltas = rewards + gamma * next_values - values
+
+    discount = gamma * lamda
+    powers = discount ** np.arange(block + 1)
+    advantages = np.empty(rewards.shape)
+    carry = np.zeros(agent_num)
+    for start in range((frame_num - 1) // block * block, -1, -block):
+        end = min(start + block, frame_num)
+        size = end - start
+        block_dones = dones[:, start:end]
+
+        # Reverse cumulative sum of the scaled deltas, with a zero column after the block
+        # 缩放后delta的反向累加和，块之后补一列0
+        sums = np.zeros((agent_num, size + 1))
+        sums[:, :size] = np.cumsum((deltas[:, start:end] * powers[:size])[:, ::-1], axis=1)[:, ::-1]
+
+        # First done at or after each frame inside the block, size when there is none
+        # 块内每帧及之后的第一个done，没有时为size
+        done_at = np.where(block_dones, np.arange(size), size)
+        next_done = np.minimum.accumulate(done_at[:, ::-1], axis=1)[:, ::-1]
+        segment_end = np.minimum(next_done + 1, size)
+        block_advantages = (sums[:, :size] - np.take_along_axis(sums, segment_end, axis=1)) / powers[:size]
+
+        # Frames without a done up to the block end continue into the advantage of the following block
+        # 到块末尾都没有done的帧延续到下一块的advantage
+        open_frames = next_done == size
+        block_advantages += np.where(open_frames, powers[size - np.arange(size)] * carry[:, None], 0.0)
+        advantages[:, start:end] = block_advantages
+        carry = block_advantages[:, 0]
+    return advantages, advantages + values
+
+
+# Engine used by sample_process, selected by GameConfig.VECTORIZED_GAE
+# sample_process使用的计算方式，由GameConfig.VECTORIZED_GAE选择
+def compute_gae(rewards, values, dones=None):
+    if GameConfig.VECTORIZED_GAE:
+        return gae_vectorized(rewards, values, dones)
+    return gae_loop(rewards, values, dones)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, nargs="+", default=[5000, 10000, 20000])
+    parser.add_argument("--agents", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for frame_num in args.frames:
+        rewards = rng.normal(size=(args.agents, frame_num))
+        values = rng.normal(size=(args.agents, frame_num))
+        # The terminal reward set by save_last_frame
+        # save_last_frame设置的终局奖励
+        rewards[:, -1] += 15.0
+
+        costs = {}
+        for name, engine in (("loop", gae_loop), ("vectorized", gae_vectorized)):
+            costs[name] = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = engine(rewards, values)
+                costs[name] = min(costs[name], time.perf_counter() - start)
+            if name == "loop":
+                expected = result[0]
+        error = np.max(np.abs(result[0] - expected)) / max(1.0, np.max(np.abs(expected)))
+        print(
+            f"{frame_num:>6} frames x {args.agents} agents  loop {costs['loop'] * 1e3:8.2f} ms  "
+            f"vectorized {costs['vectorized'] * 1e3:7.2f} ms  speedup {costs['loop'] / costs['vectorized']:6.1f}x  "
+            f"max error {error:.1e}"
+        )
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from multiprocessing.connection import Client, Listener
+from ppo.config import GameConfig
+from ppo.model_cache import ModelCache
+
+
+# Batch sizes are counted in buckets of powers of 2, the last bucket holds every larger batch
+# 批次大小按2的幂分桶统计，最后一个桶包含所有更大的批次
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+# Seconds between two reports of the server metrics through monitor
+# 两次通过monitor上报推理服务监控指标之间的秒数
+INFERENCE_STATS_INTERVAL = 60
+
+
+# Load model_id into agent, a (path, checkpoint id) model_id is a checkpoint of AsyncCheckpointer
+# 将model_id加载到智能体，(path, checkpoint id)形式的model_id为AsyncCheckpointer的checkpoint
+def load_model_id(agent, model_id):
+    if isinstance(model_id, tuple):
+        path, checkpoint_id = model_id
+        agent.load_model(path=path, id=checkpoint_id)
+    else:
+        agent.load_model(id=model_id)
+
+
+# One predict message of a client connection, answered once every observation in it has an output
+# 客户端连接的一条预测消息，其中每个观测都得到输出后回复
+class InferenceCall:
+    def __init__(self, conn, size):
+        self.conn = conn
+        self.outputs = [None] * size
+        self.left = size
+        self.error = None
+
+
+# Inference server shared by the actor processes of a host, listening on a unix socket at address.
+# Actors send the obs_data of their agents, what agent.observation_process returns including the lstm state, with the
+# model id each one plays. The agents of the framework given to the server are its model slots: a slot holds the model
+# of one model id, the least recently used slot is loaded with a new model id when every slot is taken. A batch of the
+# obs_data of all actors is run with one agent.predict(list_obs_data) per model id, when it holds max_batch obs_data or
+# max_wait seconds after its oldest obs_data arrived. Models are loaded through a ModelCache when first used and again
+# after a client loaded their model id at the start of an episode, so "latest" follows the checkpoints of the learner
+# like the agents of the actors did. Each connection has one reader thread, the batches run in a single thread, the
+# only one using the agents, which also sends the replies.
+# 同一主机上各actor进程共享的推理服务，监听address处的unix socket。
+# actor发送其智能体的obs_data(即agent.observation_process的返回值，包括lstm状态)及各自使用的模型id。交给推理服务的框架智能体是其模型槽位：
+# 每个槽位持有一个模型id的模型，所有槽位都被占用时，最久未使用的槽位加载新的模型id。所有actor的obs_data组成批次，每个模型id调用一次
+# agent.predict(list_obs_data)，批次中有max_batch个obs_data，或距最早的obs_data到达已过max_wait秒时执行该批次。模型在首次使用时
+# 经由ModelCache加载，客户端在对局开始时加载该模型id后再次加载，因此"latest"与原先actor中的智能体一样跟随learner的checkpoint。
+# 每个连接一个读取线程，批次在单独的线程中执行，该线程是唯一使用智能体的线程，并由其发送回复
+class InferenceServer:
+    def __init__(self, agents, address, max_batch=64, max_wait=0.002, logger=None, latest_dir=""):
+        self.address = address
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.logger = logger
+        self.model_cache = ModelCache(None, latest_dir=latest_dir)
+        # Agents holding no model yet, and model id -> agent holding it, the least recently used first
+        # 尚未持有模型的智能体，以及模型id -> 持有该模型的智能体，最久未使用的在前
+        self.free_agents = list(agents)
+        self.models = OrderedDict()
+        # Model ids loaded by a client since their last load on the server
+        # 自服务端上次加载以来被客户端加载过的模型id
+        self.stale = set()
+        # (arrival time, InferenceCall, index in the call, model_id, obs_data) waiting for a batch
+        # 等待组成批次的(到达时间, InferenceCall, 在消息中的下标, model_id, obs_data)
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.conns = []
+        # Metrics
+        # 监控指标
+        self.start = time.time()
+        self.call_cnt = 0
+        self.observation_cnt = 0
+        self.batch_cnt = 0
+        self.max_batch_size = 0
+        self.batch_size_cnts = [0] * len(BATCH_SIZE_BUCKETS)
+        self.wait_time = 0.0
+        self.predict_time = 0.0
+        self.error_cnt = 0
+        self.evict_cnt = 0
+
+        if os.path.exists(address):
+            os.unlink(address)
+        self.listener = Listener(address, family="AF_UNIX")
+        self.threads = [
+            threading.Thread(target=self._accept, name="inference_accept", daemon=True),
+            threading.Thread(target=self._batch, name="inference_batch", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _accept(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                return
+            if self.closed:
+                conn.close()
+                return
+            self.conns.append(conn)
+            threading.Thread(target=self._read, args=(conn,), name="inference_read", daemon=True).start()
+
+    # Messages of a client are ("predict", [(model_id, obs_data), ...]), ("load", [model_id, ...]) and
+    # ("stats", None), it sends the next one after the reply, so only the batch thread writes to conn while a call is
+    # pending
+    # 客户端的消息为("predict", [(model_id, obs_data), ...])、("load", [model_id, ...])和("stats", None)，收到回复后才发送下一条，
+    # 调用未完成时只有批次线程写conn
+    def _read(self, conn):
+        try:
+            while not self.closed:
+                kind, items = conn.recv()
+                if kind == "stats":
+                    conn.send(self.stats())
+                    continue
+                if kind == "load":
+                    with self.cond:
+                        self.stale.update(items)
+                    conn.send(True)
+                    continue
+                call = InferenceCall(conn, len(items))
+                if not items:
+                    conn.send(call.outputs)
+                    continue
+                now = time.perf_counter()
+                with self.cond:
+                    self.call_cnt += 1
+                    self.pending.extend(
+                        (now, call, i, model_id, obs_data) for i, (model_id, obs_data) in enumerate(items)
+                    )
+                    self.cond.notify()
+        except (EOFError, OSError):
+            pass
+        except Exception:
+            # close closes the connections under their reader threads
+            # close会在读取线程读取时关闭连接
+            if not self.closed:
+                raise
+        finally:
+            conn.close()
+
+    # Take the next batch, None when the server is closed
+    # 取出下一个批次，服务关闭时返回None
+    def _next_batch(self):
+        with self.cond:
+            while not self.closed:
+                if self.pending:
+                    left = self.pending[0][0] + self.max_wait - time.perf_counter()
+                    if len(self.pending) >= self.max_batch or left <= 0:
+                        batch_size = min(len(self.pending), self.max_batch)
+                        return [self.pending.popleft() for _ in range(batch_size)]
+                    self.cond.wait(left)
+                else:
+                    self.cond.wait()
+            return None
+
+    def _batch(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            by_model = {}
+            for entry in batch:
+                by_model.setdefault(entry[3], []).append(entry)
+            for model_id, entries in by_model.items():
+                try:
+                    outputs = self.model(model_id).predict([entry[4] for entry in entries])
+                except Exception as e:
+                    self.error_cnt += 1
+                    if self.logger:
+                        self.logger.error(f"inference of model {model_id} failed: {e}")
+                    outputs = [None] * len(entries)
+                    for entry in entries:
+                        entry[1].error = e
+                for (_, call, index, _, _), output in zip(entries, outputs):
+                    call.outputs[index] = output
+                    call.left -= 1
+                    if call.left == 0:
+                        self._reply(call)
+            self._count(batch, start)
+
+    def _reply(self, call):
+        try:
+            call.conn.send(call.outputs if call.error is None else Exception(f"inference failed: {call.error}"))
+        except OSError:
+            pass
+
+    # The agent holding model_id, loaded on first use and again after a client loaded model_id
+    # 持有model_id的智能体，首次使用时加载，客户端加载model_id后再次加载
+    def model(self, model_id):
+        with self.cond:
+            stale = model_id in self.stale
+            self.stale.discard(model_id)
+        agent = self.models.get(model_id)
+        if agent is None:
+            if self.free_agents:
+                agent = self.free_agents.pop()
+            else:
+                _, agent = self.models.popitem(last=False)
+                self.evict_cnt += 1
+            # The agent held another model, its load must not be skipped by the cache
+            # 智能体之前持有其他模型，缓存不能跳过这次加载
+            self.model_cache.loaded.pop(agent, None)
+            stale = True
+            self.models[model_id] = agent
+        self.models.move_to_end(model_id)
+        if stale:
+            if isinstance(model_id, tuple):
+                load_model_id(agent, model_id)
+            else:
+                self.model_cache.load(agent, model_id)
+        return agent
+
+    def _count(self, batch, start):
+        now = time.perf_counter()
+        batch_size = len(batch)
+        bucket = next((i for i, size in enumerate(BATCH_SIZE_BUCKETS) if batch_size <= size), -1)
+        with self.cond:
+            self.batch_cnt += 1
+            self.observation_cnt += batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.batch_size_cnts[bucket] += 1
+            self.wait_time += sum(start - entry[0] for entry in batch)
+            self.predict_time += now - start
+
+    def stats(self):
+        with self.cond:
+            elapsed = max(time.time() - self.start, 1e-9)
+            batch_cnt = max(self.batch_cnt, 1)
+            observation_cnt = max(self.observation_cnt, 1)
+            stats = {
+                "inference_calls": self.call_cnt,
+                "inference_observations": self.observation_cnt,
+                "inference_batches": self.batch_cnt,
+                "inference_errors": self.error_cnt,
+                "inference_observations_per_second": round(self.observation_cnt / elapsed, 1),
+                "inference_batches_per_second": round(self.batch_cnt / elapsed, 1),
+                "inference_mean_batch_size": round(self.observation_cnt / batch_cnt, 2),
+                "inference_max_batch_size": self.max_batch_size,
+                "inference_mean_wait_ms": round(self.wait_time / observation_cnt * 1000, 3),
+                "inference_mean_predict_ms": round(self.predict_time / batch_cnt * 1000, 3),
+                "inference_models": len(self.models),
+                "inference_model_evictions": self.evict_cnt,
+            }
+            for size, cnt in zip(BATCH_SIZE_BUCKETS, self.batch_size_cnts):
+                stats[f"inference_batch_size_le_{size}"] = cnt
+            return stats
+
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        # A connection wakes up the accept thread
+        # 建立一个连接以唤醒accept线程
+        try:
+            Client(self.address, family="AF_UNIX").close()
+        except Exception:
+            pass
+        self.listener.close()
+        for conn in self.conns:
+            conn.close()
+        for thread in self.threads:
+            thread.join()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        if self.logger:
+            self.logger.info(f"inference server closed, stats:{self.stats()}")
+
+
+# Actor side of InferenceServer. For each agent predict does what predict_actions of env_agent.py does, with the model
+# call on the server: obs_data = agent.observation_process(state_dict) is sent with the model id of the agent, the
+# act_data of the reply goes to agent.update_status and agent.action_process. The agents do not load_model, load
+# records the model id each agent plays and has the server load it again before its next batch.
+# One call is in flight per client, threads of an actor share it. A call that times out or loses the connection closes
+# it, so a late reply is never taken for the reply of the next call, and raises. The agents then load their models and
+# predict locally. load connects when the server was not available yet, or again retry_interval seconds after the
+# connection was closed, and returns False while the server is unavailable
+# InferenceServer的actor端。predict对每个智能体所做的与env_agent.py中的predict_actions相同，只是模型调用在推理服务上执行：
+# obs_data = agent.observation_process(state_dict)与智能体的模型id一起发送，回复中的act_data交给agent.update_status和agent.action_process。
+# 智能体不执行load_model，load记录每个智能体使用的模型id，并让服务在该模型的下一个批次前重新加载。
+# 每个客户端同时只有一次调用，actor的各线程共享同一客户端。调用超时或连接断开时关闭连接并抛出异常，因此迟到的回复不会被当作下一次调用的回复。
+# 此后智能体加载自己的模型并在本地预测。推理服务尚不可用，或连接关闭已过retry_interval秒时，load会(重新)连接，推理服务不可用时返回False
+class InferenceClient:
+    def __init__(self, address, timeout=10, retry_interval=60, logger=None):
+        self.address = address
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.conn = None
+        self.retry_time = 0.0
+        # agent -> model id it plays
+        # 智能体 -> 其使用的模型id
+        self.model_ids = {}
+        # Metrics
+        # 监控指标
+        self.call_cnt = 0
+        self.observation_cnt = 0
+        self.round_trip_time = 0.0
+        self.error_cnt = 0
+        self.fallback_cnt = 0
+
+    # Use model_id for agent instead of agent.load_model, returns False when the server is not available
+    # 为智能体使用model_id而不执行agent.load_model，推理服务不可用时返回False
+    def load(self, agent, model_id):
+        self.model_ids.pop(agent, None)
+        if not self._connected():
+            return False
+        try:
+            self._call("load", [model_id])
+        except Exception:
+            return False
+        self.model_ids[agent] = model_id
+        return True
+
+    # Connect on first use, and again once retry_interval seconds passed since the connection was closed or failed
+    # 首次使用时连接，连接关闭或失败retry_interval秒后重新连接
+    def _connected(self):
+        with self.lock:
+            if self.conn is not None:
+                return True
+            if time.time() < self.retry_time:
+                return False
+            try:
+                self.conn = Client(self.address, family="AF_UNIX")
+            except Exception:
+                self.retry_time = time.time() + self.retry_interval
+                return False
+        if self.logger:
+            self.logger.info(f"inference server {self.address} is available")
+        return True
+
+    def _disconnect(self, error):
+        self.error_cnt += 1
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self.retry_time = time.time() + self.retry_interval
+        if self.logger:
+            self.logger.warning(f"inference server {self.address} failed, fall back to local predict: {error}")
+
+    def _call(self, kind, items):
+        with self.lock:
+            if self.conn is None:
+                raise Exception(f"inference server {self.address} is not connected")
+            try:
+                self.conn.send((kind, items))
+                if not self.conn.poll(self.timeout):
+                    raise TimeoutError(f"inference server did not reply in {self.timeout} s")
+                reply = self.conn.recv()
+            except (EOFError, OSError) as e:
+                self._disconnect(e)
+                raise
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def predict(self, agents, state_dicts, is_eval):
+        start = time.perf_counter()
+        list_obs_data = [agent.observation_process(state_dict) for agent, state_dict in zip(agents, state_dicts)]
+        items = [(self.model_ids[agent], obs_data) for agent, obs_data in zip(agents, list_obs_data)]
+        list_act_data = self._call("predict", items)
+        actions = []
+        for agent, state_dict, obs_data, act_data in zip(agents, state_dicts, list_obs_data, list_act_data):
+            agent.update_status(obs_data, act_data)
+            actions.append(agent.action_process(state_dict, act_data, not is_eval))
+        self.call_cnt += 1
+        self.observation_cnt += len(list_obs_data)
+        self.round_trip_time += time.perf_counter() - start
+        return actions
+
+    # After a failed predict the agents load the models they played and predict locally until their next load
+    # 预测失败后，智能体加载各自使用的模型并在本地预测，直到下一次load
+    def fall_back(self, agents):
+        for agent in agents:
+            model_id = self.model_ids.pop(agent, None)
+            if model_id is not None:
+                load_model_id(agent, model_id)
+                self.fallback_cnt += 1
+
+    # Metrics of this client, with the ones of the server when it is connected
+    # 本客户端的监控指标，以及连接时推理服务的监控指标
+    def stats(self):
+        stats = {}
+        if self.conn is not None:
+            try:
+                stats = self._call("stats", None)
+            except Exception:
+                pass
+        stats["inference_client_calls"] = self.call_cnt
+        stats["inference_client_observations"] = self.observation_cnt
+        stats["inference_client_mean_round_trip_ms"] = round(self.round_trip_time / max(self.call_cnt, 1) * 1000, 3)
+        stats["inference_client_errors"] = self.error_cnt
+        stats["inference_client_fallbacks"] = self.fallback_cnt
+        return stats
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+# Start the inference server of GameConfig.INFERENCE_SERVER_ADDRESS on this host, with agents as its model slots
+# 在本主机启动GameConfig.INFERENCE_SERVER_ADDRESS的推理服务，agents为其模型槽位
+def start_inference_server(agents, logger=None):
+    return InferenceServer(
+        agents,
+        GameConfig.INFERENCE_SERVER_ADDRESS,
+        GameConfig.INFERENCE_MAX_BATCH,
+        GameConfig.INFERENCE_MAX_WAIT,
+        logger,
+        GameConfig.LATEST_MODEL_DIR,
+    )
+
+
+# Run the inference server of the host with agents until stop is set, reporting its metrics every
+# INFERENCE_STATS_INTERVAL seconds
+# 使用agents运行本主机的推理服务直到stop被设置，每INFERENCE_STATS_INTERVAL秒上报一次监控指标
+def serve_inference(agents, logger, monitor, stop):
+    server = start_inference_server(agents, logger)
+    if logger:
+        logger.info(f"actor {os.getpid()} serves the inference of the host at {server.address}")
+    try:
+        while not stop.wait(INFERENCE_STATS_INTERVAL):
+            inference_data = server.stats()
+            if logger:
+                logger.info(f"inference server:{inference_data}")
+            if monitor:
+                monitor.put_data({os.getpid(): inference_data})
+    finally:
+        server.close()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import os
+import time
+
+from ppo.checkpoint import CHECKPOINT_PREFIX
+from ppo.env_agent import shared_agent_of
+
+
+# Cache of the models loaded into the agents, keyed by model id and checkpoint version, so load_model is skipped when the
+# agent already holds that checkpoint. A fixed model id never changes. "latest" is versioned by the newest checkpoint file
+# of latest_dir, where the framework syncs the checkpoints of the learner, and is loaded again only when that file
+# changes. Without latest_dir it has no version and is always loaded, since the learner may have synced a new checkpoint.
+# An agent whose peer already holds the checkpoint copies the weights of the peer model with load_state_dict instead of
+# loading the checkpoint file.
+# EnvAgents of one agent of the framework hold its weights, so they are cached as that agent.
+# The valid model pool of pool_fn is refreshed every pool_refresh_interval seconds.
+# 智能体已加载模型的缓存，以模型id和checkpoint版本为键，智能体已持有该checkpoint时跳过load_model。固定的模型id不会变化。
+# "latest"的版本为latest_dir中最新的checkpoint文件，框架将learner的checkpoint同步到该目录，只有该文件变化时才重新加载。
+# 没有latest_dir时"latest"没有版本，每次都会加载，因为learner随时可能同步了新的checkpoint。
+# 同伴已持有该checkpoint时，智能体通过load_state_dict复制同伴模型的权重，而不再加载checkpoint文件。
+# 同一个框架智能体的EnvAgent持有其权重，因此按该智能体缓存。
+# pool_fn给出的有效模型池每pool_refresh_interval秒刷新一次
+class ModelCache:
+    def __init__(self, pool_fn, pool_refresh_interval=300, latest_dir=""):
+        self.pool_fn = pool_fn
+        self.pool_refresh_interval = pool_refresh_interval
+        self.latest_dir = latest_dir
+        # agent -> (model_id, version) of the weights it holds
+        # 智能体 -> 其持有权重的(model_id, version)
+        self.loaded = {}
+        self.pool = None
+        self.pool_time = 0.0
+        # Metrics
+        # 监控指标
+        self.start = time.time()
+        self.load_stats = {}
+        self.load_cnt = 0
+        self.skip_cnt = 0
+        self.share_cnt = 0
+        self.saved_time = 0.0
+
+    # Version of the checkpoint behind model_id, None when it is unknown and the model has to be loaded
+    # model_id对应checkpoint的版本，未知时为None，此时必须加载模型
+    def version(self, model_id):
+        if model_id != "latest":
+            return 0
+        if not self.latest_dir:
+            return None
+        return newest_checkpoint(self.latest_dir)
+
+    # Mean seconds of load_model(model_id), what a skipped load saves
+    # load_model(model_id)的平均耗时(秒)，即跳过一次加载节省的时间
+    def mean_load_time(self, model_id):
+        load_cnt, load_time = self.load_stats.get(model_id, (0, 0.0))
+        return load_time / load_cnt if load_cnt else 0.0
+
+    # Make agent hold the checkpoint of model_id, peers are the agents it may share the weights with.
+    # Returns True when load_model was called
+    # 使智能体持有model_id的checkpoint，peers为可以共享权重的智能体。调用了load_model时返回True
+    def load(self, agent, model_id, peers=()):
+        agent = shared_agent_of(agent)
+        peers = [shared_agent_of(peer) for peer in peers]
+        version = self.version(model_id)
+        key = (model_id, version)
+        if version is not None and self.loaded.get(agent) == key:
+            self.skip_cnt += 1
+            self.saved_time += self.mean_load_time(model_id)
+            return False
+
+        if version is not None:
+            for peer in peers:
+                if peer is not agent and self.loaded.get(peer) == key and share_weights(agent, peer):
+                    self.loaded[agent] = key
+                    self.share_cnt += 1
+                    self.saved_time += self.mean_load_time(model_id)
+                    return False
+
+        start = time.perf_counter()
+        agent.load_model(id=model_id)
+        load_cnt, load_time = self.load_stats.get(model_id, (0, 0.0))
+        self.load_stats[model_id] = (load_cnt + 1, load_time + time.perf_counter() - start)
+        self.loaded[agent] = key
+        self.load_cnt += 1
+        return True
+
+    def valid_model_pool(self, logger):
+        now = time.time()
+        if self.pool is None or now - self.pool_time >= self.pool_refresh_interval:
+            self.pool = self.pool_fn(logger)
+            self.pool_time = now
+        return self.pool
+
+    def stats(self):
+        elapsed = max(time.time() - self.start, 1e-9)
+        return {
+            "model_loads": self.load_cnt,
+            "model_load_skips": self.skip_cnt,
+            "model_load_shares": self.share_cnt,
+            "model_load_time": round(sum(load_time for _, load_time in self.load_stats.values()), 3),
+            "model_load_saved_time": round(self.saved_time, 3),
+            "model_load_saved_per_hour": round(self.saved_time / elapsed * 3600, 3),
+        }
+
+
+# (file name, mtime in ns) of the newest checkpoint file of model_dir, None when there is none
+# model_dir中最新checkpoint文件的(文件名, 修改时间(纳秒))，没有checkpoint时为None
+def newest_checkpoint(model_dir):
+    newest = None
+    try:
+        with os.scandir(model_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(CHECKPOINT_PREFIX) and entry.is_file():
+                    version = (entry.name, entry.stat().st_mtime_ns)
+                    if newest is None or version[1] > newest[1]:
+                        newest = version
+    except OSError:
+        return None
+    return newest
+
+
+# Copy the weights of the model of peer into the model of agent, False when they are not torch modules
+# 将peer模型的权重复制到agent的模型中，二者不是torch模块时返回False
+def share_weights(agent, peer):
+    model, peer_model = getattr(agent, "model", None), getattr(peer, "model", None)
+    if not hasattr(model, "load_state_dict") or not hasattr(peer_model, "state_dict"):
+        return False
+    model.load_state_dict(peer_model.state_dict())
+    return True
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import numpy as np
+from ppo.config import GameConfig
+from ppo.reward_manager import (
+    FrameIndex,
+    HERO_LEVEL_MAX_EXP,
+    LEVEL_MAX_EXP,
+    combine_diff,
+    compile_reward_names,
+    exp_prefix_of,
+    get_reward_term,
+    register_batch_reward_term,
+)
+
+
+# exp_prefix of each hero config_id, built from the same tables as calculate_exp_sum
+# 每个英雄config_id的exp_prefix，与calculate_exp_sum使用同一张经验表
+EXP_PREFIX_OF_HERO = {}
+
+
+def exp_prefix_of_hero(config_id):
+    exp_prefix = EXP_PREFIX_OF_HERO.get(config_id)
+    if exp_prefix is None:
+        exp_prefix = exp_prefix_of(HERO_LEVEL_MAX_EXP.get(config_id, LEVEL_MAX_EXP))
+        EXP_PREFIX_OF_HERO[config_id] = exp_prefix
+    return exp_prefix
+
+
+# Hero fields pulled into columns, one column per side: 0 is the camp of the main hero, 1 the enemy camp
+# 按阵营抽取的英雄字段，0为主英雄阵营，1为敌方阵营
+HERO_COLUMNS = [
+    "hp",
+    "max_hp",
+    "ep",
+    "max_ep",
+    "money",
+    "kill",
+    "death",
+    "level",
+    "exp",
+    "exp_prefix",
+    "heal_used",
+    "skill_hit",
+    "hurt_to_hero",
+    "be_hurt_by_hero",
+    "total_hurt",
+    "x",
+    "z",
+    "attack_range",
+    "in_grass",
+    "has_conti_hit",
+    "max_conti_hit",
+    "last_hit",
+]
+# Organ and soldier fields, soldier hit counts are taken over the soldiers of the other side
+# 建筑和小兵字段，小兵命中数统计的是对方阵营的小兵
+ORGAN_COLUMNS = [
+    "tower_hp",
+    "tower_max_hp",
+    "tower_x",
+    "tower_z",
+    "tower_attack_main",
+    "spring_x",
+    "spring_z",
+    "soldier_num",
+    "soldier_hp_sum",
+    "soldier_x",
+    "soldier_z",
+    "hero_hit_soldier",
+    "tower_hit_soldier",
+]
+
+
+# Per-frame scalars of one trajectory seen from one main hero, extracted once and rescored many times
+# 单局轨迹从主英雄视角抽取的逐帧标量，抽取一次即可多次重新计算奖励
+class RewardColumns:
+    def __init__(self, frame_num, main_hero_player_id):
+        self.main_hero_player_id = main_hero_player_id
+        self.frame_no = np.zeros(frame_num, dtype=np.float64)
+        for name in HERO_COLUMNS + ORGAN_COLUMNS:
+            setattr(self, name, np.zeros((frame_num, 2), dtype=np.float64))
+
+    def __len__(self):
+        return len(self.frame_no)
+
+
+def extract_reward_columns(frames, main_hero_player_id):
+    columns = RewardColumns(len(frames), main_hero_player_id)
+    for t, frame_data in enumerate(frames):
+        frame_index = FrameIndex(frame_data)
+        _, main_camp, enemy_camp = frame_index.main_hero_and_camps(main_hero_player_id)
+        columns.frame_no[t] = frame_index.frame_no
+        for side, camp in enumerate((main_camp, enemy_camp)):
+            hero, other_hero = frame_index.split_by_camp(frame_index.hero_of_camp, camp)
+            main_tower, enemy_tower = frame_index.split_by_camp(frame_index.tower_of_camp, camp)
+            main_spring, _ = frame_index.split_by_camp(frame_index.crystal_of_camp, camp)
+            main_soldiers = frame_index.main_soldiers_of(camp)
+            enemy_soldiers = frame_index.enemy_soldiers_of(camp)
+            actor_state = hero["actor_state"]
+            slot_states = hero["skill_state"]["slot_states"]
+            hit_target_info = actor_state.get("hit_target_info", None)
+
+            columns.hp[t, side] = actor_state["hp"]
+            columns.max_hp[t, side] = actor_state["max_hp"]
+            columns.ep[t, side] = actor_state["values"]["ep"]
+            columns.max_ep[t, side] = actor_state["values"]["max_ep"]
+            columns.money[t, side] = hero["moneyCnt"]
+            columns.kill[t, side] = hero["killCnt"]
+            columns.death[t, side] = hero["deadCnt"]
+            columns.level[t, side] = hero["level"]
+            columns.exp[t, side] = hero["exp"]
+            columns.exp_prefix[t, side] = exp_prefix_of_hero(actor_state.get("config_id"))[hero["level"]]
+            columns.heal_used[t, side] = slot_states[4]["usedTimes"]
+            columns.skill_hit[t, side] = sum(slot["hitHeroTimes"] for slot in slot_states)
+            columns.hurt_to_hero[t, side] = hero["totalHurtToHero"]
+            columns.be_hurt_by_hero[t, side] = hero["totalBeHurtByHero"]
+            columns.total_hurt[t, side] = hero["totalHurt"]
+            columns.x[t, side] = actor_state["location"]["x"]
+            columns.z[t, side] = actor_state["location"]["z"]
+            columns.attack_range[t, side] = actor_state["attack_range"]
+            columns.in_grass[t, side] = hero["isInGrass"] is True
+            if hit_target_info is not None and "conti_hit_count" in hit_target_info[0]:
+                columns.has_conti_hit[t, side] = 1
+                columns.max_conti_hit[t, side] = max(
+                    [item["conti_hit_count"] for item in hit_target_info if "conti_hit_count" in item]
+                )
+            if frame_index.soldier_kills_by_killer:
+                columns.last_hit[t, side] = frame_index.last_hit_diff(hero, other_hero)
+
+            columns.tower_hp[t, side] = main_tower["hp"]
+            columns.tower_max_hp[t, side] = main_tower["max_hp"]
+            columns.tower_x[t, side] = main_tower["location"]["x"]
+            columns.tower_z[t, side] = main_tower["location"]["z"]
+            columns.tower_attack_main[t, side] = enemy_tower["attack_target"] == main_hero_player_id
+            columns.spring_x[t, side] = main_spring["location"]["x"]
+            columns.spring_z[t, side] = main_spring["location"]["z"]
+
+            # Soldiers of this side, and hits on the soldiers of the other side
+            # 本阵营小兵，以及对敌方小兵的命中
+            columns.soldier_num[t, side] = len(main_soldiers)
+            total_hp = 0
+            for soldier in main_soldiers:
+                total_hp += soldier["hp"] / soldier["max_hp"]
+            columns.soldier_hp_sum[t, side] = total_hp
+            if main_soldiers:
+                columns.soldier_x[t, side] = main_soldiers[0]["location"]["x"]
+                columns.soldier_z[t, side] = main_soldiers[0]["location"]["z"]
+            tower_target = main_tower["attack_target"]
+            hero_target = hit_target_info[0]["hit_target"] if hit_target_info is not None else None
+            for soldier in enemy_soldiers:
+                if soldier["runtime_id"] == tower_target:
+                    columns.tower_hit_soldier[t, side] += 1
+                if soldier["runtime_id"] == hero_target:
+                    columns.hero_hit_soldier[t, side] += 1
+    return columns
+
+
+# Shift a column one frame later, the first frame takes init_value
+# 将列后移一帧，第一帧取init_value
+def _last(column, init_value):
+    last = np.empty_like(column)
+    last[0] = init_value
+    last[1:] = column[:-1]
+    return last
+
+
+# Vectorized check_hp over the hp-ratio history of the main hero, the history is cleared on hp 0
+# 对主英雄血量比例历史向量化计算check_hp，血量为0时清空历史
+def _check_hp_before_each_frame(hp, max_hp, maxlen=8):
+    frame_num = len(hp)
+    ratio = np.divide(hp, max_hp, out=np.zeros_like(hp), where=hp != 0)
+    frame_ids = np.arange(frame_num)
+    # Queue before frame t holds frames (last zero hp frame, t - 1], at most maxlen of them
+    # 第t帧之前的队列包含(上一次血量为0的帧, t - 1]，最多maxlen个
+    last_zero = np.maximum.accumulate(np.where(hp == 0, frame_ids, -1))
+    last_zero_before = _last(last_zero, -1)
+    start = np.maximum(last_zero_before + 1, frame_ids - maxlen)
+    length = frame_ids - start
+    first = ratio[np.minimum(start, frame_num - 1)]
+    last_1 = _last(ratio, 0.0)
+    last_2 = _last(last_1, 0.0)
+    check = np.zeros(frame_num, dtype=np.float64)
+    valid = length > 1
+    drop = valid & (last_1 <= 0.4 * first)
+    rise = valid & ~drop & (last_2 >= 1.2 * first)
+    check[drop] = (last_1 - first)[drop]
+    check[rise] = (last_2 - first)[rise]
+    return check
+
+
+# Vectorized calculate_forward for one side
+# 单侧阵营的向量化calculate_forward
+def _forward(columns, side, check_hp):
+    other = 1 - side
+    hero_ratio = columns.hp[:, side] / columns.max_hp[:, side]
+    dist_hero2spring = np.hypot(columns.x[:, side] - columns.spring_x[:, side], columns.z[:, side] - columns.spring_z[:, side])
+    dist_hero2emy = np.hypot(columns.x[:, side] - columns.tower_x[:, other], columns.z[:, side] - columns.tower_z[:, other])
+    dist_main2emy = np.hypot(
+        columns.tower_x[:, side] - columns.tower_x[:, other], columns.tower_z[:, side] - columns.tower_z[:, other]
+    )
+    dist_main2spring = np.hypot(
+        columns.spring_x[:, side] - columns.tower_x[:, side], columns.spring_z[:, side] - columns.tower_z[:, side]
+    )
+    dist_s2emy = np.hypot(
+        columns.soldier_x[:, side] - columns.tower_x[:, other], columns.soldier_z[:, side] - columns.tower_z[:, other]
+    )
+    dist_es2main = np.hypot(
+        columns.soldier_x[:, other] - columns.tower_x[:, side], columns.soldier_z[:, other] - columns.tower_z[:, side]
+    )
+    forward_value = np.zeros(len(columns), dtype=np.float64)
+    before = dist_hero2emy > dist_main2emy
+    forward_value += np.where(before & (hero_ratio > 0.99), (dist_main2emy - dist_hero2emy) / dist_main2emy * 100, 0.0)
+    forward_value += np.where(before & (hero_ratio < 0.3), -dist_hero2spring / dist_main2spring * 0.01, 0.0)
+    inside = ~before
+    retreat = inside & ((check_hp < 0) | (columns.tower_attack_main[:, side] != 0))
+    forward_value += np.where(retreat, (dist_hero2emy - dist_main2emy) / dist_main2emy, 0.0)
+    forward_value += np.where(
+        inside & (hero_ratio < 0.3), (dist_hero2emy - dist_main2emy) / dist_main2emy * np.exp(-hero_ratio), 0.0
+    )
+    push = inside & (columns.soldier_num[:, side] > 0) & (dist_hero2emy > 8800) & (dist_hero2emy >= dist_s2emy)
+    forward_value += np.where(push, (dist_hero2emy - dist_s2emy) / dist_main2emy * 500, 0.0)
+    defend = (columns.soldier_num[:, other] >= 2) & (dist_es2main < 9000) & (dist_hero2emy < dist_main2emy - 9000)
+    forward_value += np.where(defend, (dist_hero2emy - dist_main2emy) / dist_main2emy, 0.0)
+    return forward_value
+
+
+# Per-frame constants of the batch combiners, balance_rate is carried from one reward item to the next like in
+# RewardFrame
+# 按列合成的每帧常量，与RewardFrame一样balance_rate会在奖励子项之间按顺序传递
+class BatchRewardFrame:
+    def __init__(self, columns, check_hp):
+        self.frame_no = columns.frame_no
+        self.main_ratio = columns.hp[:, 0] / columns.max_hp[:, 0]
+        self.main_level = columns.level[:, 0]
+        self.check_hp = check_hp
+        self.balance_rate = None
+
+
+# Batch extractors, extract_batch(columns, side, check_hp) returns the column of the value of one side
+# 按列的单阵营奖励子项计算，extract_batch(columns, side, check_hp)返回单侧阵营的值的列
+def batch_extract_money(columns, side, check_hp):
+    return columns.money[:, side]
+
+
+def batch_extract_hp_point(columns, side, check_hp):
+    return np.sqrt(np.sqrt(1.0 * columns.hp[:, side] / columns.max_hp[:, side]))
+
+
+def batch_extract_ep_rate(columns, side, check_hp):
+    hp, max_ep = columns.hp[:, side], columns.max_ep[:, side]
+    return np.divide(columns.ep[:, side], max_ep, out=np.zeros_like(hp), where=(max_ep != 0) & (hp > 0))
+
+
+def batch_extract_kill(columns, side, check_hp):
+    return columns.kill[:, side]
+
+
+def batch_extract_death(columns, side, check_hp):
+    return columns.death[:, side]
+
+
+def batch_extract_tower_hp_point(columns, side, check_hp):
+    return 1.0 * columns.tower_hp[:, side] / columns.tower_max_hp[:, side]
+
+
+def batch_extract_last_hit(columns, side, check_hp):
+    return columns.last_hit[:, side]
+
+
+def batch_extract_exp(columns, side, check_hp):
+    return columns.exp_prefix[:, side] + columns.exp[:, side]
+
+
+def batch_extract_forward(columns, side, check_hp):
+    return _forward(columns, side, check_hp)
+
+
+def batch_extract_heal(columns, side, check_hp):
+    return columns.heal_used[:, side]
+
+
+def batch_extract_skill_hit_count(columns, side, check_hp):
+    return columns.skill_hit[:, side]
+
+
+def batch_extract_hurt_to_hero(columns, side, check_hp):
+    other = 1 - side
+    distance_to_enemy = np.hypot(columns.x[:, side] - columns.x[:, other], columns.z[:, side] - columns.z[:, other])
+    balance_rate = np.where(distance_to_enemy <= columns.attack_range[:, side], 1.2, 1.0)
+    balance_rate = balance_rate + np.where(columns.in_grass[:, side] != 0, 0.1, 0.0)
+    # The position of the main hero in the last frame, nothing is recorded before the first frame
+    # 主英雄上一帧的位置，第一帧之前没有记录
+    moved = (columns.x[:, side] != _last(columns.x[:, 0], np.nan)) | (columns.z[:, side] != _last(columns.z[:, 0], np.nan))
+    balance_rate = balance_rate + np.where(moved, 0.1, 0.0)
+    last_hurt = _last(columns.hurt_to_hero[:, 0], -1)
+    sqrt_hp_ratio = np.sqrt(columns.hp[:, side] / columns.max_hp[:, side])
+    return (columns.hurt_to_hero[:, side] - last_hurt) * balance_rate / columns.max_hp[:, other] * sqrt_hp_ratio
+
+
+def batch_extract_hurt_to_others(columns, side, check_hp):
+    balance_rate = np.where(columns.has_conti_hit[:, side] != 0, 1 + 0.03 * columns.max_conti_hit[:, side], 1.0)
+    hurt_to_others = columns.total_hurt[:, side] - columns.hurt_to_hero[:, side]
+    return hurt_to_others / 100000 * balance_rate * np.sqrt(columns.hp[:, side] / columns.max_hp[:, side])
+
+
+def batch_extract_be_hurt_by_hero(columns, side, check_hp):
+    max_hp = columns.max_hp[:, side]
+    last_hurt = _last(columns.be_hurt_by_hero[:, 0], -1)
+    return (columns.be_hurt_by_hero[:, side] - last_hurt) / max_hp * np.exp(-np.sqrt(columns.ep[:, side] / max_hp) / 2)
+
+
+def batch_extract_enemy_soldiers_hp(columns, side, check_hp):
+    other = 1 - side
+    enemy_num = columns.soldier_num[:, other]
+    hero_hit = columns.hero_hit_soldier[:, side] != 0
+    tower_hit = columns.tower_hit_soldier[:, side] != 0
+    balance_rate = np.where(hero_hit, 1.05, 1.0)
+    balance_rate = balance_rate + np.where((columns.soldier_num[:, side] > 0) & hero_hit & tower_hit, 0.2, 0.0)
+    # Average hp of the soldiers kept by last_frame_data_process, which scans the main camp soldiers last
+    # last_frame_data_process记录的小兵平均血量，其最后遍历的是主英雄阵营的小兵
+    main_num = columns.soldier_num[:, 0]
+    last_av_hp = np.divide(columns.soldier_hp_sum[:, 0], main_num, out=np.zeros_like(main_num), where=main_num > 0)
+    last_av_hp = _last(last_av_hp, -1)
+    balance_rate = np.where(last_av_hp == 0, 0.0, balance_rate)
+    average_hp = last_av_hp - np.divide(
+        columns.soldier_hp_sum[:, other], enemy_num, out=np.zeros_like(enemy_num), where=enemy_num > 0
+    )
+    return np.where(enemy_num > 0, average_hp * balance_rate, 0.0)
+
+
+# Batch combiners, combine_batch(main_cur, main_last, enemy_cur, enemy_last, batch_frame) returns the value column
+# 按列的双方奖励子项合成，combine_batch(main_cur, main_last, enemy_cur, enemy_last, batch_frame)返回奖励值的列
+def batch_combine_diff(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    return (main_c - enemy_c) - (main_l - enemy_l)
+
+
+def batch_scaled_combine_diff(scale):
+    def combine(main_c, main_l, enemy_c, enemy_l, batch_frame):
+        return batch_combine_diff(main_c, main_l, enemy_c, enemy_l, batch_frame) * scale
+
+    return combine
+
+
+def batch_combine_money(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    return batch_combine_diff(main_c, main_l, enemy_c, enemy_l, batch_frame) / 100
+
+
+def batch_combine_hp_point(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    batch_frame.balance_rate = np.where(batch_frame.frame_no > 8000, 1.2, 1.0)
+    main_zero, enemy_zero = main_l == 0.0, enemy_l == 0.0
+    value = np.where(
+        main_zero & enemy_zero,
+        0.0,
+        np.where(
+            main_zero,
+            (-enemy_c) - (-enemy_l),
+            np.where(enemy_zero, main_c - main_l, batch_combine_diff(main_c, main_l, enemy_c, enemy_l, batch_frame)),
+        ),
+    )
+    return value * batch_frame.balance_rate
+
+
+def batch_combine_ep_rate(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    return np.where(main_l > 0, main_c - main_l, 0.0)
+
+
+def batch_combine_exp(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    diff = batch_combine_diff(main_c, main_l, enemy_c, enemy_l, batch_frame)
+    return np.where(batch_frame.main_level >= 15, 0.0, diff / 50)
+
+
+def batch_combine_forward(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    return main_c / 1000
+
+
+def batch_combine_last_hit(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    return main_c
+
+
+def batch_combine_kill(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    batch_frame.balance_rate = np.where((batch_frame.frame_no > 6000) | (main_c >= 2), 1.0, -1.0)
+    return (main_c - main_l) * batch_frame.balance_rate
+
+
+def batch_combine_death(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    frame_no = batch_frame.frame_no
+    batch_frame.balance_rate = np.where(frame_no > 5000, np.power(1.00005, frame_no), 1.0)
+    return (main_c - main_l) * batch_frame.balance_rate
+
+
+def batch_combine_heal(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    used = np.trunc(main_c - main_l) != 0
+    main_ratio, balance_rate = batch_frame.main_ratio, batch_frame.balance_rate
+    balance_rate = np.where(used, np.where(main_ratio > 0.85, balance_rate - (0.3 + main_ratio), balance_rate), 0.0)
+    check_hp = batch_frame.check_hp
+    batch_frame.balance_rate = np.where(check_hp > 0, balance_rate + check_hp, balance_rate)
+    return batch_frame.balance_rate
+
+
+def batch_combine_enemy_soldiers_hp(main_c, main_l, enemy_c, enemy_l, batch_frame):
+    return batch_combine_diff(main_c, main_l, enemy_c, enemy_l, batch_frame) * batch_frame.balance_rate * 100
+
+
+register_batch_reward_term("hp_point", batch_extract_hp_point, batch_combine_hp_point)
+register_batch_reward_term("tower_hp_point", batch_extract_tower_hp_point)
+register_batch_reward_term("money", batch_extract_money, batch_combine_money)
+register_batch_reward_term("exp", batch_extract_exp, batch_combine_exp)
+register_batch_reward_term("ep_rate", batch_extract_ep_rate, batch_combine_ep_rate)
+register_batch_reward_term("death", batch_extract_death, batch_combine_death)
+register_batch_reward_term("kill", batch_extract_kill, batch_combine_kill)
+register_batch_reward_term("last_hit", batch_extract_last_hit, batch_combine_last_hit)
+register_batch_reward_term("forward", batch_extract_forward, batch_combine_forward)
+register_batch_reward_term("HurtToHero", batch_extract_hurt_to_hero, batch_scaled_combine_diff(100))
+register_batch_reward_term("BeHurtByHero", batch_extract_be_hurt_by_hero, batch_scaled_combine_diff(50))
+register_batch_reward_term("HurtToOthers", batch_extract_hurt_to_others, batch_scaled_combine_diff(50))
+register_batch_reward_term("enemy_Soldiers_hp", batch_extract_enemy_soldiers_hp, batch_combine_enemy_soldiers_hp)
+register_batch_reward_term("heal", batch_extract_heal, batch_combine_heal)
+register_batch_reward_term("skill_hit_count", batch_extract_skill_hit_count)
+
+
+# extract_batch and combine_batch of reward_name. Items that are not registered are 0 like in result, registered items
+# without a column version raise instead of being left out
+# reward_name的extract_batch和combine_batch。未注册的子项与result一样为0，已注册但没有按列版本的子项会报错而不是被忽略
+def batch_functions_of(reward_name):
+    reward_term = get_reward_term(reward_name)
+    if reward_term.extract is None:
+        return None, batch_combine_diff
+    combine_batch = reward_term.combine_batch
+    if combine_batch is None and reward_term.combine is combine_diff:
+        combine_batch = batch_combine_diff
+    if reward_term.extract_batch is None or combine_batch is None:
+        raise Exception(f"reward item {reward_name} has no batch version, see register_batch_reward_term")
+    return reward_term.extract_batch, combine_batch
+
+
+# Vectorized GameRewardManager.result over a whole trajectory of one main hero, through the batch versions of the
+# registered reward items. frames is a list of frame_state dicts or RewardColumns extracted from them, weight_dict
+# defaults to REWARD_WEIGHT_DICT
+# 对单个主英雄的整局轨迹向量化计算GameRewardManager.result，使用已注册奖励子项的按列版本。
+# frames为frame_state列表或由其抽取的RewardColumns，weight_dict默认为REWARD_WEIGHT_DICT
+def result_batch(frames, main_hero_player_id, weight_dict=None, time_scale_arg=None):
+    if weight_dict is None:
+        weight_dict = GameConfig.REWARD_WEIGHT_DICT
+    if time_scale_arg is None:
+        time_scale_arg = GameConfig.TIME_SCALE_ARG
+    if isinstance(frames, RewardColumns):
+        columns = frames
+    else:
+        columns = extract_reward_columns(frames, main_hero_player_id)
+    frame_num = len(columns)
+    frame_no = columns.frame_no
+    reward_names = compile_reward_names(weight_dict)
+
+    check_hp = _check_hp_before_each_frame(columns.hp[:, 0], columns.max_hp[:, 0])
+    batch_frame = BatchRewardFrame(columns, check_hp)
+
+    # get_reward, balance_rate is carried from one reward item to the next in dict order
+    # get_reward，balance_rate按字典顺序在奖励子项之间传递
+    reward_dict = {}
+    reward_sum = np.zeros(frame_num, dtype=np.float64)
+    for reward_name in reward_names:
+        extract_batch, combine_batch = batch_functions_of(reward_name)
+        if extract_batch is None:
+            main_c = enemy_c = np.zeros(frame_num, dtype=np.float64)
+        else:
+            main_c = np.asarray(extract_batch(columns, 0, check_hp), dtype=np.float64)
+            enemy_c = np.asarray(extract_batch(columns, 1, check_hp), dtype=np.float64)
+        main_l, enemy_l = _last(main_c, 0.0), _last(enemy_c, 0.0)
+        value = np.asarray(combine_batch(main_c, main_l, enemy_c, enemy_l, batch_frame), dtype=np.float64)
+        value = np.broadcast_to(value, (frame_num,))
+        reward_sum = reward_sum + value * weight_dict[reward_name]
+        reward_dict[reward_name] = value
+    reward_dict["reward_sum"] = reward_sum
+
+    if time_scale_arg > 0:
+        decay = np.power(0.6, 1.0 * frame_no / time_scale_arg)
+        for key in reward_dict:
+            reward_dict[key] = reward_dict[key] * decay
+    return reward_dict
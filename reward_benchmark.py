@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import numpy as np
+from ppo.reward_manager import GameRewardManager, FrameIndex
+from ppo.reward_batch import extract_reward_columns, result_batch
+
+
+CAMPS = ["PLAYERCAMP_1", "PLAYERCAMP_2"]
+
+
+# Build one frame_state with the fields read by GameRewardManager
+# 构建一帧frame_state，包含GameRewardManager读取的字段
+def make_frame(frame_no, soldier_num=8, seed=0):
+    rng = random.Random(seed)
+    hero_states = []
+    npc_states = []
+    for i, camp in enumerate(CAMPS):
+        sign = -1 if i == 0 else 1
+        hero_states.append(
+            {
+                "player_id": 100 + i,
+                "actor_state": {
+                    "camp": camp,
+                    "runtime_id": 100 + i,
+                    "hp": rng.randint(1, 3000),
+                    "max_hp": 3000,
+                    "values": {"ep": rng.randint(0, 500), "max_ep": 500},
+                    "location": {"x": rng.randint(-60000, 60000), "z": rng.randint(-60000, 60000)},
+                    "attack_range": 8000,
+                    "hit_target_info": [{"hit_target": 1000 + i, "conti_hit_count": rng.randint(0, 5)}],
+                },
+                "moneyCnt": frame_no // 10,
+                "killCnt": 0,
+                "deadCnt": 0,
+                "level": min(15, 1 + frame_no // 1000),
+                "exp": rng.randint(0, 150),
+                "skill_state": {"slot_states": [{"usedTimes": 0, "hitHeroTimes": 0} for _ in range(6)]},
+                "isInGrass": False,
+                "totalHurtToHero": frame_no,
+                "totalBeHurtByHero": frame_no,
+                "totalHurt": 2 * frame_no,
+            }
+        )
+        npc_states.append(
+            {
+                "camp": camp,
+                "sub_type": "ACTOR_SUB_TOWER",
+                "runtime_id": 10 + i,
+                "hp": 9000,
+                "max_hp": 9000,
+                "location": {"x": sign * 20000, "z": sign * 20000},
+                "attack_target": 0,
+            }
+        )
+        npc_states.append(
+            {
+                "camp": camp,
+                "sub_type": "ACTOR_SUB_CRYSTAL",
+                "runtime_id": 20 + i,
+                "hp": 12000,
+                "max_hp": 12000,
+                "location": {"x": sign * 50000, "z": sign * 50000},
+                "attack_target": 0,
+            }
+        )
+        for j in range(soldier_num):
+            npc_states.append(
+                {
+                    "camp": camp,
+                    "sub_type": "ACTOR_SUB_SOLDIER",
+                    "runtime_id": 1000 + 100 * i + j,
+                    "hp": rng.randint(1, 800),
+                    "max_hp": 800,
+                    "location": {"x": sign * 15000 + rng.randint(-3000, 3000), "z": sign * 15000 + rng.randint(-3000, 3000)},
+                }
+            )
+    frame_action = {
+        "dead_action": [
+            {"killer": {"runtime_id": 100}, "death": {"sub_type": "ACTOR_SUB_SOLDIER"}},
+        ]
+    }
+    return {
+        "frameNo": frame_no,
+        "hero_states": hero_states,
+        "npc_states": npc_states,
+        "frame_action": frame_action,
+    }
+
+
+# Fixture corpus: scenario name -> (start frameNo, soldiers per camp, build a frame from the previous one)
+# 帧数据样本集：场景名 -> (起始帧号, 每个阵营小兵数, 由上一帧生成下一帧)
+def _early_game(frame, rng, t):
+    # Heroes farm near their own tower, no hits and no deaths yet
+    # 英雄在己方塔下发育，尚无命中和死亡
+    for i, hero in enumerate(frame["hero_states"]):
+        sign = -1 if i == 0 else 1
+        hero["actor_state"]["hp"] = hero["actor_state"]["max_hp"]
+        hero["actor_state"]["location"] = {"x": sign * 22000 + rng.randint(-2000, 2000), "z": sign * 22000 + rng.randint(-2000, 2000)}
+        hero["actor_state"].pop("hit_target_info", None)
+        hero["level"], hero["exp"] = 1 + t // 200, (7 * t) % 150
+    frame["frame_action"] = {}
+
+
+def _teamfight(frame, rng, t):
+    # Heroes trade hits in mid lane, soldiers die around them
+    # 双方英雄在中路互相攻击，周围小兵死亡
+    for i, hero in enumerate(frame["hero_states"]):
+        actor_state = hero["actor_state"]
+        actor_state["location"] = {"x": rng.randint(-3000, 3000), "z": rng.randint(-3000, 3000)}
+        actor_state["hp"] = max(1, actor_state["max_hp"] - 11 * t - 500 * i)
+        actor_state["hit_target_info"] = [{"hit_target": 101 - i, "conti_hit_count": t % 6}]
+        hero["totalHurtToHero"] += 40 * t
+        hero["totalBeHurtByHero"] += 40 * t
+        hero["totalHurt"] += 60 * t
+        hero["skill_state"]["slot_states"][t % 4]["hitHeroTimes"] = t // 4
+    if t % 5 == 0:
+        frame["frame_action"] = {
+            "dead_action": [{"killer": {"runtime_id": 100 + t % 2}, "death": {"sub_type": "ACTOR_SUB_SOLDIER"}}]
+        }
+    else:
+        frame["frame_action"] = {}
+
+
+def _tower_dive(frame, rng, t):
+    # The blue hero dives under the red tower and is hit by it
+    # 蓝方英雄越塔并被防御塔攻击
+    hero = frame["hero_states"][0]
+    hero["actor_state"]["location"] = {"x": 20000 - rng.randint(0, 6000), "z": 20000 - rng.randint(0, 6000)}
+    hero["actor_state"]["hp"] = max(1, hero["actor_state"]["max_hp"] - 20 * t)
+    hero["actor_state"]["hit_target_info"] = [{"hit_target": 11}]
+    for organ in frame["npc_states"]:
+        if organ["sub_type"] == "ACTOR_SUB_TOWER" and organ["camp"] == CAMPS[1]:
+            organ["attack_target"] = 100
+            organ["hp"] = max(0, organ["max_hp"] - 15 * t)
+    frame["frame_action"] = {}
+
+
+def _death_respawn(frame, rng, t):
+    # The blue hero dies, waits with hp 0 and respawns at the spring
+    # 蓝方英雄死亡，以0血量等待后在泉水复活
+    hero = frame["hero_states"][0]
+    phase = t % 120
+    if phase < 40:
+        hero["actor_state"]["hp"] = max(1, hero["actor_state"]["max_hp"] - 70 * phase)
+        hero["actor_state"]["hit_target_info"] = [{"hit_target": 101, "conti_hit_count": phase % 3}]
+        frame["frame_action"] = {}
+    elif phase < 80:
+        hero["actor_state"]["hp"] = 0
+        hero["actor_state"].pop("hit_target_info", None)
+        if phase == 40:
+            hero["deadCnt"] += 1
+            frame["hero_states"][1]["killCnt"] += 1
+            frame["frame_action"] = {
+                "dead_action": [{"killer": {"runtime_id": 101}, "death": {"sub_type": "ACTOR_SUB_HERO"}}]
+            }
+        else:
+            frame["frame_action"] = {}
+    else:
+        hero["actor_state"]["hp"] = hero["actor_state"]["max_hp"]
+        hero["actor_state"]["location"] = {"x": -50000, "z": -50000}
+        hero["actor_state"].pop("hit_target_info", None)
+        frame["frame_action"] = {}
+
+
+SCENARIOS = {
+    "early_game": (30, 2, _early_game),
+    "teamfight": (6000, 8, _teamfight),
+    "tower_dive": (9000, 4, _tower_dive),
+    "death_respawn": (12000, 6, _death_respawn),
+}
+
+
+# Build the frames of one scenario, counters carry over from frame to frame like a real game
+# 构建单个场景的帧序列，计数器像真实对局一样逐帧累积
+def make_scenario(scenario, frame_num, seed=0):
+    start_frame_no, soldier_num, step_frame = SCENARIOS[scenario]
+    rng = random.Random(seed)
+    frame = make_frame(start_frame_no, soldier_num, seed)
+    frames = []
+    for t in range(frame_num):
+        frame = copy.deepcopy(frame)
+        frame["frameNo"] = start_frame_no + 3 * t
+        for hero in frame["hero_states"]:
+            hero["moneyCnt"] += rng.randint(0, 20)
+        step_frame(frame, rng, t)
+        frames.append(frame)
+    return frames
+
+
+# Load recorded frame_state lists from a directory of <scenario>.json files
+# 从目录中加载录制的frame_state列表，文件名为<场景名>.json
+def load_fixtures(fixture_dir):
+    fixtures = {}
+    for file_name in sorted(os.listdir(fixture_dir)):
+        if file_name.endswith(".json"):
+            with open(os.path.join(fixture_dir, file_name)) as f:
+                fixtures[file_name[: -len(".json")]] = json.load(f)
+    return fixtures
+
+
+def dump_fixtures(fixtures, fixture_dir):
+    os.makedirs(fixture_dir, exist_ok=True)
+    for scenario, frames in fixtures.items():
+        with open(os.path.join(fixture_dir, f"{scenario}.json"), "w") as f:
+            json.dump(frames, f)
+
+
+# Per-frame latency percentiles, frames per second and traced allocation per frame
+# 每帧耗时分位数、每秒帧数以及每帧跟踪到的内存分配
+def summarize(costs, alloc_bytes):
+    costs = np.array(costs)
+    return {
+        "p50_us": float(np.percentile(costs, 50) * 1e6),
+        "p90_us": float(np.percentile(costs, 90) * 1e6),
+        "p99_us": float(np.percentile(costs, 99) * 1e6),
+        "max_us": float(costs.max() * 1e6),
+        "fps": float(len(costs) / costs.sum()),
+        "alloc_bytes": float(np.mean(alloc_bytes)) if alloc_bytes else 0.0,
+    }
+
+
+def _alloc_per_frame(run_frame, frames):
+    # tracemalloc slows everything down, so allocations are measured in a separate pass
+    # tracemalloc会拖慢执行，因此单独一轮统计内存分配
+    alloc_bytes = []
+    tracemalloc.start()
+    for frame in frames:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run_frame(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        alloc_bytes.append(peak - before)
+    tracemalloc.stop()
+    return alloc_bytes
+
+
+# Replay the frames repeat times from a fresh state and keep the fastest run of every frame, to damp scheduler noise
+# 从初始状态重复回放repeat次，每帧取最快的一次，以减小调度噪声
+def _min_costs(new_run_frame, frames, repeat):
+    costs = None
+    for _ in range(repeat):
+        run_frame = new_run_frame()
+        run_costs = []
+        for frame in frames:
+            start = time.perf_counter()
+            run_frame(frame)
+            run_costs.append(time.perf_counter() - start)
+        costs = run_costs if costs is None else [min(a, b) for a, b in zip(costs, run_costs)]
+    return costs
+
+
+# Latency of GameRewardManager.result for both agents, sharing one FrameIndex like run_episodes
+# 双方智能体GameRewardManager.result的耗时，与run_episodes一样共享同一个FrameIndex
+def bench_reward(frames, repeat=3):
+    def run(managers):
+        def run_frame(frame):
+            frame_index = FrameIndex(frame)
+            for manager in managers:
+                manager.result(frame, frame_index)
+
+        return run_frame
+
+    costs = _min_costs(lambda: run([GameRewardManager(100), GameRewardManager(101)]), frames, repeat)
+    alloc_bytes = _alloc_per_frame(run([GameRewardManager(100), GameRewardManager(101)]), frames)
+    return summarize(costs, alloc_bytes)
+
+
+# Stubs of the env, agents and FrameCollector for one iteration of the run_episodes inner loop
+# run_episodes内层循环所需的环境、智能体和FrameCollector替身
+class StubEnv:
+    def __init__(self, frames):
+        self.frames = frames
+        self.cursor = 0
+
+    def state_dicts(self):
+        frame_state = self.frames[self.cursor]
+        return [
+            {"player_id": 100 + i, "player_camp": CAMPS[i], "frame_state": frame_state, "legal_action": None}
+            for i in range(2)
+        ]
+
+    def reset(self, usr_conf=None):
+        self.cursor = 0
+        return None, self.state_dicts()
+
+    def step(self, actions):
+        self.cursor = min(self.cursor + 1, len(self.frames) - 1)
+        terminated = self.cursor == len(self.frames) - 1
+        return self.frames[self.cursor]["frameNo"], None, None, terminated, False, self.state_dicts()
+
+
+class StubAgent:
+    def __init__(self, player_id):
+        self.reward_manager = GameRewardManager(player_id)
+
+    def train_predict(self, state_dict):
+        return [2, 10, 1, 14, 8, 0]
+
+
+def bench_rollout(frames, repeat=3):
+    def run(env, agents, frame_collector):
+        state = {"state_dicts": env.reset()[1], "total_reward_dicts": [{}, {}]}
+
+        def run_frame(frame):
+            state_dicts = state["state_dicts"]
+            actions = [None, None]
+            for index, agent in enumerate(agents):
+                actions[index] = agent.train_predict(state_dicts[index])
+                frame_collector[index].append((state_dicts[index]["frame_state"]["frameNo"], actions[index]))
+            _, _, _, terminated, truncated, state_dicts = env.step(actions)
+            frame_index = FrameIndex(state_dicts[0]["frame_state"])
+            for i, agent in enumerate(agents):
+                reward = agent.reward_manager.result(state_dicts[i]["frame_state"], frame_index)
+                state_dicts[i]["reward"] = reward
+                total_reward_dict = state["total_reward_dicts"][i]
+                for key, value in reward.items():
+                    total_reward_dict[key] = total_reward_dict.get(key, 0) + value
+            state["state_dicts"] = state_dicts
+
+        return run_frame
+
+    def new_run():
+        return run(StubEnv(frames), [StubAgent(100), StubAgent(101)], [[], []])
+
+    costs = _min_costs(new_run, frames[:-1], repeat)
+    alloc_bytes = _alloc_per_frame(new_run(), frames[:-1])
+    return summarize(costs, alloc_bytes)
+
+
+# Rescore one trajectory with result_batch and check it against the per-frame result
+# 用result_batch重新计算整局奖励，并与逐帧result的结果对比
+def bench_batch(frames):
+    manager = GameRewardManager(100)
+    start = time.perf_counter()
+    per_frame = [dict(manager.result(frame)) for frame in frames]
+    per_frame_cost = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = extract_reward_columns(frames, 100)
+    extract_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = result_batch(columns, 100)
+    rescore_cost = time.perf_counter() - start
+
+    max_error = 0.0
+    for key, values in batch.items():
+        expected = np.array([reward[key] for reward in per_frame])
+        max_error = max(max_error, float(np.max(np.abs(values - expected) / np.maximum(1.0, np.abs(expected)))))
+    return per_frame_cost, extract_cost, rescore_cost, max_error
+
+
+# Compare p50 latency with a saved baseline, returns the regressions beyond threshold
+# 与保存的基线对比p50耗时，返回超过阈值的性能回退
+def compare_baseline(results, baseline, threshold):
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        base_p50, cur_p50 = baseline[name]["p50_us"], stats["p50_us"]
+        if cur_p50 > base_p50 * (1 + threshold):
+            regressions.append(f"{name}: p50 {base_p50:.1f} us -> {cur_p50:.1f} us (+{cur_p50 / base_p50 - 1:.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=2000, help="frames per scenario")
+    parser.add_argument("--fixtures", help="directory of recorded <scenario>.json frame lists, used instead of the built-in corpus")
+    parser.add_argument("--dump-fixtures", help="write the built-in corpus to this directory and exit")
+    parser.add_argument("--repeat", type=int, default=3, help="replays per scenario, the fastest run of each frame is kept")
+    parser.add_argument("--batch", action="store_true", help="check and time result_batch against result")
+    parser.add_argument("--save-baseline", help="write the results to this json file")
+    parser.add_argument("--baseline", help="compare with this json file and fail on regression")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed p50 regression against the baseline")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        fixtures = {scenario: make_scenario(scenario, args.frames, seed=i) for i, scenario in enumerate(SCENARIOS)}
+    if args.dump_fixtures:
+        dump_fixtures(fixtures, args.dump_fixtures)
+        sys.exit(0)
+
+    if args.batch:
+        for scenario, frames in fixtures.items():
+            per_frame_cost, extract_cost, rescore_cost, max_error = bench_batch(frames)
+            print(
+                f"{scenario} {len(frames)} frames: result {per_frame_cost * 1e3:.1f} ms, "
+                f"extract columns {extract_cost * 1e3:.1f} ms, result_batch {rescore_cost * 1e3:.1f} ms, "
+                f"max relative error {max_error:.2e}"
+            )
+        sys.exit(0)
+
+    results = {}
+    for scenario, frames in fixtures.items():
+        results[f"reward/{scenario}"] = bench_reward(frames, args.repeat)
+        results[f"rollout/{scenario}"] = bench_rollout(frames, args.repeat)
+    for name, stats in results.items():
+        print(
+            f"{name:<28} p50 {stats['p50_us']:8.1f} us  p90 {stats['p90_us']:8.1f} us  p99 {stats['p99_us']:8.1f} us  "
+            f"max {stats['max_us']:8.1f} us  {stats['fps']:9.0f} frames/s  {stats['alloc_bytes'] / 1024:6.1f} KiB/frame"
+        )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
@@ -7,28 +7,146 @@
 Author: Tencent AI Arena Authors
 """
 import math
+import operator
+import time
 from ppo.config import GameConfig
 from collections import deque
 
-# Used to record various reward information
-# 用于记录各个奖励信息
-class RewardStruct:
-    def __init__(self, m_weight=0.0):
-        self.cur_frame_value = 0.0
-        self.last_frame_value = 0.0
-        self.value = 0.0
-        self.weight = m_weight
-        self.min_value = -1
-        self.is_first_arrive_center = True
-
+# Values of the reward items of one camp in the current and the previous frame, one float per compiled reward item
+# in plan order. Moving to the next frame swaps the two lists, the current one is then refilled by the extractors
+# 单个阵营各奖励子项当前帧和上一帧的值，每个编译后的奖励子项按计划顺序占一个浮点数。进入下一帧时交换两个列表，再由extract重新填充当前帧
+class CampRewardValues:
+    def __init__(self, size):
+        self.cur = [0.0] * size
+        self.last = [0.0] * size
+
+    def rotate(self):
+        self.cur, self.last = self.last, self.cur
+        return self.cur
+
+
+# Index of one frame, built in a single pass over hero_states, npc_states and frame_action
+# and shared by every reward item of that frame
+# 单帧索引，一次遍历hero_states、npc_states和frame_action构建，供该帧所有奖励子项共享
+class FrameIndex:
+    def __init__(self, frame_data):
+        self.frame_no = frame_data["frameNo"]
+        # Heroes, towers and crystals of each camp, the last one wins like the frame scan did
+        # 每个阵营的英雄、防御塔和水晶，与逐帧遍历一样以最后出现的为准
+        self.hero_by_player_id = {}
+        self.hero_of_camp = {}
+        for hero in frame_data["hero_states"]:
+            self.hero_by_player_id[hero["player_id"]] = hero
+            self.hero_of_camp[hero["actor_state"]["camp"]] = hero
+
+        self.npc_list = frame_data["npc_states"]
+        self.tower_of_camp = {}
+        self.crystal_of_camp = {}
+        self.soldiers_of_camp = {}
+        for organ in self.npc_list:
+            organ_subtype = organ["sub_type"]
+            if organ_subtype == "ACTOR_SUB_SOLDIER":
+                organ_camp = organ["camp"]
+                soldiers = self.soldiers_of_camp.get(organ_camp)
+                if soldiers is None:
+                    self.soldiers_of_camp[organ_camp] = [organ]
+                else:
+                    soldiers.append(organ)
+            elif organ_subtype == "ACTOR_SUB_TOWER":  # 21 is ACTOR_SUB_TOWER, normal tower
+                self.tower_of_camp[organ["camp"]] = organ
+            elif organ_subtype == "ACTOR_SUB_CRYSTAL":  # 24 is ACTOR_SUB_CRYSTAL, base crystal
+                self.crystal_of_camp[organ["camp"]] = organ
+
+        # dead_action events and soldier last hits grouped by the runtime_id of the killer
+        # 按击杀者runtime_id分组的死亡事件和小兵补刀数
+        self.dead_actions_by_killer = {}
+        self.soldier_kills_by_killer = {}
+        dead_actions = frame_data["frame_action"].get("dead_action")
+        if dead_actions:
+            for dead_action in dead_actions:
+                killer_id = dead_action["killer"]["runtime_id"]
+                self.dead_actions_by_killer.setdefault(killer_id, []).append(dead_action)
+                if dead_action["death"]["sub_type"] == "ACTOR_SUB_SOLDIER":
+                    self.soldier_kills_by_killer[killer_id] = self.soldier_kills_by_killer.get(killer_id, 0) + 1
+
+        # CampFrame of each camp, built by the first manager that asks for it
+        # 每个阵营的CampFrame，由第一个请求的奖励管理器构建
+        self.camp_frames = {}
+        # Distance between the heroes of the two camps, the same for both camps, computed by the first HurtToHero
+        # 双方阵营英雄之间的距离，对两个阵营相同，由第一次计算HurtToHero时得到
+        self.hero_distance = None
+
+    # The CampFrame of camp, shared by the managers of both agents so that camp statistics are computed once per frame
+    # 获取阵营的CampFrame，双方智能体的奖励管理器共享，阵营统计每帧只计算一次
+    def camp_frame(self, camp):
+        camp_frame = self.camp_frames.get(camp)
+        if camp_frame is None:
+            camp_frame = self.camp_frames[camp] = CampFrame(self, camp)
+        return camp_frame
+
+    # Get the unit of camp and the unit of the other camp from a per camp dict
+    # 从按阵营索引的字典中获取本阵营和敌方阵营的单位
+    def split_by_camp(self, camp_dict, camp):
+        main_unit, enemy_unit = None, None
+        for unit_camp, unit in camp_dict.items():
+            if unit_camp == camp:
+                main_unit = unit
+            else:
+                enemy_unit = unit
+        return main_unit, enemy_unit
 
-# Used to initialize various reward information
-# 用于初始化各个奖励信息
-def init_calc_frame_map():
-    calc_frame_map = {}
-    for key, weight in GameConfig.REWARD_WEIGHT_DICT.items():
-        calc_frame_map[key] = RewardStruct(weight)
-    return calc_frame_map
+    # Get the main hero of player_id and the camp of both sides
+    # 获取player_id对应的主英雄以及双方阵营
+    def main_hero_and_camps(self, main_hero_player_id):
+        main_hero = self.hero_by_player_id.get(main_hero_player_id)
+        main_camp, enemy_camp = -1, -1
+        for player_id, hero in self.hero_by_player_id.items():
+            if player_id == main_hero_player_id:
+                main_camp = hero["actor_state"]["camp"]
+            else:
+                enemy_camp = hero["actor_state"]["camp"]
+        return main_hero, main_camp, enemy_camp
+
+    def main_soldiers_of(self, camp):
+        return self.soldiers_of_camp.get(camp, [])
+
+    # Soldiers of every other camp in npc_states order, the list of that camp itself when there is only one
+    # 其他所有阵营的小兵，按npc_states中的顺序排列，只有一个其他阵营时直接返回该阵营的列表
+    def enemy_soldiers_of(self, camp):
+        enemy_camps = [soldier_camp for soldier_camp in self.soldiers_of_camp if soldier_camp != camp]
+        if not enemy_camps:
+            return []
+        if len(enemy_camps) == 1:
+            return self.soldiers_of_camp[enemy_camps[0]]
+        return [organ for organ in self.npc_list if organ["sub_type"] == "ACTOR_SUB_SOLDIER" and organ["camp"] != camp]
+
+    # Soldier last hits of the main hero minus those of the enemy hero
+    # 己方英雄补刀数减去敌方英雄补刀数
+    def last_hit_diff(self, main_hero, enemy_hero):
+        main_id = main_hero["actor_state"]["runtime_id"]
+        enemy_id = enemy_hero["actor_state"]["runtime_id"]
+        last_hit = self.soldier_kills_by_killer.get(main_id, 0)
+        if enemy_id != main_id:
+            last_hit -= self.soldier_kills_by_killer.get(enemy_id, 0)
+        return float(last_hit)
+
+
+# Attributes of GameRewardManager holding scalars or values never changed in place, kept as they are by snapshot
+# GameRewardManager中保存标量或不会被原地修改的值的属性，snapshot直接保存
+SNAPSHOT_ATTRS = (
+    "main_hero_camp",
+    "m_last_frame_no",
+    "m_last_frame_totalHurtToHero",
+    "m_last_frame_totalBeHurtByHero",
+    "m_last_frame_soldier_av_hp",
+    "m_last_frame_hp",
+    "m_last_frame_grass_status",
+    "m_last_frame_received_enemy_hurt",
+    "m_last_frame_pos",
+    "m_last_frame_target",
+    "m_episode_context",
+    "m_accumulated_values",
+)
 
 
 class GameRewardManager:
@@ -39,9 +157,6 @@ class GameRewardManager:
         self.main_hero_organ_hp = -1
         self.m_reward_value = {}
         self.m_last_frame_no = -1
-        self.m_cur_calc_frame_map = init_calc_frame_map()
-        self.m_main_calc_frame_map = init_calc_frame_map()
-        self.m_enemy_calc_frame_map = init_calc_frame_map()
         self.m_init_calc_frame_map = {}
         self.time_scale_arg = GameConfig.TIME_SCALE_ARG
         self.m_main_hero_config_id = -1
@@ -51,6 +166,11 @@ class GameRewardManager:
         self.m_last_frame_soldier_av_hp = -1#add
         self.main_soldiers = []
         self.enemy_soldiers = []
+        self.camp_frame = None
+        # SoldierRegistry of the enemy soldiers of each camp, the one of the camp of the last set_cur_calc_frame_vec call
+        # 每个阵营敌方小兵的SoldierRegistry，以及最近一次set_cur_calc_frame_vec调用的阵营所对应的registry
+        self.m_soldier_registries = {}
+        self.enemy_soldier_registry = SoldierRegistry()
         self.m_last_frame_hp = -1 # added
         self.m_last_frame_grass_status = False # added
         self.m_last_frame_received_enemy_hurt = -1 # added
@@ -58,261 +178,216 @@ class GameRewardManager:
         self.m_last_frame_pos = [] #add
         self.m_last_frame_target = None
         self.last_few_frame_hp = deque(maxlen=8)
-        
+        # Static data of the episode, built on the first frame of each episode seen by result
+        # 对局的静态数据，在result收到的每局第一帧构建
+        self.m_episode_context = None
+        # Decayed reward values summed since the last take_accumulated_reward, None when not accumulating
+        # 自上一次take_accumulated_reward以来累加的衰减后回报值，不累加时为None
+        self.m_accumulated_values = None
+        self.m_accumulated_reward = {}
+        self.init_max_exp_of_each_hero()
+
+        # Compile REWARD_WEIGHT_DICT into the per-frame plan once, items of weight 0 are left out
+        # 将REWARD_WEIGHT_DICT编译为逐帧计算计划，权重为0的子项不参与计算
+        # Items that only read the frame are shared through the CampFrame, the others read the state of this manager
+        # 只读取帧数据的子项通过CampFrame共享，其余子项依赖本管理器的状态
+        # Each reward item has a fixed index into the value lists, the reward value of the frame and the weight of
+        # reward_sum, which is stored after the last item
+        # 每个奖励子项在各值列表中有固定下标，包括该帧奖励值和权重，reward_sum保存在最后一个子项之后
+        reward_names = compile_reward_names(GameConfig.REWARD_WEIGHT_DICT)
+        self.m_reward_keys = reward_names + ["reward_sum"]
+        self.m_reward_weights = [GameConfig.REWARD_WEIGHT_DICT[reward_name] for reward_name in reward_names]
+        self.m_reward_values = [0.0] * len(self.m_reward_keys)
+        self.m_main_values = CampRewardValues(len(reward_names))
+        self.m_enemy_values = CampRewardValues(len(reward_names))
+        self.m_shared_extract_plan = []
+        self.m_extract_plan = []
+        self.m_combine_plan = []
+        # With GameConfig.REWARD_PROFILE the plan holds profiled wrappers, otherwise the functions themselves
+        # 开启GameConfig.REWARD_PROFILE时计划中为带统计的包装函数，否则为函数本身
+        self.m_profile = {} if GameConfig.REWARD_PROFILE else None
+        for index, reward_name in enumerate(reward_names):
+            reward_term = get_reward_term(reward_name)
+            extract, combine = reward_term.extract, reward_term.combine
+            if self.m_profile is not None:
+                self.m_profile[reward_name] = RewardProfile()
+                if extract is not None:
+                    extract = profiled(extract, self.m_profile[reward_name].extract)
+                combine = profiled(combine, self.m_profile[reward_name].combine)
+            if extract is not None:
+                if reward_term.shared:
+                    self.m_shared_extract_plan.append((reward_name, index, extract))
+                else:
+                    self.m_extract_plan.append((index, extract))
+            self.m_combine_plan.append((index, combine))
 
     # Used to initialize the maximum experience value for each agent level
     # 用于初始化智能体各个等级的最大经验值
     def init_max_exp_of_each_hero(self):
         self.m_each_level_max_exp.clear()
-        self.m_each_level_max_exp[1] = 160
-        self.m_each_level_max_exp[2] = 298
-        self.m_each_level_max_exp[3] = 446
-        self.m_each_level_max_exp[4] = 524
-        self.m_each_level_max_exp[5] = 613
-        self.m_each_level_max_exp[6] = 713
-        self.m_each_level_max_exp[7] = 825
-        self.m_each_level_max_exp[8] = 950
-        self.m_each_level_max_exp[9] = 1088
-        self.m_each_level_max_exp[10] = 1240
-        self.m_each_level_max_exp[11] = 1406
-        self.m_each_level_max_exp[12] = 1585
-        self.m_each_level_max_exp[13] = 1778
-        self.m_each_level_max_exp[14] = 1984
-
-    def result(self, frame_data):
-        self.init_max_exp_of_each_hero()
-        self.frame_data_process(frame_data)
-        self.get_reward(frame_data, self.m_reward_value)
-        self.last_frame_data_process(frame_data)
-
-        frame_no = frame_data["frameNo"]
+        for level, max_exp in enumerate(LEVEL_MAX_EXP, 1):
+            self.m_each_level_max_exp[level] = max_exp
+
+    # frame_index can be built once by the caller and shared by the managers of both agents
+    # frame_index可以由调用方构建一次，供双方智能体的奖励管理器共享
+    def result(self, frame_data, frame_index=None):
+        if frame_index is None:
+            frame_index = FrameIndex(frame_data)
+        # A frame that does not follow the last one starts a new episode
+        # 不在上一帧之后的帧表示新的一局开始
+        if self.m_episode_context is None or frame_index.frame_no <= self.m_last_frame_no:
+            self.m_episode_context = EpisodeContext(frame_index)
+        self.frame_data_process(frame_index)
+        self.get_reward(frame_index)
+        self.last_frame_data_process(frame_index)
+
+        frame_no = frame_index.frame_no
         self.m_last_frame_no = frame_no-1
+        reward_values = self.m_reward_values
         if self.time_scale_arg > 0:
-            for key in self.m_reward_value:
-                self.m_reward_value[key] *= math.pow(0.6, 1.0 * frame_no / self.time_scale_arg)
+            time_decay = math.pow(0.6, 1.0 * frame_no / self.time_scale_arg)
+            reward_values = [value * time_decay for value in reward_values]
+        if self.m_accumulated_values is not None:
+            self.m_accumulated_values = list(map(operator.add, self.m_accumulated_values, reward_values))
+
+        # The same dict is updated every frame, its keys are the reward items in plan order followed by reward_sum
+        # 每帧更新同一个字典，其键为按计划顺序的奖励子项，最后为reward_sum
+        self.m_reward_value.update(zip(self.m_reward_keys, reward_values))
+        return self.m_reward_value
 
+    # Sum the decayed rewards of every result into one reward for agents deciding every few frames, see
+    # GameConfig.DECISION_INTERVAL. Sums from before the call are dropped
+    # 为每隔若干帧决策的智能体将每次result的衰减后回报累加为一个回报，见GameConfig.DECISION_INTERVAL。丢弃调用前的累加值
+    def set_accumulate(self, enabled):
+        self.m_accumulated_values = [0.0] * len(self.m_reward_keys) if enabled else None
+
+    # Reward dict of the frames since the last call, with the keys of the dict result returns. The same dict is
+    # updated every call
+    # 自上一次调用以来各帧的回报字典，键与result返回的字典相同。每次调用更新同一个字典
+    def take_accumulated_reward(self):
+        self.m_accumulated_reward.update(zip(self.m_reward_keys, self.m_accumulated_values))
+        self.m_accumulated_values = [0.0] * len(self.m_reward_keys)
+        return self.m_accumulated_reward
+
+    # Wall time in seconds and calls of extract and combine of each reward item since this manager was made,
+    # None when GameConfig.REWARD_PROFILE is off. A shared extract is counted by the manager that computed it
+    # 自本管理器创建以来每个奖励子项extract和combine的耗时(秒)和调用次数，GameConfig.REWARD_PROFILE关闭时为None。
+    # 共享的extract计入实际计算它的管理器
+    def profile_snapshot(self):
+        if self.m_profile is None:
+            return None
+        return {
+            reward_name: {
+                "extract_calls": profile.extract[0],
+                "extract_time": profile.extract[1],
+                "combine_calls": profile.combine[0],
+                "combine_time": profile.combine[1],
+            }
+            for reward_name, profile in self.m_profile.items()
+        }
+
+    # The state carried from one frame to the next, enough for restore to continue the episode from this frame.
+    # Scalars are kept as they are, lists and dicts are copied, the episode context is shared
+    # 从一帧传递到下一帧的状态，restore后可以从该帧继续对局。标量直接保存，列表和字典复制，对局上下文共享
+    def snapshot(self):
+        state = {name: getattr(self, name) for name in SNAPSHOT_ATTRS}
+        state["last_few_frame_hp"] = tuple(self.last_few_frame_hp)
+        state["reward_value"] = dict(self.m_reward_value)
+        state["accumulated_reward"] = dict(self.m_accumulated_reward)
+        state["reward_values"] = tuple(self.m_reward_values)
+        state["camp_values"] = tuple(
+            (tuple(camp_values.cur), tuple(camp_values.last))
+            for camp_values in (self.m_main_values, self.m_enemy_values)
+        )
+        state["soldier_registries"] = {
+            camp: soldier_registry.snapshot() for camp, soldier_registry in self.m_soldier_registries.items()
+        }
+        state["enemy_soldier_camp"] = next(
+            (
+                camp
+                for camp, soldier_registry in self.m_soldier_registries.items()
+                if soldier_registry is self.enemy_soldier_registry
+            ),
+            None,
+        )
+        return state
+
+    # Go back to the state of snapshot, returns the reward dict of that frame, the same dict result returns or the one
+    # of take_accumulated_reward when accumulating
+    # 恢复到snapshot时的状态，返回该帧的回报字典，即result返回的同一个字典，累加时为take_accumulated_reward返回的字典
+    def restore(self, state):
+        for name in SNAPSHOT_ATTRS:
+            setattr(self, name, state[name])
+        self.last_few_frame_hp = deque(state["last_few_frame_hp"], maxlen=8)
+        self.m_reward_value.clear()
+        self.m_reward_value.update(state["reward_value"])
+        self.m_accumulated_reward.clear()
+        self.m_accumulated_reward.update(state["accumulated_reward"])
+        self.m_reward_values[:] = state["reward_values"]
+        for camp_values, (cur, last) in zip((self.m_main_values, self.m_enemy_values), state["camp_values"]):
+            camp_values.cur[:], camp_values.last[:] = cur, last
+        self.m_soldier_registries = {}
+        for camp, soldier_state in state["soldier_registries"].items():
+            soldier_registry = self.m_soldier_registries[camp] = SoldierRegistry()
+            soldier_registry.restore(soldier_state)
+        self.enemy_soldier_registry = self.m_soldier_registries.get(state["enemy_soldier_camp"]) or SoldierRegistry()
+        if self.m_accumulated_values is not None:
+            return self.m_accumulated_reward
         return self.m_reward_value
 
     # Calculate the value of each reward item in each frame
     # 计算每帧的每个奖励子项的信息
-    # main_hero, enemy_hero = None, None
-    # main_tower, main_spring, enemy_tower, enemy_spring, main_soldiers,enemy_soldiers = None, None, None, None,[],[]
-    def set_cur_calc_frame_vec(self, cul_calc_frame_map, frame_data, camp):
-        #global main_hero, enemy_hero, main_tower, main_spring, enemy_tower, enemy_spring, main_soldiers, enemy_soldiers
-
-        # Get both agents
-        # 获取双方智能体
-        #print(self.last_few_frame_hp)
-        main_hero, enemy_hero = None, None
-        hero_list = frame_data["hero_states"]
-        for hero in hero_list:
-            hero_camp = hero["actor_state"]["camp"]
-            if hero_camp == camp:
-                main_hero = hero
-            else:
-                enemy_hero = hero
-        main_hero_hp = main_hero["actor_state"]["hp"]
-        #print(main_hero_hp)
-        main_hero_max_hp = main_hero["actor_state"]["max_hp"]
-        main_hero_ep = main_hero["actor_state"]["values"]["ep"]
-        main_hero_max_ep = main_hero["actor_state"]["values"]["max_ep"]
-        
-        # Get both defense towers
-        # 获取双方防御塔和小兵
-        main_tower, main_spring, enemy_tower, enemy_spring, main_soldiers,enemy_soldiers = None, None, None, None,[],[]
-        self.main_soldiers.clear()
-        self.enemy_soldiers.clear()
-
-        npc_list = frame_data["npc_states"]
-        for organ in npc_list:
-            organ_camp = organ["camp"]
-            organ_subtype = organ["sub_type"]
-            if organ_camp == camp:
-                if organ_subtype == "ACTOR_SUB_TOWER":  # 21 is ACTOR_SUB_TOWER, normal tower
-                    main_tower = organ
-                elif organ_subtype == "ACTOR_SUB_CRYSTAL":  # 24 is ACTOR_SUB_CRYSTAL, base crystal
-                    main_spring = organ
-                elif organ_subtype == "ACTOR_SUB_SOLDIER":
-                    self.main_soldiers.append(organ)
-            else:
-                if organ_subtype == "ACTOR_SUB_TOWER":  # 21 is ACTOR_SUB_TOWER, normal tower
-                    enemy_tower = organ
-                elif organ_subtype == "ACTOR_SUB_CRYSTAL":  # 24 is ACTOR_SUB_CRYSTAL, base crystal
-                    enemy_spring = organ
-                elif organ_subtype == "ACTOR_SUB_SOLDIER":
-                    self.enemy_soldiers.append(organ)
-        #print(main_tower)
-        hit_target_info = main_hero["actor_state"].get("hit_target_info", None)
-        tower_hit_tar_info =  main_tower['attack_target']#.get("hit_target_info", None)
-        #print(main_hero['skill_state'])
-
-        for reward_name, reward_struct in cul_calc_frame_map.items():
-            reward_struct.last_frame_value = reward_struct.cur_frame_value
-            # Money
-            # 金钱
-            if reward_name == "money":
-                reward_struct.cur_frame_value = main_hero["moneyCnt"]
-            # Health points
-            # 生命值
-            elif reward_name == "hp_point":
-                reward_struct.cur_frame_value = math.sqrt(math.sqrt(1.0 * main_hero_hp / main_hero_max_hp))
-            # Energy points
-            # 法力值
-            elif reward_name == "ep_rate":
-                if main_hero_max_ep == 0 or main_hero_hp <= 0:
-                    reward_struct.cur_frame_value = 0
-                else:
-                    reward_struct.cur_frame_value = main_hero_ep / float(main_hero_max_ep)
-            # Kills
-            # 击杀
-            elif reward_name == "kill":
-                reward_struct.cur_frame_value = main_hero["killCnt"]
-            # Deaths
-            # 死亡
-            elif reward_name == "death":
-                reward_struct.cur_frame_value = main_hero["deadCnt"]
-            # Tower health points
-            # 塔血量
-            elif reward_name == "tower_hp_point":
-                reward_struct.cur_frame_value = 1.0 * main_tower["hp"] / main_tower["max_hp"]
-            # Last hit
-            # 补刀
-            elif reward_name == "last_hit":
-                reward_struct.cur_frame_value = 0.0
-                frame_action = frame_data["frame_action"]
-                if "dead_action" in frame_action:
-                    dead_actions = frame_action["dead_action"]
-                    for dead_action in dead_actions:
-                        if (
-                            dead_action["killer"]["runtime_id"] == main_hero["actor_state"]["runtime_id"]
-                            and dead_action["death"]["sub_type"] == "ACTOR_SUB_SOLDIER"
-                        ):
-                            reward_struct.cur_frame_value += 1.0
-                        elif (
-                            dead_action["killer"]["runtime_id"] == enemy_hero["actor_state"]["runtime_id"]
-                            and dead_action["death"]["sub_type"] == "ACTOR_SUB_SOLDIER"
-                        ):
-                            reward_struct.cur_frame_value -= 1.0
-            # Experience points
-            # 经验值
-            elif reward_name == "exp":
-                reward_struct.cur_frame_value = self.calculate_exp_sum(main_hero)
-            # Forward
-            # 前进
-            elif reward_name == "forward":
-                reward_struct.cur_frame_value = self.calculate_forward(main_hero, main_tower, enemy_tower,main_spring)
-            
-            elif reward_name == "heal":
-                reward_struct.cur_frame_value = main_hero['skill_state']['slot_states'][4]['usedTimes']
-            
-            elif reward_name == "skill_hit_count":
-                reward_struct.cur_frame_value = sum(main_hero['skill_state']['slot_states'][n]['hitHeroTimes'] for n in range(len(main_hero['skill_state']['slot_states'])))
-
-
-            #对英雄输出
-            elif reward_name == "HurtToHero":
-                distance_to_enemy = self.calculate_distance(main_hero["actor_state"]["location"],enemy_hero["actor_state"]["location"])
-                #balance_rate 用来鼓励优先攻击英雄，当敌人处于攻击范围时
-                #hp_diff = main_hero["actor_state"]["hp"]/main_hero["actor_state"]["max_hp"]-enemy_hero["actor_state"]["hp"]/enemy_hero["actor_state"]["max_hp"]
-                balance_rate = 1
-                if distance_to_enemy <= main_hero['actor_state']['attack_range']:
-                    balance_rate = 1.2
-                #血量优劣势调整奖励
-                # if hp_diff>0.05:
-                #     balance_rate *=(1+hp_diff)
-                # if hp_diff<-0.35:
-                #     balance_rate*=hp_diff
-                #草丛
-                if main_hero["isInGrass"] is True:
-                    balance_rate+=0.1
-                #走位
-                if self.m_last_frame_pos != (main_hero["actor_state"]["location"]["x"],main_hero["actor_state"]["location"]["z"]):
-                    balance_rate+=0.1
-                reward_struct.cur_frame_value = (main_hero["totalHurtToHero"]-self.m_last_frame_totalHurtToHero)*balance_rate/enemy_hero['actor_state']['max_hp']*math.sqrt(main_hero_hp/main_hero_max_hp)
-            
-            elif reward_name == "HurtToOthers":
-                balance_rate = 1
-                if hit_target_info is not None and 'conti_hit_count' in hit_target_info[0]:
-                    #print(max([item['conti_hit_count'] for item in hit_target_info if 'conti_hit_count' in item]))
-                    balance_rate+=0.03*max([item['conti_hit_count'] for item in hit_target_info if 'conti_hit_count' in item])
-                reward_struct.cur_frame_value = (main_hero["totalHurt"]-main_hero["totalHurtToHero"])/100000*balance_rate*math.sqrt(main_hero_hp/main_hero_max_hp)
-
-            #承受英雄伤害
-            elif reward_name == "BeHurtByHero":
-                reward_struct.cur_frame_value = (main_hero["totalBeHurtByHero"]-self.m_last_frame_totalBeHurtByHero)/main_hero["actor_state"]["max_hp"]*math.exp(-math.sqrt(main_hero_ep/main_hero_max_hp)/2)
-            
-            elif reward_name == "enemy_Soldiers_hp":
-                balance_rate=1
-                total_hp = 0
-                average_hp = 0
-                if self.enemy_soldiers == []:
-                    reward_struct.cur_frame_value = 0
-                else:
-                # hit_target_info = main_hero["actor_state"].get("hit_target_info", None)
-                # tower_hit_tar_info =  main_tower["actor_state"].get("hit_target_info", None)
-                    if_hit_solder = 0
-                    if_main_hit_solder = 0
-                    for soldier in self.enemy_soldiers:
-                        if soldier['runtime_id'] ==tower_hit_tar_info: #['hit_target']:
-                            if_main_hit_solder +=1
-                        if hit_target_info != None and soldier['runtime_id'] ==hit_target_info[0]['hit_target']:
-                            if_hit_solder +=1
-
-                    if  if_hit_solder!=0 :
-                        balance_rate *=1.05
-                    
-                    if self.main_soldiers != []:
-                       
-                        furthest_main_soldier = max(self.main_soldiers, key=lambda s: s['location']['z'])
-                        max_distance=-1
-                        for soldier in self.enemy_soldiers:
-                            distance = self.calculate_distance(furthest_main_soldier['location'], soldier ['location'])
-                            if distance > max_distance:
-                                max_distance = distance
-                                furthest_enemy_soldier_runtime_id = soldier ['runtime_id']
-                        #hit_target_info = main_hero["actor_state"].get("hit_target_info", None)
-                        
-                        if if_main_hit_solder!=0 and if_hit_solder !=0:
-                            balance_rate+=0.2
-                        #优先攻击后排小兵
-                        if hit_target_info is not None and hit_target_info == furthest_enemy_soldier_runtime_id:
-                            balance_rate+=0.1
-                
-                    if self.m_last_frame_soldier_av_hp == 0:
-                             balance_rate=0
-                    for soldier in self.enemy_soldiers:
-                        total_hp+=soldier['hp']/soldier['max_hp']
-                    
-                    average_hp = self.m_last_frame_soldier_av_hp-total_hp/len(self.enemy_soldiers)
-
-                    reward_struct.cur_frame_value = average_hp*balance_rate
-                    #print(reward_struct.cur_frame_value)
+    def set_cur_calc_frame_vec(self, camp_values, frame_index, camp):
+        camp_frame = frame_index.camp_frame(camp)
+        self.main_soldiers = camp_frame.main_soldiers
+        self.enemy_soldiers = camp_frame.enemy_soldiers
+        self.camp_frame = camp_frame
+        soldier_registry = self.m_soldier_registries.get(camp)
+        if soldier_registry is None:
+            soldier_registry = self.m_soldier_registries[camp] = SoldierRegistry()
+        soldier_registry.update(camp_frame.enemy_soldiers)
+        self.enemy_soldier_registry = soldier_registry
+
+        cur_values = camp_values.rotate()
+        shared_values = camp_frame.shared_values
+        for reward_name, index, extract in self.m_shared_extract_plan:
+            value = shared_values.get(reward_name)
+            if value is None:
+                value = shared_values[reward_name] = extract(self, camp_frame)
+            cur_values[index] = value
+
+        for index, extract in self.m_extract_plan:
+            cur_values[index] = extract(self, camp_frame)
     
     
     # Calculate the total amount of experience gained using agent level and current experience value
     # 用智能体等级和当前经验值，计算获得经验值的总量
     def calculate_exp_sum(self, this_hero_info):
-        exp_sum = 0.0
-        for i in range(1, this_hero_info["level"]):
-            exp_sum += self.m_each_level_max_exp[i]
-        exp_sum += this_hero_info["exp"]
-        return exp_sum
+        exp_prefix = self.m_episode_context.exp_prefix(this_hero_info["actor_state"].get("config_id"))
+        return exp_prefix[this_hero_info["level"]] + this_hero_info["exp"]
 
     # Calculate the forward reward based on the distance between the agent and both defensive towers
     # 用智能体到双方防御塔的距离，计算前进奖励
+    # Structures do not move within an episode, their positions and distances come from the episode context.
+    # The distances of the hero and soldiers only depend on the frame, they are kept in the CampFrame shared with the
+    # manager of the other agent
+    # 对局中建筑不会移动，其位置和距离来自对局上下文。英雄和小兵的距离只取决于帧数据，保存在与另一智能体奖励管理器共享的CampFrame中
     def calculate_forward(self, main_hero, main_tower, enemy_tower,main_spring):
-        main_tower_pos = (main_tower["location"]["x"], main_tower["location"]["z"])
-        enemy_tower_pos = (enemy_tower["location"]["x"], enemy_tower["location"]["z"])
-        main_spring_pos = (main_spring["location"]["x"], main_spring["location"]["z"])
-        hero_pos = (
-            main_hero["actor_state"]["location"]["x"],
-            main_hero["actor_state"]["location"]["z"],
+        main_tower_pos, enemy_tower_pos, main_spring_pos, dist_main2emy, dist_main2spring = (
+            self.m_episode_context.forward_structures(main_tower, enemy_tower, main_spring)
         )
+        camp_frame = self.camp_frame
+        if camp_frame.hero_forward_distances is None:
+            hero_pos = (
+                main_hero["actor_state"]["location"]["x"],
+                main_hero["actor_state"]["location"]["z"],
+            )
+            camp_frame.hero_forward_distances = (
+                math.dist(hero_pos, main_spring_pos),
+                math.dist(hero_pos, enemy_tower_pos),
+            )
         forward_value = 0
-        dist_hero2spring = math.dist(hero_pos, main_spring_pos)
-        dist_hero2emy = math.dist(hero_pos, enemy_tower_pos)
-        dist_main2emy = math.dist(main_tower_pos, enemy_tower_pos)
-        dist_main2spring = math.dist(main_spring_pos,main_tower_pos)
+        dist_hero2spring, dist_hero2emy = camp_frame.hero_forward_distances
         #战场前
         if dist_hero2emy > dist_main2emy:
             #进入战场
@@ -335,8 +410,10 @@ class GameRewardManager:
                 forward_value +=(dist_hero2emy - dist_main2emy)/dist_main2emy*math.exp(-main_hero["actor_state"]["hp"] / main_hero["actor_state"]["max_hp"])
                 #print("撤离战场")
             if self.main_soldiers != []:
-                s_pos = (self.main_soldiers[0]["location"]["x"],self.main_soldiers[0]["location"]["z"])
-                dist_s2emy = math.dist(s_pos,enemy_tower_pos)
+                dist_s2emy = camp_frame.soldier_to_enemy_tower
+                if dist_s2emy is None:
+                    s_pos = (self.main_soldiers[0]["location"]["x"],self.main_soldiers[0]["location"]["z"])
+                    dist_s2emy = camp_frame.soldier_to_enemy_tower = math.dist(s_pos,enemy_tower_pos)
                 if dist_hero2emy >8800 and dist_hero2emy >=dist_s2emy:
                     #鼓励朝塔前进
                     forward_value += (dist_hero2emy-dist_s2emy)/dist_main2emy*500
@@ -344,8 +421,10 @@ class GameRewardManager:
        
             #鼓励守塔
         if self.enemy_soldiers!=[] and len(self.enemy_soldiers)>=2:
-            es_pos = (self.enemy_soldiers[0]["location"]["x"],self.enemy_soldiers[0]["location"]["z"])
-            dist_es2main = math.dist(es_pos,main_tower_pos)
+            dist_es2main = camp_frame.enemy_soldier_to_main_tower
+            if dist_es2main is None:
+                es_pos = (self.enemy_soldiers[0]["location"]["x"],self.enemy_soldiers[0]["location"]["z"])
+                dist_es2main = camp_frame.enemy_soldier_to_main_tower = math.dist(es_pos,main_tower_pos)
             if dist_es2main<9000 and dist_hero2emy < dist_main2emy-9000:
                 forward_value +=(dist_hero2emy - dist_main2emy ) / dist_main2emy
                 #print("鼓励守塔")
@@ -353,50 +432,33 @@ class GameRewardManager:
         return forward_value
     
     # 用帧数据来计算两边的奖励子项信息
-    def frame_data_process(self, frame_data):
-        main_camp, enemy_camp = -1, -1
-        for hero in frame_data["hero_states"]:
-            if hero["player_id"] == self.main_hero_player_id:
-                main_camp = hero["actor_state"]["camp"]
-                self.main_hero_camp = main_camp
-            else:
-                enemy_camp = hero["actor_state"]["camp"]
-        self.set_cur_calc_frame_vec(self.m_main_calc_frame_map, frame_data, main_camp)
-        self.set_cur_calc_frame_vec(self.m_enemy_calc_frame_map, frame_data, enemy_camp)
+    def frame_data_process(self, frame_index):
+        main_hero, main_camp, enemy_camp = frame_index.main_hero_and_camps(self.main_hero_player_id)
+        if main_hero is not None:
+            self.main_hero_camp = main_camp
+        self.set_cur_calc_frame_vec(self.m_main_values, frame_index, main_camp)
+        self.set_cur_calc_frame_vec(self.m_enemy_values, frame_index, enemy_camp)
     
 ###########################################################
-    def last_frame_data_process(self, frame_data):
-        main_camp, enemy_camp = -1, -1
-        for hero in frame_data["hero_states"]:
-            if hero["player_id"] == self.main_hero_player_id:
-                main_camp = hero["actor_state"]["camp"]
-                self.m_last_frame_hp = hero["actor_state"]["hp"]
-                if hero["actor_state"].get("hit_target_info", None) is not None:
-                    self.m_last_frame_target = hero["actor_state"].get("hit_target_info", None)[0]['hit_target']  
-                else:
-                    self.m_last_frame_target = None
-                self.m_last_frame_pos = (hero["actor_state"]["location"]["x"],hero["actor_state"]["location"]["z"])
-                self.m_last_frame_grass_status = hero["isInGrass"]
-                self.m_last_frame_received_enemy_hurt = hero["totalBeHurtByHero"]
-                self.main_hero_camp = main_camp
-                self.m_last_frame_totalHurtToHero =hero["totalHurtToHero"]
-                self.m_last_frame_totalBeHurtByHero =hero["totalBeHurtByHero"]
-                #self.last_few_frame_hp.append(hero["actor_state"]["hp"])
-                #print(hero["actor_state"]["hp"]/hero["actor_state"]["max_hp"])
-                if hero["actor_state"]["hp"]== 0:
-                    self.last_few_frame_hp = deque(maxlen=8)
-                else:
-                    self.last_few_frame_hp.append(hero["actor_state"]["hp"]/hero["actor_state"]["max_hp"])
-                #print(self.last_few_frame_hp)
-                if self.enemy_soldiers != []:
-                    total_hp = 0
-                    for soldier in self.enemy_soldiers:
-                        total_hp+=soldier['hp']/soldier['max_hp']
-                    self.m_last_frame_soldier_av_hp = total_hp/len(self.enemy_soldiers)
-                else:self.m_last_frame_soldier_av_hp = 0
-                #print(self.m_last_frame_soldier_av_hp)
+    def last_frame_data_process(self, frame_index):
+        hero = frame_index.hero_by_player_id.get(self.main_hero_player_id)
+        if hero is not None:
+            self.m_last_frame_hp = hero["actor_state"]["hp"]
+            if hero["actor_state"].get("hit_target_info", None) is not None:
+                self.m_last_frame_target = hero["actor_state"].get("hit_target_info", None)[0]['hit_target']  
             else:
-                enemy_camp = hero["actor_state"]["camp"]
+                self.m_last_frame_target = None
+            self.m_last_frame_pos = (hero["actor_state"]["location"]["x"],hero["actor_state"]["location"]["z"])
+            self.m_last_frame_grass_status = hero["isInGrass"]
+            self.m_last_frame_received_enemy_hurt = hero["totalBeHurtByHero"]
+            self.main_hero_camp = hero["actor_state"]["camp"]
+            self.m_last_frame_totalHurtToHero =hero["totalHurtToHero"]
+            self.m_last_frame_totalBeHurtByHero =hero["totalBeHurtByHero"]
+            if hero["actor_state"]["hp"]== 0:
+                self.last_few_frame_hp = deque(maxlen=8)
+            else:
+                self.last_few_frame_hp.append(hero["actor_state"]["hp"]/hero["actor_state"]["max_hp"])
+            self.m_last_frame_soldier_av_hp = self.enemy_soldier_registry.average_hp_ratio()
 #######################################################################
 
 #################################################################
@@ -418,189 +480,519 @@ class GameRewardManager:
 
     
 ##################################################################  
-    def get_reward(self, frame_data, reward_dict):
-        reward_dict.clear()
-        reward_sum, weight_sum = 0.0, 0.0
-     
-        for reward_name, reward_struct in self.m_cur_calc_frame_map.items():
-            if reward_name == "hp_point":
-                balance_rate = 1
-                if frame_data['frameNo']>8000:
-                    balance_rate = 1.2
-                if (
-                    self.m_main_calc_frame_map[reward_name].last_frame_value == 0.0
-                    and self.m_enemy_calc_frame_map[reward_name].last_frame_value == 0.0
-                ):
-                    reward_struct.cur_frame_value = 0
-                    reward_struct.last_frame_value = 0
-                elif self.m_main_calc_frame_map[reward_name].last_frame_value == 0.0:
-                    reward_struct.cur_frame_value = 0 - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                    reward_struct.last_frame_value = 0 - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                elif self.m_enemy_calc_frame_map[reward_name].last_frame_value == 0.0:
-                    reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value - 0
-                    reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value - 0
-                else:
-                    reward_struct.cur_frame_value = (
-                        self.m_main_calc_frame_map[reward_name].cur_frame_value
-                        - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                    )
-                    reward_struct.last_frame_value = (
-                        self.m_main_calc_frame_map[reward_name].last_frame_value
-                        - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                    )
-                reward_struct.value =(reward_struct.cur_frame_value - reward_struct.last_frame_value)*balance_rate
-                #(f'{reward_name}:{reward_struct.value}\n')
-            elif reward_name == "ep_rate":
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value
-                if reward_struct.last_frame_value > 0:
-                    reward_struct.value = reward_struct.cur_frame_value - reward_struct.last_frame_value
-                else:
-                    reward_struct.value = 0
-            
-            elif reward_name == "exp":
-                main_hero = None
-                for hero in frame_data["hero_states"]:
-                    if hero["player_id"] == self.main_hero_player_id:
-                        main_hero = hero
-                if main_hero and main_hero["level"] >= 15:
-                    reward_struct.value = 0
-                else:
-                    reward_struct.cur_frame_value = (
-                        self.m_main_calc_frame_map[reward_name].cur_frame_value
-                        - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                    )
-                    reward_struct.last_frame_value = (
-                        self.m_main_calc_frame_map[reward_name].last_frame_value
-                        - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                    )
-                    reward_struct.value = reward_struct.cur_frame_value - reward_struct.last_frame_value
-                    reward_struct.value /=50
-            
-            elif reward_name == "forward":
-                reward_struct.value = self.m_main_calc_frame_map[reward_name].cur_frame_value/1000
-                #print(f'{reward_name}:{reward_struct.value}\n')
-            
-            elif reward_name == "last_hit":
-                reward_struct.value = self.m_main_calc_frame_map[reward_name].cur_frame_value
-           
-            elif reward_name == "kill":
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value
-                balance_rate = -1
-                if frame_data['frameNo']>6000 or reward_struct.cur_frame_value >=2 :
-                    balance_rate = 1
-                reward_struct.value = (reward_struct.cur_frame_value - reward_struct.last_frame_value)*balance_rate
-
-            elif reward_name == "death":
-                balance_rate = 1
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value
-                if frame_data['frameNo']>5000:
-                    balance_rate *=1.00005**frame_data['frameNo']
-                reward_struct.value = (reward_struct.cur_frame_value - reward_struct.last_frame_value)*balance_rate
-                
-
-            elif reward_name =='heal':
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value
-                if_use = reward_struct.cur_frame_value - reward_struct.last_frame_value
-                main_hero = None
-                for hero in frame_data["hero_states"]:
-                    if hero["player_id"] == self.main_hero_player_id:
-                        main_hero = hero
-                
-                if  int(if_use):
-                    if main_hero["actor_state"]["hp"]/main_hero["actor_state"]["max_hp"]>0.85:
-                        balance_rate -= 0.3+main_hero["actor_state"]["hp"]/main_hero["actor_state"]["max_hp"]
-                
-                #print(main_hero['buff_state']['buff_marks'])
-                else:
-                    balance_rate = 0
-                check_hp = self.check_hp(self.last_few_frame_hp)
-                #print(check_hp)
-                if check_hp > 0:
-                    balance_rate += self.check_hp(self.last_few_frame_hp)
-                reward_struct.value = balance_rate
-                
-                #print(f'{reward_name}:{reward_struct.value}')
-
-            elif reward_name == "skill_hit_count":
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                reward_struct.value = reward_struct.cur_frame_value - reward_struct.last_frame_value
-
-
-
-            elif reward_name == "HurtToHero":
-
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                reward_struct.value = (reward_struct.cur_frame_value - reward_struct.last_frame_value)*100
-                #print(f'{reward_name}:{reward_struct.value}\n')
-                
-
-            elif reward_name == "BeHurtByHero":
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                #distance_to_enemy = self.calculate_distance(main_hero["actor_state"]["location"],enemy_hero["actor_state"]["location"])
-                reward_struct.value = (reward_struct.cur_frame_value - reward_struct.last_frame_value)*50
-                #print(f'{reward_name}:{reward_struct.value}')
-            
-            elif reward_name == "HurtToOthers":
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                reward_struct.value = (reward_struct.cur_frame_value - reward_struct.last_frame_value)*50
-                #print(f'{reward_name}:{reward_struct.value}')
-            
-            elif reward_name == "tower_hp_point":
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                reward_struct.value =(reward_struct.cur_frame_value - reward_struct.last_frame_value) 
-                #print(f'{reward_name}:{reward_struct.value}')
-
-            
-            elif reward_name == "enemy_Soldiers_hp":
-                
-                reward_struct.cur_frame_value = self.m_main_calc_frame_map[reward_name].cur_frame_value - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                reward_struct.last_frame_value = self.m_main_calc_frame_map[reward_name].last_frame_value - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                
-                reward_struct.value = (reward_struct.cur_frame_value - reward_struct.last_frame_value)*balance_rate*100
-                #print(f'{reward_name}:{reward_struct.value}\n')
-            
-            elif reward_name == "money":
-                reward_struct.cur_frame_value = (
-                    self.m_main_calc_frame_map[reward_name].cur_frame_value
-                    - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                )
-                reward_struct.last_frame_value = (
-                    self.m_main_calc_frame_map[reward_name].last_frame_value
-                    - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                )
-                reward_struct.value = (reward_struct.cur_frame_value - reward_struct.last_frame_value)/100
-            
-            else:
-                reward_struct.cur_frame_value = (
-                    self.m_main_calc_frame_map[reward_name].cur_frame_value
-                    - self.m_enemy_calc_frame_map[reward_name].cur_frame_value
-                )
-                reward_struct.last_frame_value = (
-                    self.m_main_calc_frame_map[reward_name].last_frame_value
-                    - self.m_enemy_calc_frame_map[reward_name].last_frame_value
-                )
-                reward_struct.value = reward_struct.cur_frame_value - reward_struct.last_frame_value
+    # Fill m_reward_values with the value of each reward item and their weighted sum
+    # 在m_reward_values中填入各奖励子项的值及其加权和
+    def get_reward(self, frame_index):
+        reward_frame = RewardFrame(
+            frame_index.frame_no,
+            frame_index.hero_by_player_id.get(self.main_hero_player_id),
+            self.check_hp(self.last_few_frame_hp),
+        )
+        main_cur, main_last = self.m_main_values.cur, self.m_main_values.last
+        enemy_cur, enemy_last = self.m_enemy_values.cur, self.m_enemy_values.last
+        reward_values = self.m_reward_values
+        for index, combine in self.m_combine_plan:
+            reward_values[index] = combine(
+                self, main_cur[index], main_last[index], enemy_cur[index], enemy_last[index], reward_frame
+            )
+        reward_values[-1] = sum(map(operator.mul, reward_values, self.m_reward_weights))
+
+
+# Data of one camp shared by the extractors of one set_cur_calc_frame_vec call
+# 单次set_cur_calc_frame_vec调用中各奖励子项共享的阵营数据
+class CampFrame:
+    def __init__(self, frame_index, camp):
+        self.frame_index = frame_index
+        # Get both agents
+        # 获取双方智能体
+        self.main_hero, self.enemy_hero = frame_index.split_by_camp(frame_index.hero_of_camp, camp)
+        main_actor_state = self.main_hero["actor_state"]
+        self.main_hero_hp = main_actor_state["hp"]
+        self.main_hero_max_hp = main_actor_state["max_hp"]
+        self.main_hero_ep = main_actor_state["values"]["ep"]
+        self.main_hero_max_ep = main_actor_state["values"]["max_ep"]
+
+        # Get both defense towers
+        # 获取双方防御塔和小兵
+        self.main_tower, self.enemy_tower = frame_index.split_by_camp(frame_index.tower_of_camp, camp)
+        self.main_spring, self.enemy_spring = frame_index.split_by_camp(frame_index.crystal_of_camp, camp)
+        self.main_soldiers = frame_index.main_soldiers_of(camp)
+        self.enemy_soldiers = frame_index.enemy_soldiers_of(camp)
+
+        self.hit_target_info = main_actor_state.get("hit_target_info", None)
+        self.tower_hit_tar_info = self.main_tower["attack_target"]
+
+        # Current frame values of the shared reward items of this camp
+        # 本阵营共享奖励子项的当前帧值
+        self.shared_values = {}
+        # Distances of calculate_forward, computed by the first manager that needs them
+        # calculate_forward使用的距离，由第一个需要的奖励管理器计算
+        self.hero_forward_distances = None
+        self.soldier_to_enemy_tower = None
+        self.enemy_soldier_to_main_tower = None
+
+
+# Soldiers of one side keyed by runtime_id, updated from the soldier list of each frame. Only spawned soldiers and
+# soldiers whose hp changed touch the running sum of hp / max_hp, soldiers missing from the frame are dropped as dead.
+# The sum is rebuilt when soldiers die, so the rounding of the deltas does not build up over an episode
+# 以runtime_id为键的单方小兵，由每帧的小兵列表更新。只有新出生和血量变化的小兵会更新hp / max_hp的累计和，帧中缺少的小兵视为死亡并移除。
+# 有小兵死亡时重新计算累计和，增量的舍入误差不会在对局中累积
+class SoldierRegistry:
+    def __init__(self):
+        # runtime_id -> [hp, max_hp, hp / max_hp, number of the last update that saw the soldier]
+        # runtime_id -> [hp, max_hp, hp / max_hp, 最近一次看到该小兵的更新序号]
+        self.soldiers = {}
+        self.total_hp_ratio = 0.0
+        self.update_no = 0
+
+    def __contains__(self, runtime_id):
+        return runtime_id in self.soldiers
+
+    def snapshot(self):
+        soldiers = {runtime_id: tuple(entry) for runtime_id, entry in self.soldiers.items()}
+        return soldiers, self.total_hp_ratio, self.update_no
+
+    def restore(self, state):
+        soldiers, self.total_hp_ratio, self.update_no = state
+        self.soldiers = {runtime_id: list(entry) for runtime_id, entry in soldiers.items()}
+
+    def __len__(self):
+        return len(self.soldiers)
+
+    def update(self, soldier_list):
+        self.update_no += 1
+        update_no = self.update_no
+        soldiers = self.soldiers
+        for soldier in soldier_list:
+            hp, max_hp = soldier["hp"], soldier["max_hp"]
+            entry = soldiers.get(soldier["runtime_id"])
+            if entry is None:
+                hp_ratio = hp / max_hp
+                soldiers[soldier["runtime_id"]] = [hp, max_hp, hp_ratio, update_no]
+                self.total_hp_ratio += hp_ratio
+                continue
+            entry[3] = update_no
+            if entry[0] != hp or entry[1] != max_hp:
+                hp_ratio = hp / max_hp
+                self.total_hp_ratio += hp_ratio - entry[2]
+                entry[0], entry[1], entry[2] = hp, max_hp, hp_ratio
+        if len(soldiers) > len(soldier_list):
+            for runtime_id in [runtime_id for runtime_id, entry in soldiers.items() if entry[3] != update_no]:
+                del soldiers[runtime_id]
+            self.total_hp_ratio = sum(entry[2] for entry in soldiers.values())
+
+    # Average hp / max_hp of the soldiers, 0 without soldiers
+    # 小兵hp / max_hp的平均值，没有小兵时为0
+    def average_hp_ratio(self):
+        if not self.soldiers:
+            return 0
+        return self.total_hp_ratio / len(self.soldiers)
+
+
+# Maximum exp of each level starting from level 1, the same table is used for every hero
+# 从1级开始每个等级的最大经验值，所有英雄使用同一张表
+LEVEL_MAX_EXP = (160, 298, 446, 524, 613, 713, 825, 950, 1088, 1240, 1406, 1585, 1778, 1984)
+# Heroes with their own table, the others use LEVEL_MAX_EXP. 133 DiRenjie, 199 Arli and 508 Garo all use LEVEL_MAX_EXP
+# 使用独立经验表的英雄，其余英雄使用LEVEL_MAX_EXP。133 狄仁杰、199 公孙离和508 伽罗都使用LEVEL_MAX_EXP
+HERO_LEVEL_MAX_EXP = {}
+
+
+# exp_prefix[level] is the exp gained before reaching level, summed in the order calculate_exp_sum used to
+# exp_prefix[level]为到达该等级之前获得的经验值，累加顺序与calculate_exp_sum原来的一致
+def exp_prefix_of(level_max_exp):
+    exp_prefix = [0.0, 0.0]
+    for max_exp in level_max_exp:
+        exp_prefix.append(exp_prefix[-1] + max_exp)
+    return exp_prefix
+
+
+# Data of an episode that does not change after env.reset, built from its first frame: positions of the towers and
+# crystals, their pairwise distances, the structures used by calculate_forward for each camp and the exp prefix sums of
+# each hero. Towers and crystals are found like in FrameIndex, the last one of each camp wins. Each manager builds its
+# own context at the start of every episode, structures or heroes missing on the first frame are added on first lookup
+# 对局中env.reset之后不再变化的数据，由第一帧构建：防御塔和水晶的位置、两两之间的距离、calculate_forward中每个阵营使用的建筑，
+# 以及每个英雄的经验前缀和。防御塔和水晶的查找方式与FrameIndex相同，每个阵营以最后出现的为准。
+# 每个奖励管理器在每局开始时构建自己的上下文，第一帧中缺失的建筑或英雄在第一次查找时补充
+class EpisodeContext:
+    def __init__(self, frame_index):
+        # (camp, sub_type) -> (x, z)
+        self.structure_pos = {}
+        for sub_type, organ_of_camp in (
+            ("ACTOR_SUB_TOWER", frame_index.tower_of_camp),
+            ("ACTOR_SUB_CRYSTAL", frame_index.crystal_of_camp),
+        ):
+            for camp, organ in organ_of_camp.items():
+                self.structure_pos[(camp, sub_type)] = (organ["location"]["x"], organ["location"]["z"])
+        self.structure_dist = {
+            (key_a, key_b): math.dist(pos_a, pos_b)
+            for key_a, pos_a in self.structure_pos.items()
+            for key_b, pos_b in self.structure_pos.items()
+        }
+
+        # camp -> (main tower, enemy tower, main crystal positions, main tower to enemy tower, main crystal to main tower)
+        # 阵营 -> (己方防御塔、敌方防御塔、己方水晶的位置, 己方防御塔到敌方防御塔的距离, 己方水晶到己方防御塔的距离)
+        self.forward_structures_of_camp = {}
+        for camp in frame_index.tower_of_camp:
+            enemy_camp = frame_index.split_by_camp(frame_index.tower_of_camp, camp)[1]["camp"]
+            main_tower, enemy_tower = (camp, "ACTOR_SUB_TOWER"), (enemy_camp, "ACTOR_SUB_TOWER")
+            main_spring = (camp, "ACTOR_SUB_CRYSTAL")
+            if main_spring not in self.structure_pos:
+                continue
+            self.forward_structures_of_camp[camp] = (
+                self.structure_pos[main_tower],
+                self.structure_pos[enemy_tower],
+                self.structure_pos[main_spring],
+                self.structure_dist[(main_tower, enemy_tower)],
+                self.structure_dist[(main_spring, main_tower)],
+            )
+
+        self.exp_prefix_of_hero = {}
+        for hero in frame_index.hero_by_player_id.values():
+            self.exp_prefix(hero["actor_state"].get("config_id"))
+
+    def exp_prefix(self, config_id):
+        exp_prefix = self.exp_prefix_of_hero.get(config_id)
+        if exp_prefix is None:
+            exp_prefix = exp_prefix_of(HERO_LEVEL_MAX_EXP.get(config_id, LEVEL_MAX_EXP))
+            self.exp_prefix_of_hero[config_id] = exp_prefix
+        return exp_prefix
+
+    # The forward structures of the camp of main_tower, taken from the organs of the current frame when the camp was
+    # left out on the first frame
+    # main_tower所属阵营的前进奖励建筑数据，第一帧中缺失该阵营时由当前帧的建筑补充
+    def forward_structures(self, main_tower, enemy_tower, main_spring):
+        forward_structures = self.forward_structures_of_camp.get(main_tower["camp"])
+        if forward_structures is None:
+            main_tower_pos, enemy_tower_pos, main_spring_pos = (
+                (organ["location"]["x"], organ["location"]["z"]) for organ in (main_tower, enemy_tower, main_spring)
+            )
+            forward_structures = self.forward_structures_of_camp[main_tower["camp"]] = (
+                main_tower_pos,
+                enemy_tower_pos,
+                main_spring_pos,
+                math.dist(main_tower_pos, enemy_tower_pos),
+                math.dist(main_spring_pos, main_tower_pos),
+            )
+        return forward_structures
+
+
+# Per-frame constants of get_reward, balance_rate is carried from one reward item to the next
+# get_reward的每帧常量，balance_rate会在奖励子项之间按顺序传递
+class RewardFrame:
+    def __init__(self, frame_no, main_hero, check_hp):
+        self.frame_no = frame_no
+        self.main_hero = main_hero
+        self.check_hp = check_hp
+        self.death_balance_rate = 1.00005**frame_no if frame_no > 5000 else 1
+        self.balance_rate = None
+
+
+# Reward item registry: extract(manager, camp_frame) returns the value of one camp in the current frame,
+# combine(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame) returns the value of the item from the
+# values of both camps in the current and the previous frame.
+# extract_batch and combine_batch are the column versions used by reward_batch.result_batch, see register_batch_reward_term
+# 奖励子项注册表：extract计算单个阵营当前帧的值，combine用双方阵营当前帧和上一帧的值计算该子项的奖励值。
+# extract_batch和combine_batch为reward_batch.result_batch使用的按列计算版本，见register_batch_reward_term
+class RewardTerm:
+    def __init__(self, extract=None, combine=None, carries_balance_rate=False, shared=True):
+        self.extract = extract
+        self.combine = combine if combine is not None else combine_diff
+        self.extract_batch = None
+        self.combine_batch = None
+        # Whether combine sets the balance_rate read by the following items, such items are kept even with weight 0
+        # combine是否设置后续子项读取的balance_rate，这类子项即使权重为0也会保留
+        self.carries_balance_rate = carries_balance_rate
+        # Whether extract only reads the frame, so its value can be shared by the managers of both agents
+        # extract是否只读取帧数据，从而可以在双方智能体的奖励管理器之间共享
+        self.shared = shared
+
+
+# Calls and wall time of the extract and combine phases of one reward item
+# 单个奖励子项extract和combine阶段的调用次数和耗时
+class RewardProfile:
+    def __init__(self):
+        self.extract = [0, 0.0]
+        self.combine = [0, 0.0]
+
+
+# Wrap func to add its calls and wall time to stats
+# 包装func，将其调用次数和耗时累加到stats
+def profiled(func, stats):
+    def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
+
+    return wrapper
+
+
+REWARD_TERMS = {}
+
+
+def register_reward_term(reward_name, extract=None, combine=None, carries_balance_rate=False, shared=True):
+    REWARD_TERMS[reward_name] = RewardTerm(extract, combine, carries_balance_rate, shared)
+
+
+# Add the column versions of a registered reward item, combine_batch may be left out when combine is combine_diff
+# 为已注册的奖励子项添加按列计算的版本，combine为combine_diff时可以不提供combine_batch
+def register_batch_reward_term(reward_name, extract_batch, combine_batch=None):
+    reward_term = REWARD_TERMS[reward_name]
+    reward_term.extract_batch = extract_batch
+    reward_term.combine_batch = combine_batch
+
+
+def get_reward_term(reward_name):
+    return REWARD_TERMS.get(reward_name) or RewardTerm()
+
+
+# Reward items of weight_dict that stay in the hot path, in dict order
+# weight_dict中保留在逐帧计算中的奖励子项，保持字典顺序
+def compile_reward_names(weight_dict):
+    return [
+        reward_name
+        for reward_name, weight in weight_dict.items()
+        if weight != 0 or get_reward_term(reward_name).carries_balance_rate
+    ]
+
 
-            weight_sum += reward_struct.weight
-            reward_sum += reward_struct.value * reward_struct.weight
-            reward_dict[reward_name] = reward_struct.value
-        # print('#################Current Reward##############')
-        # for reward_name in reward_dict.keys():
-        #     print(f'{reward_name}:{reward_dict[reward_name]}\n')
+# Extractors
+# 单阵营奖励子项计算
+def extract_money(manager, camp_frame):
+    return camp_frame.main_hero["moneyCnt"]
 
-        reward_dict["reward_sum"] = reward_sum
-        #print(reward_sum)
 
+def extract_hp_point(manager, camp_frame):
+    return math.sqrt(math.sqrt(1.0 * camp_frame.main_hero_hp / camp_frame.main_hero_max_hp))
 
 
+def extract_ep_rate(manager, camp_frame):
+    if camp_frame.main_hero_max_ep == 0 or camp_frame.main_hero_hp <= 0:
+        return 0
+    return camp_frame.main_hero_ep / float(camp_frame.main_hero_max_ep)
+
+
+def extract_kill(manager, camp_frame):
+    return camp_frame.main_hero["killCnt"]
+
+
+def extract_death(manager, camp_frame):
+    return camp_frame.main_hero["deadCnt"]
+
+
+def extract_tower_hp_point(manager, camp_frame):
+    return 1.0 * camp_frame.main_tower["hp"] / camp_frame.main_tower["max_hp"]
+
+
+def extract_last_hit(manager, camp_frame):
+    frame_index = camp_frame.frame_index
+    if frame_index.soldier_kills_by_killer:
+        return frame_index.last_hit_diff(camp_frame.main_hero, camp_frame.enemy_hero)
+    return 0.0
+
+
+def extract_exp(manager, camp_frame):
+    return manager.calculate_exp_sum(camp_frame.main_hero)
+
+
+def extract_forward(manager, camp_frame):
+    return manager.calculate_forward(
+        camp_frame.main_hero, camp_frame.main_tower, camp_frame.enemy_tower, camp_frame.main_spring
+    )
+
+
+def extract_heal(manager, camp_frame):
+    return camp_frame.main_hero["skill_state"]["slot_states"][4]["usedTimes"]
+
+
+def extract_skill_hit_count(manager, camp_frame):
+    return sum(slot_state["hitHeroTimes"] for slot_state in camp_frame.main_hero["skill_state"]["slot_states"])
+
+
+#对英雄输出
+def extract_hurt_to_hero(manager, camp_frame):
+    main_hero, enemy_hero = camp_frame.main_hero, camp_frame.enemy_hero
+    frame_index = camp_frame.frame_index
+    distance_to_enemy = frame_index.hero_distance
+    if distance_to_enemy is None:
+        distance_to_enemy = frame_index.hero_distance = manager.calculate_distance(
+            main_hero["actor_state"]["location"], enemy_hero["actor_state"]["location"]
+        )
+    #balance_rate 用来鼓励优先攻击英雄，当敌人处于攻击范围时
+    balance_rate = 1
+    if distance_to_enemy <= main_hero["actor_state"]["attack_range"]:
+        balance_rate = 1.2
+    #草丛
+    if main_hero["isInGrass"] is True:
+        balance_rate += 0.1
+    #走位
+    if manager.m_last_frame_pos != (main_hero["actor_state"]["location"]["x"], main_hero["actor_state"]["location"]["z"]):
+        balance_rate += 0.1
+    return (
+        (main_hero["totalHurtToHero"] - manager.m_last_frame_totalHurtToHero)
+        * balance_rate
+        / enemy_hero["actor_state"]["max_hp"]
+        * math.sqrt(camp_frame.main_hero_hp / camp_frame.main_hero_max_hp)
+    )
+
+
+def extract_hurt_to_others(manager, camp_frame):
+    main_hero, hit_target_info = camp_frame.main_hero, camp_frame.hit_target_info
+    balance_rate = 1
+    if hit_target_info is not None and "conti_hit_count" in hit_target_info[0]:
+        balance_rate += 0.03 * max([item["conti_hit_count"] for item in hit_target_info if "conti_hit_count" in item])
+    return (
+        (main_hero["totalHurt"] - main_hero["totalHurtToHero"])
+        / 100000
+        * balance_rate
+        * math.sqrt(camp_frame.main_hero_hp / camp_frame.main_hero_max_hp)
+    )
+
+
+#承受英雄伤害
+def extract_be_hurt_by_hero(manager, camp_frame):
+    main_hero = camp_frame.main_hero
+    return (
+        (main_hero["totalBeHurtByHero"] - manager.m_last_frame_totalBeHurtByHero)
+        / main_hero["actor_state"]["max_hp"]
+        * math.exp(-math.sqrt(camp_frame.main_hero_ep / camp_frame.main_hero_max_hp) / 2)
+    )
+
+
+# Membership and the average hp come from the SoldierRegistry of the camp instead of passes over the enemy soldiers
+# 是否命中和平均血量来自该阵营的SoldierRegistry，不再遍历敌方小兵
+def extract_enemy_soldiers_hp(manager, camp_frame):
+    soldier_registry = manager.enemy_soldier_registry
+    hit_target_info = camp_frame.hit_target_info
+    if camp_frame.enemy_soldiers == []:
+        return 0
+    balance_rate = 1
+    if_hit_solder = hit_target_info != None and hit_target_info[0]["hit_target"] in soldier_registry
+
+    if if_hit_solder:
+        balance_rate *= 1.05
+
+    if camp_frame.main_soldiers != []:
+        if camp_frame.tower_hit_tar_info in soldier_registry and if_hit_solder:
+            balance_rate += 0.2
+        #优先攻击后排小兵
+        # The bonus compared the hit_target_info list with the runtime_id of the enemy soldier furthest from the
+        # furthest main soldier and was never given, the scan for that soldier is left out to keep the reward unchanged
+        # 该奖励用hit_target_info列表与离己方最远小兵最远的敌方小兵的runtime_id比较，从未生效，为保持奖励不变省去了对该小兵的查找
+
+    if manager.m_last_frame_soldier_av_hp == 0:
+        balance_rate = 0
+
+    average_hp = manager.m_last_frame_soldier_av_hp - soldier_registry.average_hp_ratio()
+    return average_hp * balance_rate
+
+
+# Combiners
+# 双方奖励子项合成
+def combine_diff(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    return (main_cur - enemy_cur) - (main_last - enemy_last)
+
+
+def scaled_combine_diff(scale):
+    def combine(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+        return combine_diff(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame) * scale
+
+    return combine
+
+
+def combine_money(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    return combine_diff(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame) / 100
+
+
+def combine_hp_point(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    balance_rate = 1
+    if reward_frame.frame_no > 8000:
+        balance_rate = 1.2
+    reward_frame.balance_rate = balance_rate
+    if main_last == 0.0 and enemy_last == 0.0:
+        cur_frame_value = 0
+        last_frame_value = 0
+    elif main_last == 0.0:
+        cur_frame_value = 0 - enemy_cur
+        last_frame_value = 0 - enemy_last
+    elif enemy_last == 0.0:
+        cur_frame_value = main_cur - 0
+        last_frame_value = main_last - 0
+    else:
+        cur_frame_value = main_cur - enemy_cur
+        last_frame_value = main_last - enemy_last
+    return (cur_frame_value - last_frame_value) * balance_rate
+
+
+def combine_ep_rate(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    if main_last > 0:
+        return main_cur - main_last
+    return 0
+
+
+def combine_exp(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    main_hero = reward_frame.main_hero
+    if main_hero and main_hero["level"] >= 15:
+        return 0
+    return combine_diff(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame) / 50
+
+
+def combine_forward(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    return main_cur / 1000
+
+
+def combine_last_hit(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    return main_cur
+
+
+def combine_kill(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    balance_rate = -1
+    if reward_frame.frame_no > 6000 or main_cur >= 2:
+        balance_rate = 1
+    reward_frame.balance_rate = balance_rate
+    return (main_cur - main_last) * balance_rate
+
+
+def combine_death(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    reward_frame.balance_rate = reward_frame.death_balance_rate
+    return (main_cur - main_last) * reward_frame.balance_rate
+
+
+def combine_heal(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    if_use = main_cur - main_last
+    main_hero = reward_frame.main_hero
+    if int(if_use):
+        if main_hero["actor_state"]["hp"] / main_hero["actor_state"]["max_hp"] > 0.85:
+            reward_frame.balance_rate -= 0.3 + main_hero["actor_state"]["hp"] / main_hero["actor_state"]["max_hp"]
+    else:
+        reward_frame.balance_rate = 0
+    if reward_frame.check_hp > 0:
+        reward_frame.balance_rate += reward_frame.check_hp
+    return reward_frame.balance_rate
+
+
+def combine_enemy_soldiers_hp(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame):
+    return (
+        combine_diff(manager, main_cur, main_last, enemy_cur, enemy_last, reward_frame) * reward_frame.balance_rate * 100
+    )
 
 
+register_reward_term("hp_point", extract_hp_point, combine_hp_point, carries_balance_rate=True)
+register_reward_term("tower_hp_point", extract_tower_hp_point, combine_diff)
+register_reward_term("money", extract_money, combine_money)
+register_reward_term("exp", extract_exp, combine_exp)
+register_reward_term("ep_rate", extract_ep_rate, combine_ep_rate)
+register_reward_term("death", extract_death, combine_death, carries_balance_rate=True)
+register_reward_term("kill", extract_kill, combine_kill, carries_balance_rate=True)
+register_reward_term("last_hit", extract_last_hit, combine_last_hit)
+# forward, HurtToHero, BeHurtByHero and enemy_Soldiers_hp read the previous frame kept by each manager
+# forward、HurtToHero、BeHurtByHero和enemy_Soldiers_hp依赖各管理器保存的上一帧数据
+register_reward_term("forward", extract_forward, combine_forward, shared=False)
+register_reward_term("HurtToHero", extract_hurt_to_hero, scaled_combine_diff(100), shared=False)
+register_reward_term("BeHurtByHero", extract_be_hurt_by_hero, scaled_combine_diff(50), shared=False)
+register_reward_term("HurtToOthers", extract_hurt_to_others, scaled_combine_diff(50))
+register_reward_term("enemy_Soldiers_hp", extract_enemy_soldiers_hp, combine_enemy_soldiers_hp, shared=False)
+register_reward_term("heal", extract_heal, combine_heal, carries_balance_rate=True)
+register_reward_term("skill_hit_count", extract_skill_hit_count, combine_diff)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import queue
+import threading
+import time
+
+
+# Bounded background pipeline for finished episodes: worker threads run process_fn(frame_collector) and then
+# learn_fn(samples), so the actor can start the next episode at once. submit blocks while max_pending episodes
+# are waiting, which is the backpressure on the actor. Only process_fn runs in parallel: learn goes through the agent,
+# so learn_fn is called under agent_lock, which the actor also holds while it predicts, loads or saves the model.
+# 已结束对局的有界后台流水线：工作线程先执行process_fn(frame_collector)再执行learn_fn(samples)，actor可以立即开始下一局。
+# 等待中的对局达到max_pending时submit会阻塞，以此对actor施加背压。只有process_fn并行执行：learn经由智能体发送样本，
+# 所以learn_fn在agent_lock下调用，actor预测、加载或保存模型时也持有该锁
+class SamplePipeline:
+    def __init__(self, process_fn, learn_fn, workers=1, max_pending=2, logger=None):
+        self.process_fn = process_fn
+        self.learn_fn = learn_fn
+        self.logger = logger
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.agent_lock = threading.Lock()
+        self.error = None
+        self.closed = False
+        # Metrics
+        # 监控指标
+        self.submitted_cnt = 0
+        self.learned_cnt = 0
+        self.max_depth = 0
+        self.blocked_time = 0.0
+        self.process_time = 0.0
+        self.learn_time = 0.0
+        self.lock_wait_time = 0.0
+        self.threads = [
+            threading.Thread(target=self._work, name=f"sample_pipeline_{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    # Number of episodes handed off but not taken by a worker yet
+    # 已提交但尚未被工作线程取走的对局数
+    def queue_depth(self):
+        return self.pending.qsize()
+
+    def submit(self, frame_collector):
+        if self.closed:
+            raise Exception("sample pipeline is closed")
+        self._raise_error()
+        start = time.perf_counter()
+        self.pending.put(frame_collector)
+        blocked_time = time.perf_counter() - start
+        with self.lock:
+            self.submitted_cnt += 1
+            self.blocked_time += blocked_time
+            self.max_depth = max(self.max_depth, self.pending.qsize())
+
+    # Wait until every submitted episode has been learned and stop the workers
+    # 等待所有已提交的对局完成learn，然后停止工作线程
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.logger:
+            self.logger.info(f"sample pipeline drained, stats:{self.stats()}")
+        self._raise_error()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.pending.qsize(),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted_cnt,
+                "learned": self.learned_cnt,
+                "blocked_time": self.blocked_time,
+                "process_time": self.process_time,
+                "learn_time": self.learn_time,
+                "lock_wait_time": self.lock_wait_time,
+            }
+
+    def _raise_error(self):
+        with self.lock:
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def _work(self):
+        while True:
+            frame_collector = self.pending.get()
+            if frame_collector is None:
+                return
+            try:
+                start = time.perf_counter()
+                samples = self.process_fn(frame_collector)
+                processed = time.perf_counter()
+                with self.agent_lock:
+                    learn_start = time.perf_counter()
+                    self.learn_fn(samples)
+                learned = time.perf_counter()
+            except Exception as e:
+                # Keep the first error for the actor, the worker goes on with the next episode
+                # 保留第一个错误交给actor，工作线程继续处理下一局
+                if self.logger:
+                    self.logger.error(f"sample pipeline failed: {e}")
+                with self.lock:
+                    if self.error is None:
+                        self.error = e
+                continue
+            with self.lock:
+                self.learned_cnt += 1
+                self.process_time += processed - start
+                self.lock_wait_time += learn_start - processed
+                self.learn_time += learned - learn_start
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import fcntl
+import os
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from ppo.config import Config
+
+
+RING_MAGIC = 0x4B4F485249
+# Directory of the POSIX shared memory files, an actor claims its ring with a flock on the file of the ring
+# POSIX共享内存文件所在目录，actor通过对环形缓冲区文件加flock来占用该环形缓冲区
+SHM_DIR = "/dev/shm"
+# Header of the ring in int64: magic, slot_num, sample_dim in the first cache line, the write count in the second,
+# the read count in the third, so the actor and the learner never write the same cache line
+# 环形缓冲区头部(int64)：第一个缓存行为magic、slot_num、sample_dim，第二个为写入计数，第三个为读取计数，actor和learner不会写同一缓存行
+HEADER_SIZE = 192
+WRITE_CNT_INDEX = 8
+READ_CNT_INDEX = 16
+
+# Offsets of the fields of Config.DATA_SPLIT_SHAPE in a sample
+# Config.DATA_SPLIT_SHAPE各字段在样本中的偏移
+SPLIT_SIZES = [shape[0] for shape in Config.data_shapes]
+SPLIT_BOUNDS = np.cumsum(SPLIT_SIZES)[:-1].tolist()
+
+
+# Sample transport between an actor and a learner on the same host, a ring of slot_num float32 slots of
+# Config.SAMPLE_DIM in shared memory. The actor writes each sample in place, the learner reads it as NumPy views split
+# by Config.DATA_SPLIT_SHAPE without pickling or copying, and releases it once trained on.
+# There is one writer and one reader per ring, so the learner creates one ring per actor process with
+# create_sample_rings and each actor claims its own through open_sample_ring. Every slot has a sequence number,
+# 2 * n + 1 while the n-th sample is written and 2 * n + 2 once it is complete, the reader checks it before and after
+# using the views to detect a torn write. The learner unlinks the rings at the end.
+# The learner of the framework still trains on the samples sent by agent.learn and reads no ring, so the workflow does
+# not write samples here until a learner consumes them with SampleRingReader.
+# 同一主机上actor与learner之间的样本传输，共享内存中slot_num个Config.SAMPLE_DIM维float32槽位组成的环形缓冲区。
+# actor将样本原地写入槽位，learner以按Config.DATA_SPLIT_SHAPE切分的NumPy视图读取，不经过序列化和拷贝，训练后释放槽位。
+# 每个环形缓冲区只有一个写入方和一个读取方，所以learner通过create_sample_rings为每个actor进程创建一个环形缓冲区，
+# 每个actor通过open_sample_ring占用其中一个。每个槽位带有序号，写入第n个样本时为2 * n + 1，写完后为2 * n + 2，
+# 读取方在使用视图前后检查序号以发现写入不完整的样本。learner在结束时unlink环形缓冲区。
+# 框架的learner仍然使用agent.learn发送的样本训练，不读取环形缓冲区，所以在learner通过SampleRingReader消费之前workflow不向这里写入样本
+class SampleRing:
+    def __init__(self, name, slot_num=1024, create=False):
+        sample_dim = Config.SAMPLE_DIM
+        if create:
+            size = HEADER_SIZE + 8 * slot_num + 4 * slot_num * sample_dim
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # The learner owns the ring, the actor must not unlink it when it exits
+            # 环形缓冲区归learner所有，actor退出时不能将其unlink
+            _untrack(self.shm)
+        self.name = name
+        self.header = np.ndarray((HEADER_SIZE // 8,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[:3] = (RING_MAGIC, slot_num, sample_dim)
+        elif self.header[0] != RING_MAGIC or self.header[2] != sample_dim:
+            self.close()
+            raise Exception(f"shared memory {name} is not a sample ring of dim {sample_dim}")
+        self.slot_num = int(self.header[1])
+        self.seqs = np.ndarray((self.slot_num,), dtype=np.int64, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.slots = np.ndarray(
+            (self.slot_num, sample_dim),
+            dtype=np.float32,
+            buffer=self.shm.buf,
+            offset=HEADER_SIZE + 8 * self.slot_num,
+        )
+        if create:
+            self.seqs[:] = 0
+        # Split views of each slot, made once as slots are reused
+        # 每个槽位的切分视图，槽位重复使用，只创建一次
+        self.slot_views = [None] * self.slot_num
+        # Worker threads of SamplePipeline may write concurrently, other processes are kept out by the claim of
+        # open_sample_ring
+        # SamplePipeline的多个工作线程可能同时写入，其他进程由open_sample_ring的占用排除在外
+        self.write_lock = threading.Lock()
+        # File descriptor holding the flock of the actor that claimed the ring
+        # 占用该环形缓冲区的actor持有flock的文件描述符
+        self.claim_fd = None
+        self.written_cnt = 0
+        self.full_cnt = 0
+        self.torn_cnt = 0
+
+    def __len__(self):
+        return int(self.header[WRITE_CNT_INDEX] - self.header[READ_CNT_INDEX])
+
+    # Write one sample of Config.SAMPLE_DIM values, False when the ring is full
+    # 写入一个Config.SAMPLE_DIM维的样本，环形缓冲区已满时返回False
+    def put(self, sample):
+        with self.write_lock:
+            write_cnt = int(self.header[WRITE_CNT_INDEX])
+            if write_cnt - int(self.header[READ_CNT_INDEX]) >= self.slot_num:
+                self.full_cnt += 1
+                return False
+            slot = write_cnt % self.slot_num
+            self.seqs[slot] = 2 * write_cnt + 1
+            # Samples of definition.sample_process are SampleData holding the row in npdata
+            # definition.sample_process的样本为SampleData，npdata中保存样本行
+            self.slots[slot] = getattr(sample, "npdata", sample)
+            self.seqs[slot] = 2 * write_cnt + 2
+            self.header[WRITE_CNT_INDEX] = write_cnt + 1
+            self.written_cnt += 1
+            return True
+
+    # Write samples in order until the ring is full, returns the number written
+    # 按顺序写入样本直到环形缓冲区已满，返回写入的数量
+    def put_samples(self, samples):
+        for i, sample in enumerate(samples):
+            if not self.put(sample):
+                return i
+        return len(samples)
+
+    # The oldest unreleased sample as (seq, views split by Config.DATA_SPLIT_SHAPE), None when the ring is empty.
+    # Torn slots are counted and skipped. The views stay valid until release
+    # 最早的未释放样本，返回(seq, 按Config.DATA_SPLIT_SHAPE切分的视图)，环形缓冲区为空时返回None。
+    # 不完整的槽位会被计数并跳过。视图在release之前有效
+    def get(self):
+        while True:
+            read_cnt = int(self.header[READ_CNT_INDEX])
+            if read_cnt >= int(self.header[WRITE_CNT_INDEX]):
+                return None
+            seq = 2 * read_cnt + 2
+            slot = read_cnt % self.slot_num
+            if self.seqs[slot] == seq:
+                if self.slot_views[slot] is None:
+                    self.slot_views[slot] = np.split(self.slots[slot], SPLIT_BOUNDS)
+                return seq, self.slot_views[slot]
+            self.torn_cnt += 1
+            self.release()
+
+    # Whether the sample read with seq is still intact, checked after training on its views
+    # 以seq读取的样本是否仍然完整，在使用其视图训练之后检查
+    def intact(self, seq):
+        slot = (seq // 2 - 1) % self.slot_num
+        if self.seqs[slot] == seq:
+            return True
+        self.torn_cnt += 1
+        return False
+
+    # Give the oldest sample back to the actor
+    # 将最早的样本交还给actor
+    def release(self):
+        self.header[READ_CNT_INDEX] += 1
+
+    def stats(self):
+        return {
+            "pending": len(self),
+            "written": self.written_cnt,
+            "full": self.full_cnt,
+            "torn": self.torn_cnt,
+        }
+
+    def close(self):
+        self.header = self.seqs = self.slots = self.slot_views = None
+        self.shm.close()
+        if self.claim_fd is not None:
+            os.close(self.claim_fd)
+            self.claim_fd = None
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+# Name of the index-th ring of the learner on the rings named base_name
+# learner的base_name环形缓冲区中第index个的名称
+def sample_ring_name(base_name, index):
+    return f"{base_name}-{index}"
+
+
+# Rings of the learner for ring_num actor processes, named sample_ring_name(base_name, 0 .. ring_num - 1)
+# learner为ring_num个actor进程创建的环形缓冲区，名称为sample_ring_name(base_name, 0 .. ring_num - 1)
+def create_sample_rings(base_name, ring_num, slot_num=1024):
+    return [SampleRing(sample_ring_name(base_name, index), slot_num, create=True) for index in range(ring_num)]
+
+
+# Claim the first ring of the learner no other actor holds and attach to it, None when none is available so samples
+# go through agent.learn. The claim is an exclusive flock on the shared memory file of the ring, held until the ring
+# is closed or the actor exits, so a ring is written by at most one process
+# 占用learner第一个未被其他actor持有的环形缓冲区并连接，没有可用的环形缓冲区时返回None，样本经由agent.learn发送。
+# 占用即对环形缓冲区共享内存文件加排他flock，在关闭环形缓冲区或actor退出前一直持有，因此每个环形缓冲区最多由一个进程写入
+def open_sample_ring(base_name, logger=None):
+    index = 0
+    while True:
+        name = sample_ring_name(base_name, index)
+        try:
+            claim_fd = os.open(os.path.join(SHM_DIR, name), os.O_RDONLY)
+        except OSError:
+            break
+        try:
+            fcntl.flock(claim_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(claim_fd)
+            index += 1
+            continue
+        try:
+            sample_ring = SampleRing(name)
+        except Exception as e:
+            os.close(claim_fd)
+            if logger:
+                logger.warning(f"sample ring {name} is not available, fall back to agent.learn: {e}")
+            return None
+        sample_ring.claim_fd = claim_fd
+        return sample_ring
+    if logger:
+        logger.warning(f"none of the {index} sample rings {base_name}-<n> is free, fall back to agent.learn")
+    return None
+
+
+# Learner side of the rings, drain hands each complete sample to consume(views) and releases it once consumed.
+# Each ring is read in order, at most max_samples samples per drain. Returns the number of samples consumed intact
+# 环形缓冲区的learner端，drain将每个完整的样本交给consume(views)，使用后释放。
+# 每个环形缓冲区按顺序读取，每次drain最多max_samples个样本。返回完整使用的样本数
+class SampleRingReader:
+    def __init__(self, rings):
+        self.rings = rings
+        self.read_cnt = 0
+
+    def drain(self, consume, max_samples=None):
+        consumed = 0
+        for ring in self.rings:
+            while max_samples is None or consumed < max_samples:
+                sample = ring.get()
+                if sample is None:
+                    break
+                seq, views = sample
+                consume(views)
+                if ring.intact(seq):
+                    consumed += 1
+                ring.release()
+        self.read_cnt += consumed
+        return consumed
+
+    def stats(self):
+        stats = {"read": self.read_cnt}
+        for ring in self.rings:
+            for key, value in ring.stats().items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def close(self, unlink=True):
+        for ring in self.rings:
+            ring.close()
+            if unlink:
+                ring.unlink()
+
+
+# Stop the resource tracker from unlinking shared memory the process only attached to, Python before 3.13 tracks it
+# 避免resource tracker删除本进程仅连接的共享内存，Python 3.13之前会跟踪这类共享内存
+def _untrack(shm):
+    try:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+from ppo.config import Config
+from ppo.array_frame_collector import clip_reward
+
+
+# Frame collector of streaming mode, keeps at most chunk_frames + 1 frames of each agent.
+# Every chunk_frames frames are moved into a new collector made by collector_factory, ready for sample_process.
+# The chunk is cut like an episode end: save_last_frame of its last frame gets the clipped reward of the next frame
+# plus GAMMA times the value of the next frame, so GAE of the chunk bootstraps from that value.
+# Frames built by build_frame must carry reward and value.
+# 流式模式的帧收集器，每个智能体最多保存chunk_frames + 1帧。
+# 每满chunk_frames帧就移入collector_factory创建的新收集器，可直接进行sample_process。
+# 分段方式与对局结束相同：分段最后一帧的save_last_frame使用下一帧裁剪后的reward加上GAMMA乘以下一帧的value，从而GAE由该value自举。
+# build_frame构建的帧需要包含reward和value
+class StreamingFrameCollector:
+    def __init__(self, num_agents, chunk_frames, collector_factory):
+        if chunk_frames <= 0 or chunk_frames % Config.LSTM_TIME_STEPS != 0:
+            raise Exception(f"chunk_frames {chunk_frames} is not a positive multiple of {Config.LSTM_TIME_STEPS}")
+        self.chunk_frames = chunk_frames
+        self.collector_factory = collector_factory
+        self.reset(num_agents)
+
+    def reset(self, num_agents):
+        self.num_agents = num_agents
+        self.frames = [[] for _ in range(num_agents)]
+        self.last_rewards = [None] * num_agents
+        self.chunk_cnt = 0
+
+    def save_frame(self, frame, agent_id):
+        self.frames[agent_id].append(frame)
+
+    # The final reward of the episode, applied to the last chunk by pop_last_chunk
+    # 对局的最终奖励，由pop_last_chunk作用于最后一个分段
+    def save_last_frame(self, reward, agent_id):
+        if len(self.frames[agent_id]) > 0:
+            self.last_rewards[agent_id] = reward
+
+    def __len__(self):
+        return max(len(frames) for frames in self.frames)
+
+    # A chunk is ready once a frame after it is known, its value bootstraps the chunk
+    # 分段之后的一帧已知时分段就绪，用该帧的value自举
+    def chunk_ready(self):
+        return len(self) > self.chunk_frames
+
+    def pop_chunk(self):
+        frame_collector = self.collector_factory(self.num_agents)
+        for agent_id, frames in enumerate(self.frames):
+            if len(frames) <= self.chunk_frames:
+                continue
+            for frame in frames[: self.chunk_frames]:
+                frame_collector.save_frame(frame, agent_id=agent_id)
+            next_frame = frames[self.chunk_frames]
+            frame_collector.save_last_frame(
+                agent_id=agent_id,
+                reward=clip_reward(next_frame.reward) + Config.GAMMA * next_frame.value,
+            )
+            del frames[: self.chunk_frames]
+        self.chunk_cnt += 1
+        return frame_collector
+
+    # The frame count of each agent, only valid while no chunk is popped
+    # 每个智能体的帧数，仅在没有分段被取出时有效
+    def snapshot(self):
+        return self.chunk_cnt, tuple(len(frames) for frames in self.frames), tuple(self.last_rewards)
+
+    # Drop the frames saved after snapshot, False when a chunk was popped since
+    # 丢弃snapshot之后保存的帧，此后有分段被取出时返回False
+    def restore(self, state):
+        chunk_cnt, frame_cnts, last_rewards = state
+        if chunk_cnt != self.chunk_cnt:
+            return False
+        for frames, frame_cnt in zip(self.frames, frame_cnts):
+            del frames[frame_cnt:]
+        self.last_rewards = list(last_rewards)
+        return True
+
+    # End the episode early at the frame before the last one, applied to the last chunk by pop_last_chunk like the final
+    # reward. Returns whether any frame is left
+    # 在倒数第二帧提前结束对局，与最终奖励一样由pop_last_chunk作用于最后一个分段。返回是否还有剩余的帧
+    def truncate(self):
+        for agent_id, frames in enumerate(self.frames):
+            if len(frames) >= 2:
+                last_frame = frames.pop()
+                self.last_rewards[agent_id] = clip_reward(last_frame.reward) + Config.GAMMA * last_frame.value
+            else:
+                frames.clear()
+                self.last_rewards[agent_id] = None
+        return len(self) > 0
+
+    # The remaining frames of a finished episode, with the final reward of each agent
+    # 已结束对局的剩余帧，附带每个智能体的最终奖励
+    def pop_last_chunk(self):
+        frame_collector = self.collector_factory(self.num_agents)
+        for agent_id, frames in enumerate(self.frames):
+            for frame in frames:
+                frame_collector.save_frame(frame, agent_id=agent_id)
+            if len(frames) > 0 and self.last_rewards[agent_id] is not None:
+                frame_collector.save_last_frame(agent_id=agent_id, reward=self.last_rewards[agent_id])
+        self.reset(self.num_agents)
+        return frame_collector
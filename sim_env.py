@@ -0,0 +1,742 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import argparse
+import collections
+import contextlib
+import logging
+import math
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from ppo.config import GameConfig, Config
+from ppo.inference_server import start_inference_server
+from ppo.reward_manager import GameRewardManager
+from ppo.sample_pipeline import SamplePipeline
+from ppo.stage_timeline import StageTimeline, StageStats
+
+
+CAMPS = ["PLAYERCAMP_1", "PLAYERCAMP_2"]
+# Blue side is at negative coordinates and red side at positive ones, all units walk along the x = z lane
+# 蓝方位于负坐标、红方位于正坐标，所有单位沿x = z的路线行进
+TOWER_POS = [(-20000, -20000), (20000, 20000)]
+SPRING_POS = [(-50000, -50000), (50000, 50000)]
+SOLDIER_SPAWN_POS = [(-45000, -45000), (45000, 45000)]
+HERO_ATTACK_RANGE = 8000
+TOWER_ATTACK_RANGE = 8800
+SOLDIER_ATTACK_RANGE = 3000
+SOLDIER_SPEED = 120
+HERO_SPEED = 250
+RESPAWN_FRAMES = 300
+# button of the action: 2 move, 3 - 6 attack or skills, 7 heal, the rest does nothing
+# 动作中的button：2移动，3 - 6普攻或技能，7治疗，其余不做任何事
+BUTTON_MOVE = 2
+BUTTON_ATTACKS = (3, 4, 5, 6)
+BUTTON_HEAL = 7
+
+
+def _dist(pos1, pos2):
+    return math.hypot(pos1[0] - pos2[0], pos1[1] - pos2[1])
+
+
+# Local stand-in of the hok1v1 environment, only for offline throughput testing of run_episodes
+# The game is a crude lane fight, but frame_state follows the schema read by the reward manager and the workflow
+# step_cost adds a fixed wait in seconds to every step, like the round trip to the real game server
+# hok1v1环境的本地替身，仅用于离线测试run_episodes的吞吐
+# 对局是简化的单路对战，但frame_state的结构与奖励管理器和workflow读取的一致
+# step_cost为每次step增加的固定等待(秒)，模拟与真实对局服务的往返
+class SimEnv:
+    # The episode can continue from an earlier frame with resume(frame_no), see resume_episode of train_workflow
+    # 对局可以通过resume(frame_no)从之前的某帧继续，见train_workflow的resume_episode
+    supports_resume = True
+
+    def __init__(
+        self, seed=0, max_frame_no=20000, soldier_num=4, wave_interval=900, frame_interval=1, step_cost=0.0, fail_every=0
+    ):
+        self.seed = seed
+        self.step_cost = step_cost
+        # Every fail_every-th step loses its response and returns state_dicts None, 0 never fails
+        # 每第fail_every步丢失响应并返回state_dicts为None，0表示从不失败
+        self.fail_every = fail_every
+        self.max_frame_no = max_frame_no
+        self.soldier_num = soldier_num
+        self.wave_interval = wave_interval
+        self.frame_interval = frame_interval
+        self.episode_cnt = 0
+        self.step_cnt = 0
+        self.finished_cnt = 0
+
+    def reset(self, usr_conf=None):
+        self.usr_conf = usr_conf
+        self.episode_actions = []
+        self.rng = random.Random(self.seed * 100003 + self.episode_cnt)
+        self.episode_cnt += 1
+        lineups = (usr_conf or {}).get("diy", {}).get("lineups")
+        self.frame_no = 0
+        self.next_runtime_id = 1000
+        self.heroes = []
+        for i, camp in enumerate(CAMPS):
+            hero_id = lineups[i][0]["hero_id"] if lineups else 133
+            self.heroes.append(
+                {
+                    "player_id": 100 + i,
+                    "config_id": hero_id,
+                    "camp": camp,
+                    "side": i,
+                    "pos": list(SPRING_POS[i]),
+                    "hp": 3000,
+                    "max_hp": 3000,
+                    "ep": 500,
+                    "max_ep": 500,
+                    "level": 1,
+                    "exp": 0,
+                    "money": 0,
+                    "kill": 0,
+                    "dead": 0,
+                    "total_hurt": 0,
+                    "total_hurt_to_hero": 0,
+                    "total_be_hurt_by_hero": 0,
+                    "used_times": [0] * 6,
+                    "hit_hero_times": [0] * 6,
+                    "hit_target": None,
+                    "conti_hit_count": 0,
+                    "respawn_frame_no": -1,
+                }
+            )
+        self.towers = [
+            self._organ(camp, "ACTOR_SUB_TOWER", TOWER_POS[i], 9000, 10 + i) for i, camp in enumerate(CAMPS)
+        ]
+        self.crystals = [
+            self._organ(camp, "ACTOR_SUB_CRYSTAL", SPRING_POS[i], 12000, 20 + i) for i, camp in enumerate(CAMPS)
+        ]
+        self.soldiers = []
+        self.dead_actions = []
+        self._spawn_wave()
+        return None, self._state_dicts()
+
+    def step(self, actions):
+        self.step_cnt += 1
+        self.episode_actions.append(actions)
+        self._advance(actions)
+
+        if self.step_cost > 0:
+            time.sleep(self.step_cost)
+        # The game goes on, only the response of the step is lost
+        # 对局继续进行，只是该步的响应丢失
+        if self.fail_every > 0 and self.step_cnt % self.fail_every == 0:
+            return self.frame_no, None, None, False, False, None
+
+        terminated = any(tower["hp"] <= 0 for tower in self.towers)
+        truncated = not terminated and self.frame_no >= self.max_frame_no
+        if terminated or truncated:
+            self.finished_cnt += 1
+        return self.frame_no, None, None, terminated, truncated, self._state_dicts()
+
+    # Continue the current episode from frame_no, replayed from reset with the same seed and actions
+    # 从frame_no继续当前对局，以相同的种子和动作从reset重放
+    def resume(self, frame_no):
+        actions = self.episode_actions[: frame_no // self.frame_interval]
+        self.episode_cnt -= 1
+        self.reset(self.usr_conf)
+        for step_actions in actions:
+            self.episode_actions.append(step_actions)
+            self._advance(step_actions)
+        return self.frame_no, self._state_dicts()
+
+    def _advance(self, actions):
+        self.dead_actions = []
+        self.frame_no += self.frame_interval
+        for hero, action in zip(self.heroes, actions):
+            self._hero_act(hero, action)
+        if self.frame_no % self.wave_interval < self.frame_interval:
+            self._spawn_wave()
+        self._soldiers_act()
+        self._towers_act()
+        self._resolve_deaths()
+        for hero in self.heroes:
+            self._hero_grow(hero)
+
+    def _organ(self, camp, sub_type, pos, max_hp, runtime_id):
+        return {
+            "camp": camp,
+            "side": CAMPS.index(camp),
+            "sub_type": sub_type,
+            "pos": list(pos),
+            "hp": max_hp,
+            "max_hp": max_hp,
+            "runtime_id": runtime_id,
+            "attack_target": 0,
+            "last_attacker": 0,
+        }
+
+    def _spawn_wave(self):
+        for side, camp in enumerate(CAMPS):
+            for j in range(self.soldier_num):
+                x = SOLDIER_SPAWN_POS[side][0] + 600 * j + self.rng.randint(-300, 300)
+                z = SOLDIER_SPAWN_POS[side][1] - 600 * j + self.rng.randint(-300, 300)
+                soldier = self._organ(camp, "ACTOR_SUB_SOLDIER", (x, z), 800, self.next_runtime_id)
+                self.next_runtime_id += 1
+                self.soldiers.append(soldier)
+
+    def _enemy_units(self, side):
+        units = [soldier for soldier in self.soldiers if soldier["side"] != side]
+        units.extend(tower for tower in self.towers if tower["side"] != side)
+        return units
+
+    def _hit(self, attacker_id, target, damage):
+        target["hp"] = max(0, target["hp"] - damage)
+        target["last_attacker"] = attacker_id
+
+    def _hero_act(self, hero, action):
+        if hero["hp"] <= 0:
+            if self.frame_no >= hero["respawn_frame_no"]:
+                hero["hp"], hero["pos"] = hero["max_hp"], list(SPRING_POS[hero["side"]])
+            return
+        hero["hit_target"] = None
+        button = action[0] if action else 0
+        if button == BUTTON_MOVE:
+            # move_x and move_z in [0, 15] are turned into a direction
+            # move_x和move_z取值[0, 15]，转换为移动方向
+            hero["pos"][0] += (action[1] - 7.5) / 7.5 * HERO_SPEED * self.frame_interval
+            hero["pos"][1] += (action[2] - 7.5) / 7.5 * HERO_SPEED * self.frame_interval
+        elif button in BUTTON_ATTACKS:
+            slot = button - BUTTON_ATTACKS[0]
+            hero["used_times"][slot] += 1
+            enemy_hero = self.heroes[1 - hero["side"]]
+            if enemy_hero["hp"] > 0 and _dist(hero["pos"], enemy_hero["pos"]) <= HERO_ATTACK_RANGE:
+                damage = 120 + 40 * slot + 10 * hero["level"]
+                self._hit(hero["player_id"], enemy_hero, damage)
+                hero["total_hurt"] += damage
+                hero["total_hurt_to_hero"] += damage
+                enemy_hero["total_be_hurt_by_hero"] += damage
+                hero["hit_hero_times"][slot] += 1
+                hero["hit_target"] = enemy_hero["player_id"]
+            else:
+                targets = [unit for unit in self._enemy_units(hero["side"]) if _dist(hero["pos"], unit["pos"]) <= HERO_ATTACK_RANGE]
+                if targets:
+                    target = min(targets, key=lambda unit: unit["hp"])
+                    damage = 150 + 10 * hero["level"]
+                    self._hit(hero["player_id"], target, damage)
+                    hero["total_hurt"] += damage
+                    hero["hit_target"] = target["runtime_id"]
+            hero["conti_hit_count"] = hero["conti_hit_count"] + 1 if hero["hit_target"] is not None else 0
+        elif button == BUTTON_HEAL and hero["used_times"][4] * 3600 <= self.frame_no:
+            hero["used_times"][4] += 1
+            hero["hp"] = min(hero["max_hp"], hero["hp"] + 0.15 * hero["max_hp"])
+        hero["pos"][0] = min(max(hero["pos"][0], -55000), 55000)
+        hero["pos"][1] = min(max(hero["pos"][1], -55000), 55000)
+
+    def _soldiers_act(self):
+        for soldier in self.soldiers:
+            if soldier["hp"] <= 0:
+                continue
+            side = soldier["side"]
+            targets = [
+                unit
+                for unit in self._enemy_units(side)
+                if unit["hp"] > 0 and _dist(soldier["pos"], unit["pos"]) <= SOLDIER_ATTACK_RANGE
+            ]
+            if targets:
+                self._hit(soldier["runtime_id"], targets[0], 30 * self.frame_interval)
+            else:
+                direction = 1 if side == 0 else -1
+                soldier["pos"][0] += direction * SOLDIER_SPEED * self.frame_interval
+                soldier["pos"][1] += direction * SOLDIER_SPEED * self.frame_interval
+
+    def _towers_act(self):
+        for tower in self.towers:
+            side = tower["side"]
+            soldiers = [
+                soldier
+                for soldier in self.soldiers
+                if soldier["side"] != side and soldier["hp"] > 0 and _dist(tower["pos"], soldier["pos"]) <= TOWER_ATTACK_RANGE
+            ]
+            enemy_hero = self.heroes[1 - side]
+            if soldiers:
+                target = soldiers[0]
+            elif enemy_hero["hp"] > 0 and _dist(tower["pos"], enemy_hero["pos"]) <= TOWER_ATTACK_RANGE:
+                target = enemy_hero
+            else:
+                tower["attack_target"] = 0
+                continue
+            tower["attack_target"] = target.get("runtime_id", target.get("player_id"))
+            self._hit(tower["runtime_id"], target, 60 * self.frame_interval)
+
+    def _resolve_deaths(self):
+        alive = []
+        for soldier in self.soldiers:
+            if soldier["hp"] > 0:
+                alive.append(soldier)
+                continue
+            self.dead_actions.append(self._dead_action(soldier["last_attacker"], soldier["runtime_id"], "ACTOR_SUB_SOLDIER"))
+            for hero in self.heroes:
+                if hero["player_id"] == soldier["last_attacker"]:
+                    hero["money"] += 40
+                    hero["exp"] += 30
+        self.soldiers = alive
+        for hero in self.heroes:
+            if hero["hp"] <= 0 and hero["respawn_frame_no"] < self.frame_no:
+                hero["dead"] += 1
+                hero["respawn_frame_no"] = self.frame_no + RESPAWN_FRAMES
+                self.dead_actions.append(self._dead_action(hero["last_attacker"], hero["player_id"], "ACTOR_SUB_HERO"))
+                for killer in self.heroes:
+                    if killer["player_id"] == hero["last_attacker"]:
+                        killer["kill"] += 1
+                        killer["money"] += 200
+                        killer["exp"] += 150
+
+    def _dead_action(self, killer_id, death_id, death_sub_type):
+        return {
+            "killer": {"runtime_id": killer_id},
+            "death": {"runtime_id": death_id, "sub_type": death_sub_type},
+        }
+
+    def _hero_grow(self, hero):
+        if self.frame_no % 30 < self.frame_interval:
+            hero["money"] += 3
+            hero["exp"] += 4
+        if hero["level"] < 15 and hero["exp"] >= 160 + 130 * (hero["level"] - 1):
+            hero["exp"] -= 160 + 130 * (hero["level"] - 1)
+            hero["level"] += 1
+            hero["max_hp"] += 200
+        if hero["hp"] > 0:
+            hero["ep"] = min(hero["max_ep"], hero["ep"] + self.frame_interval)
+
+    def _hero_state(self, hero):
+        actor_state = {
+            "config_id": hero["config_id"],
+            "runtime_id": hero["player_id"],
+            "actor_type": "ACTOR_HERO",
+            "sub_type": "ACTOR_SUB_NONE",
+            "camp": hero["camp"],
+            "hp": int(hero["hp"]),
+            "max_hp": hero["max_hp"],
+            "location": {"x": int(hero["pos"][0]), "y": 48, "z": int(hero["pos"][1])},
+            "attack_range": HERO_ATTACK_RANGE,
+            "values": {"ep": hero["ep"], "max_ep": hero["max_ep"]},
+        }
+        if hero["hit_target"] is not None:
+            actor_state["hit_target_info"] = [
+                {"hit_target": hero["hit_target"], "conti_hit_count": hero["conti_hit_count"]}
+            ]
+        return {
+            "player_id": hero["player_id"],
+            "actor_state": actor_state,
+            "skill_state": {
+                "slot_states": [
+                    {"slot_type": slot, "usedTimes": used_times, "hitHeroTimes": hit_hero_times}
+                    for slot, (used_times, hit_hero_times) in enumerate(zip(hero["used_times"], hero["hit_hero_times"]))
+                ]
+            },
+            "level": hero["level"],
+            "exp": hero["exp"],
+            "moneyCnt": hero["money"],
+            "killCnt": hero["kill"],
+            "deadCnt": hero["dead"],
+            "totalHurt": hero["total_hurt"],
+            "totalHurtToHero": hero["total_hurt_to_hero"],
+            "totalBeHurtByHero": hero["total_be_hurt_by_hero"],
+            "isInGrass": False,
+        }
+
+    def _npc_state(self, organ):
+        return {
+            "runtime_id": organ["runtime_id"],
+            "camp": organ["camp"],
+            "sub_type": organ["sub_type"],
+            "hp": int(organ["hp"]),
+            "max_hp": organ["max_hp"],
+            "location": {"x": int(organ["pos"][0]), "y": 48, "z": int(organ["pos"][1])},
+            "attack_target": organ["attack_target"],
+        }
+
+    def _state_dicts(self):
+        npc_states = [self._npc_state(organ) for organ in self.towers + self.crystals + self.soldiers]
+        hero_states = [self._hero_state(hero) for hero in self.heroes]
+        frame_action = {"dead_action": self.dead_actions} if self.dead_actions else {}
+        state_dicts = []
+        for hero in self.heroes:
+            frame_state = {
+                "frameNo": self.frame_no,
+                "hero_states": hero_states,
+                "npc_states": npc_states,
+                "frame_action": frame_action,
+            }
+            state_dicts.append(
+                {
+                    "player_id": hero["player_id"],
+                    "player_camp": hero["camp"],
+                    "frame_state": frame_state,
+                    "legal_action": None,
+                    "sub_action_mask": None,
+                }
+            )
+        return state_dicts
+
+
+# Stand-in of the agent, picks random actions that drift towards the enemy tower and only keeps the reward manager
+# predict_cost is the fixed cost in seconds of one predict call, paid once per list of observations,
+# learn_cost is the time in seconds to send the samples of one episode, load_cost the time of one load_model
+# 智能体替身，随机选择动作并逐渐向敌方防御塔推进，只保留奖励管理器
+# predict_cost为单次预测调用的固定耗时(秒)，每个观测列表只付出一次，learn_cost为发送单局样本的耗时(秒)，
+# load_cost为单次load_model的耗时(秒)
+class StubAgent:
+    def __init__(self, seed=0, predict_cost=0.0, learn_cost=0.0, load_cost=0.0):
+        self.rng = random.Random(seed)
+        self.predict_cost = predict_cost
+        self.learn_cost = learn_cost
+        self.load_cost = load_cost
+        self.load_cnt = 0
+        self.predict_cnt = 0
+        self.reward_manager = None
+        self.last_value = 0.0
+        self.last_action = [0] * len(Config.LABEL_SIZE_LIST)
+        self.move_range = (0, 16)
+        self.learn_cnt = 0
+
+    def reset(self, camp, player_id):
+        self.reward_manager = GameRewardManager(player_id)
+        self.move_range = (5, 16) if camp == CAMPS[0] else (0, 11)
+
+    def load_model(self, path=None, id="latest"):
+        if self.load_cost > 0:
+            time.sleep(self.load_cost)
+        self.load_cnt += 1
+
+    def save_model(self):
+        pass
+
+    def random_move(self):
+        button = self.rng.choice([BUTTON_MOVE, BUTTON_MOVE, 3, 4, 5, 6, BUTTON_HEAL])
+        self.last_action = [button, self.rng.randrange(*self.move_range), self.rng.randrange(*self.move_range), 0, 0, 0]
+        return self.last_action
+
+    def random_action(self):
+        self.last_value = self.rng.random()
+        return self.random_move()
+
+    # Interface of the agent of the framework, the observation is the frame number and the output the value
+    # 框架智能体的接口，观测为帧号，输出为value
+    def observation_process(self, state_dict):
+        return state_dict["frame_state"]["frameNo"]
+
+    def predict(self, list_obs_data):
+        if self.predict_cost > 0:
+            time.sleep(self.predict_cost)
+        self.predict_cnt += 1
+        return [self.rng.random() for _ in list_obs_data]
+
+    def update_status(self, obs_data, act_data):
+        self.last_value = act_data
+
+    def action_process(self, state_dict, act_data, is_stochastic):
+        return self.random_move()
+
+    def train_predict(self, state_dict):
+        obs_data = self.observation_process(state_dict)
+        act_data = self.predict([obs_data])[0]
+        self.update_status(obs_data, act_data)
+        return self.action_process(state_dict, act_data, True)
+
+    def eval_predict(self, state_dict):
+        obs_data = self.observation_process(state_dict)
+        act_data = self.predict([obs_data])[0]
+        self.update_status(obs_data, act_data)
+        return self.action_process(state_dict, act_data, False)
+
+    def learn(self, samples):
+        if self.learn_cost > 0:
+            time.sleep(self.learn_cost)
+        self.learn_cnt += 1
+
+
+# Stand-in of monitor keeping what is put
+# monitor替身，保存上报的数据
+class StubMonitor:
+    def __init__(self):
+        self.data = []
+
+    def put_data(self, data):
+        self.data.extend(data.values())
+
+
+# Stand-in of FrameCollector that only counts what it is given
+# FrameCollector替身，只统计收到的帧
+class StubFrameCollector:
+    def __init__(self, num_agents):
+        self.reset(num_agents)
+
+    def reset(self, num_agents):
+        self.frames = [[] for _ in range(num_agents)]
+
+    def save_frame(self, frame, agent_id):
+        self.frames[agent_id].append(frame)
+
+    def save_last_frame(self, reward, agent_id):
+        if self.frames[agent_id]:
+            self.frames[agent_id][-1] = self.frames[agent_id][-1]._replace(reward=reward)
+
+    def __len__(self):
+        return max(len(frames) for frames in self.frames)
+
+    def snapshot(self):
+        return tuple(len(frames) for frames in self.frames)
+
+    def restore(self, frame_cnts):
+        for frames, frame_cnt in zip(self.frames, frame_cnts):
+            del frames[frame_cnt:]
+        return True
+
+    def truncate(self):
+        for frames in self.frames:
+            if len(frames) >= 2:
+                last_frame = frames.pop()
+                frames[-1] = frames[-1]._replace(reward=last_frame.reward + Config.GAMMA * last_frame.value)
+            else:
+                frames.clear()
+        return len(self) > 0
+
+
+# Frame with the fields of the Frame of definition.py, the ones the sim does not model are shared zero arrays of
+# their real shapes so ArrayFrameCollector writes full sample rows while build_frame stays cheap
+# 字段与definition.py中Frame相同的帧，模拟器不建模的字段为共享的真实形状的全零数组，
+# ArrayFrameCollector写入完整的样本行，同时build_frame开销很小
+SimFrame = collections.namedtuple(
+    "SimFrame",
+    [
+        "frame_no",
+        "feature",
+        "legal_action",
+        "action",
+        "reward",
+        "value",
+        "prob",
+        "sub_action",
+        "is_train",
+        "lstm_cell",
+        "lstm_hidden",
+    ],
+)
+SIM_FEATURE = np.zeros(Config.SERI_VEC_SPLIT_SHAPE[0], dtype=np.float32)
+SIM_LEGAL_ACTION = np.ones(Config.SERI_VEC_SPLIT_SHAPE[1], dtype=np.float32)
+SIM_PROB = np.zeros(sum(Config.LABEL_SIZE_LIST), dtype=np.float32)
+SIM_SUB_ACTION = np.ones(len(Config.LABEL_SIZE_LIST), dtype=np.float32)
+SIM_LSTM_STATE = np.zeros(Config.LSTM_UNIT_SIZE, dtype=np.float32)
+
+
+def stub_build_frame(agent, state_dict):
+    return SimFrame(
+        frame_no=state_dict["frame_state"]["frameNo"],
+        feature=SIM_FEATURE,
+        legal_action=SIM_LEGAL_ACTION,
+        action=agent.last_action,
+        reward=state_dict["reward"]["reward_sum"],
+        value=agent.last_value,
+        prob=SIM_PROB,
+        sub_action=SIM_SUB_ACTION,
+        is_train=True,
+        lstm_cell=SIM_LSTM_STATE,
+        lstm_hidden=SIM_LSTM_STATE,
+    )
+
+
+def stub_sample_process(frame_collector):
+    return [list(frames) for frames in frame_collector.frames]
+
+
+# Swap FrameCollector, build_frame and sample_process of train_workflow for the stubs
+# 将train_workflow中的FrameCollector、build_frame和sample_process替换为替身
+@contextlib.contextmanager
+def stub_workflow():
+    from ppo import train_workflow
+
+    saved = (train_workflow.FrameCollector, train_workflow.build_frame, train_workflow.sample_process)
+    train_workflow.FrameCollector = StubFrameCollector
+    train_workflow.build_frame = stub_build_frame
+    train_workflow.sample_process = stub_sample_process
+    try:
+        yield train_workflow
+    finally:
+        train_workflow.FrameCollector, train_workflow.build_frame, train_workflow.sample_process = saved
+
+
+# Run run_episodes against env_num SimEnvs for a number of training episodes and report its frames per second
+# 用env_num个SimEnv运行run_episodes若干个训练对局，并统计每秒帧数
+def run_local(
+    episodes,
+    seed=0,
+    max_frame_no=20000,
+    soldier_num=4,
+    env_num=1,
+    predict_cost=0.0,
+    step_cost=0.0,
+    learn_cost=0.0,
+    load_cost=0.0,
+    model_cache=False,
+    sample_workers=0,
+    chunk_segments=0,
+    timeline=None,
+    monitor=None,
+    fail_every=0,
+    snapshot_interval=0,
+    salvage=False,
+    decision_interval=1,
+    inference=False,
+    array_collector=False,
+):
+    envs = [
+        SimEnv(
+            seed=seed + i, max_frame_no=max_frame_no, soldier_num=soldier_num, step_cost=step_cost, fail_every=fail_every
+        )
+        for i in range(env_num)
+    ]
+    agents = [StubAgent(seed + i, predict_cost, learn_cost, load_cost) for i in range(2)]
+    do_learns = [True, True]
+    logger = logging.getLogger("sim_env")
+    saved_config = (
+        GameConfig.SAMPLE_CHUNK_SEGMENTS,
+        GameConfig.MODEL_CACHE,
+        GameConfig.EPISODE_SNAPSHOT_INTERVAL,
+        GameConfig.SALVAGE_FAILED_EPISODES,
+        GameConfig.DECISION_INTERVAL,
+        GameConfig.INFERENCE_SERVER_ADDRESS,
+        GameConfig.ARRAY_FRAME_COLLECTOR,
+    )
+    GameConfig.ARRAY_FRAME_COLLECTOR = array_collector
+    GameConfig.SAMPLE_CHUNK_SEGMENTS = chunk_segments
+    GameConfig.MODEL_CACHE = model_cache
+    GameConfig.EPISODE_SNAPSHOT_INTERVAL, GameConfig.SALVAGE_FAILED_EPISODES = snapshot_interval, salvage
+    GameConfig.DECISION_INTERVAL = {
+        hero["hero_id"]: decision_interval for heroes in GameConfig.CAMP_HEROES for hero in heroes
+    }
+    # The agents predict through an inference server running in this process, with two agents as its model slots
+    # 智能体经由本进程中运行的推理服务预测，两个智能体为其模型槽位
+    inference_server = None
+    if inference:
+        GameConfig.INFERENCE_SERVER_ADDRESS = os.path.join(tempfile.gettempdir(), f"sim_inference_{os.getpid()}.sock")
+        inference_server = start_inference_server(
+            [StubAgent(seed + 10 + i, predict_cost, learn_cost, load_cost) for i in range(2)], logger
+        )
+    try:
+        with stub_workflow() as train_workflow:
+            sample_pipeline = None
+            if sample_workers > 0:
+                sample_pipeline = SamplePipeline(
+                    train_workflow.process_samples,
+                    lambda g_data: train_workflow.learn_samples(agents, do_learns, g_data),
+                    workers=sample_workers,
+                    logger=logger,
+                )
+            start = time.perf_counter()
+            episode_iter = train_workflow.run_episodes(envs, agents, logger, monitor, timeline, sample_pipeline)
+            for g_data in episode_iter:
+                if g_data is not None:
+                    train_workflow.learn_samples(agents, do_learns, g_data)
+                # In streaming mode a yield is a chunk, the episode is over when no env is running it anymore
+                # 流式模式下每次输出是一个分段，环境不再运行该对局时对局才结束
+                if sum(env.finished_cnt for env in envs) >= episodes:
+                    break
+            episode_iter.close()
+            if sample_pipeline is not None:
+                sample_pipeline.close()
+                logger.info(f"sample pipeline stats:{sample_pipeline.stats()}")
+            cost = time.perf_counter() - start
+    finally:
+        (
+                GameConfig.SAMPLE_CHUNK_SEGMENTS,
+            GameConfig.MODEL_CACHE,
+            GameConfig.EPISODE_SNAPSHOT_INTERVAL,
+            GameConfig.SALVAGE_FAILED_EPISODES,
+            GameConfig.DECISION_INTERVAL,
+            GameConfig.INFERENCE_SERVER_ADDRESS,
+            GameConfig.ARRAY_FRAME_COLLECTOR,
+        ) = saved_config
+        if inference_server is not None:
+            inference_server.close()
+    return sum(env.step_cnt for env in envs), cost
+
+
+# Frames per second of SimEnv alone, to subtract from the run_episodes numbers
+# 仅SimEnv本身的每秒帧数，用于从run_episodes的结果中扣除
+def run_env_only(frames, seed=0, soldier_num=4):
+    env = SimEnv(seed=seed, soldier_num=soldier_num)
+    agents = [StubAgent(seed), StubAgent(seed + 1)]
+    env.reset()
+    start = time.perf_counter()
+    for _ in range(frames):
+        _, _, _, terminated, truncated, _ = env.step([agent.random_action() for agent in agents])
+        if terminated or truncated:
+            env.reset()
+    return frames, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int, default=2)
+    parser.add_argument("--max-frame-no", type=int, default=20000)
+    parser.add_argument("--soldiers", type=int, default=4, help="soldiers per camp in each wave")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--envs", type=int, default=1, help="environments driven by one run_episodes")
+    parser.add_argument("--predict-cost", type=float, default=0.0, help="seconds spent by each predict call")
+    parser.add_argument("--step-cost", type=float, default=0.0, help="seconds waited by each env step")
+    parser.add_argument("--learn-cost", type=float, default=0.0, help="seconds spent sending the samples of one episode")
+    parser.add_argument("--load-cost", type=float, default=0.0, help="seconds spent by each load_model call")
+    parser.add_argument("--model-cache", action="store_true", help="skip load_model when the checkpoint is unchanged")
+    parser.add_argument("--sample-workers", type=int, default=0, help="run sample_process and learn in background threads")
+    parser.add_argument("--chunk-segments", type=int, default=0, help="emit samples every this many LSTM segments")
+    parser.add_argument("--timeline", default=None, help="write the stage timeline as a Chrome trace to this path")
+    parser.add_argument("--stage-stats", type=int, default=0, help="report stage histograms timing one call in this many")
+    parser.add_argument("--fail-every", type=int, default=0, help="lose the response of every this many env steps")
+    parser.add_argument("--snapshot-interval", type=int, default=0, help="snapshot episodes every this many steps")
+    parser.add_argument("--salvage", action="store_true", help="learn failed episodes as truncated samples")
+    parser.add_argument("--decision-interval", type=int, default=1, help="agents decide every this many env steps")
+    parser.add_argument("--inference", action="store_true", help="predict through an inference server in this process")
+    parser.add_argument("--array-collector", action="store_true", help="write frames into ArrayFrameCollector sample rows")
+    args = parser.parse_args()
+
+    frames, cost = run_env_only(args.max_frame_no, args.seed, args.soldiers)
+    print(f"SimEnv alone: {frames / cost:.0f} frames/s")
+    timeline = StageStats(args.stage_stats) if args.stage_stats > 0 else StageTimeline()
+    monitor = StubMonitor()
+    frames, cost = run_local(
+        args.episodes,
+        seed=args.seed,
+        max_frame_no=args.max_frame_no,
+        soldier_num=args.soldiers,
+        env_num=args.envs,
+        predict_cost=args.predict_cost,
+        step_cost=args.step_cost,
+        learn_cost=args.learn_cost,
+        load_cost=args.load_cost,
+        model_cache=args.model_cache,
+        sample_workers=args.sample_workers,
+        chunk_segments=args.chunk_segments,
+        timeline=timeline,
+        monitor=monitor,
+        fail_every=args.fail_every,
+        snapshot_interval=args.snapshot_interval,
+        salvage=args.salvage,
+        decision_interval=args.decision_interval,
+        inference=args.inference,
+        array_collector=args.array_collector,
+    )
+    print(f"run_episodes on SimEnv: {frames} frames in {cost:.2f} s, {frames / cost:.0f} frames/s")
+    if isinstance(timeline, StageStats):
+        # Stage stats reported at the end of each episode
+        # 每局结束时上报的阶段统计
+        for episode, stage_data in enumerate(monitor.data):
+            print(f"episode {episode} " + "  ".join(f"{key}={value}" for key, value in stage_data.items()))
+    else:
+        for stage, stats in timeline.summary().items():
+            print(f"{stage:<12} total {stats['total']:8.3f} s  count {stats['count']:8d}  mean {stats['mean'] * 1e6:8.1f} us")
+        for stage in ("reward", "save_frame"):
+            print(f"env_step overlapped with {stage} for {timeline.overlap('env_step', stage):.3f} s")
+        if args.timeline:
+            timeline.dump_chrome_trace(args.timeline)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import json
+import threading
+import time
+from collections import deque
+
+
+# Timeline of the stages of run_episodes, each span is (stage, env index, thread name, start, end) in seconds
+# run_episodes各阶段的时间线，每个区间为(阶段, 环境序号, 线程名, 开始, 结束)，单位秒
+class StageTimeline:
+    def __init__(self, maxlen=100000):
+        self.spans = deque(maxlen=maxlen)
+        self.counts = {}
+
+    # Add n to the counter name, such as frames or samples
+    # 计数器name增加n，例如帧数或样本数
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def record(self, stage, env_index, start, end):
+        # deque.append is atomic, so worker threads can record without a lock
+        # deque.append是原子操作，工作线程记录时无需加锁
+        self.spans.append((stage, env_index, threading.current_thread().name, start, end))
+
+    # Run func(*args) and record it as a span of stage
+    # 执行func(*args)并记录为stage的一个区间
+    def timed(self, stage, env_index, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.record(stage, env_index, start, time.perf_counter())
+
+    def total(self, stage):
+        return sum(end - start for span_stage, _, _, start, end in self.spans if span_stage == stage)
+
+    # Seconds during which some span of stage_a and some span of stage_b run at the same time
+    # stage_a和stage_b的区间同时运行的秒数
+    def overlap(self, stage_a, stage_b):
+        spans_a = sorted((start, end) for stage, _, _, start, end in self.spans if stage == stage_a)
+        spans_b = sorted((start, end) for stage, _, _, start, end in self.spans if stage == stage_b)
+        overlap, j = 0.0, 0
+        for start_a, end_a in spans_a:
+            while j < len(spans_b) and spans_b[j][1] <= start_a:
+                j += 1
+            k = j
+            while k < len(spans_b) and spans_b[k][0] < end_a:
+                overlap += max(0.0, min(end_a, spans_b[k][1]) - max(start_a, spans_b[k][0]))
+                k += 1
+        return overlap
+
+    # Total, count and mean of each stage
+    # 各阶段的总耗时、次数和平均耗时
+    def summary(self):
+        stats = {}
+        for stage, _, _, start, end in self.spans:
+            total, count = stats.get(stage, (0.0, 0))
+            stats[stage] = (total + end - start, count + 1)
+        return {stage: {"total": total, "count": count, "mean": total / count} for stage, (total, count) in stats.items()}
+
+    # Write the spans in the Chrome trace event format, viewable in chrome://tracing or Perfetto
+    # 以Chrome trace事件格式写出各区间，可在chrome://tracing或Perfetto中查看
+    def dump_chrome_trace(self, path):
+        events = [
+            {
+                "name": stage,
+                "cat": f"env_{env_index}",
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 0,
+                "tid": thread_name,
+            }
+            for stage, env_index, thread_name, start, end in self.spans
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events}, f)
+
+
+# Latency histograms of the stages of run_episodes and workflow, cheap enough to stay on in production.
+# Only one call in sample_every of each stage is timed, the others only bump a counter. Durations go into log2 buckets
+# of microseconds, bucket b holds [2 ** (b - 1), 2 ** b) us. report returns the stats of the window since the last
+# report, with the frames and samples per second counted through count, and starts a new window
+# run_episodes和workflow各阶段的耗时直方图，开销足够低，可在生产环境中保持开启。
+# 每个阶段每sample_every次调用只计时一次，其余调用只增加计数。耗时按微秒放入log2分桶，第b个桶为[2 ** (b - 1), 2 ** b)微秒。
+# report返回自上次report以来窗口内的统计，包括通过count统计的每秒帧数和样本数，并开始新的窗口
+class StageStats:
+    def __init__(self, sample_every=1):
+        self.sample_every = max(1, sample_every)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = {}
+        # stage -> [timed count, timed total, buckets]
+        # 阶段 -> [计时次数, 计时总耗时, 分桶]
+        self.stages = {}
+        self.counts = {}
+        self.start = time.perf_counter()
+
+    def timed(self, stage, env_index, func, *args):
+        with self.lock:
+            calls = self.calls.get(stage, 0)
+            self.calls[stage] = calls + 1
+        if calls % self.sample_every:
+            return func(*args)
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.record(stage, env_index, start, time.perf_counter())
+
+    def record(self, stage, env_index, start, end):
+        bucket = int((end - start) * 1e6).bit_length()
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = [0, 0.0, [0] * 64]
+            stats[0] += 1
+            stats[1] += end - start
+            stats[2][bucket] += 1
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    # Upper bound in seconds of the bucket holding quantile q of a histogram
+    # 直方图中分位数q所在分桶的上界，单位秒
+    @staticmethod
+    def quantile(buckets, q):
+        rank, seen = q * sum(buckets), 0
+        for bucket, n in enumerate(buckets):
+            seen += n
+            if n and seen >= rank:
+                return 2**bucket * 1e-6
+        return 0.0
+
+    # Flat dict of the window for monitor: mean, p50 and p99 in ms and share of the window of each stage, estimated from
+    # the timed calls, plus the counters per second. Starts a new window
+    # 供monitor上报的窗口统计：各阶段的平均、p50、p99耗时(毫秒)和占窗口时间的比例，由计时的调用估计，以及各计数器的每秒数量。然后开始新的窗口
+    def report(self):
+        with self.lock:
+            window = time.perf_counter() - self.start
+            calls, stages, counts = self.calls, self.stages, self.counts
+            self.reset()
+        data = {"window_sec": round(window, 3)}
+        for stage, (timed_cnt, total, buckets) in stages.items():
+            mean = total / timed_cnt
+            data[f"{stage}_mean_ms"] = round(mean * 1e3, 3)
+            data[f"{stage}_p50_ms"] = round(self.quantile(buckets, 0.5) * 1e3, 3)
+            data[f"{stage}_p99_ms"] = round(self.quantile(buckets, 0.99) * 1e3, 3)
+            data[f"{stage}_share"] = round(mean * calls.get(stage, timed_cnt) / max(window, 1e-9), 4)
+        for name, n in counts.items():
+            data[f"{name}_per_sec"] = round(n / max(window, 1e-9), 2)
+        return data
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import os
+import sys
+import types
+
+# The modules of this directory are deployed as the ppo package and import each other as ppo.<module>,
+# register the package so the tests can import them from the source tree
+# 本目录的模块部署为ppo包，并以ppo.<module>相互导入，注册该包以便测试直接从源码目录导入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "ppo" not in sys.modules:
+    ppo = types.ModuleType("ppo")
+    ppo.__path__ = [ROOT]
+    sys.modules["ppo"] = ppo
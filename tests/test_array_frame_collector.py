@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from ppo.array_frame_collector import (
+    ADVANTAGE_INDEX,
+    LSTM_CELL_INDEX,
+    LSTM_HIDDEN_INDEX,
+    REWARD_SUM_INDEX,
+    SPLIT_OFFSETS,
+    ArrayFrameCollector,
+)
+from ppo.config import Config
+from ppo.sim_env import stub_build_frame, StubAgent
+
+STEPS = Config.LSTM_TIME_STEPS
+
+
+def make_frame(rng, frame_no, reward_scale=1.0):
+    return SimpleNamespace(
+        frame_no=frame_no,
+        feature=rng.random(Config.SERI_VEC_SPLIT_SHAPE[0][0], dtype=np.float32),
+        legal_action=rng.random(Config.SERI_VEC_SPLIT_SHAPE[1][0], dtype=np.float32),
+        reward=float(rng.normal() * reward_scale),
+        value=float(rng.normal()),
+        action=rng.integers(0, 9, len(Config.LABEL_SIZE_LIST)),
+        prob=rng.random(sum(Config.LABEL_SIZE_LIST), dtype=np.float32),
+        is_train=1,
+        sub_action=rng.random(len(Config.LABEL_SIZE_LIST), dtype=np.float32),
+        lstm_cell=rng.random(Config.LSTM_UNIT_SIZE, dtype=np.float32),
+        lstm_hidden=rng.random(Config.LSTM_UNIT_SIZE, dtype=np.float32),
+    )
+
+
+# FrameCollector of definition.py frame by frame: the previous frame takes the reward of the new frame clipped to
+# [-100, 100], the newest frame has reward 0, GAE is the backward loop and a row concatenates the fields of a segment
+# 逐帧实现的definition.py中的FrameCollector：上一帧使用新帧裁剪到[-100, 100]的reward，最新一帧reward为0，
+# GAE为反向循环，每行按字段拼接一个分段的帧
+class ReferenceFrameCollector:
+    def __init__(self, num_agents):
+        self.frames = [[] for _ in range(num_agents)]
+
+    def save_frame(self, frame, agent_id):
+        frames = self.frames[agent_id]
+        if frames:
+            frames[-1].reward = min(max(frame.reward, -100.0), 100.0)
+        fields = frame._asdict() if hasattr(frame, "_asdict") else vars(frame)
+        frames.append(SimpleNamespace(**dict(fields, reward=0.0)))
+
+    def save_last_frame(self, reward, agent_id):
+        if self.frames[agent_id]:
+            self.frames[agent_id][-1].reward = reward
+
+    def sample_process(self):
+        list_agents_samples = []
+        for frames in self.frames:
+            gae, next_value = 0.0, 0.0
+            for frame in reversed(frames):
+                delta = -frame.value + frame.reward + Config.GAMMA * next_value
+                gae = gae * Config.GAMMA * Config.LAMDA + delta
+                frame.advantage, frame.reward_sum, next_value = gae, gae + frame.value, frame.value
+            rows = []
+            for s in range(len(frames) // STEPS):
+                segment = frames[s * STEPS : (s + 1) * STEPS]
+                parts = [
+                    np.concatenate([np.concatenate([f.feature, f.legal_action]) for f in segment]),
+                    [f.reward_sum for f in segment],
+                    [f.advantage for f in segment],
+                ]
+                parts += [[f.action[k] for f in segment] for k in range(len(Config.LABEL_SIZE_LIST))]
+                prob_offsets = np.cumsum([0] + Config.LABEL_SIZE_LIST)
+                parts += [
+                    np.concatenate([f.prob[prob_offsets[k] : prob_offsets[k + 1]] for f in segment])
+                    for k in range(len(Config.LABEL_SIZE_LIST))
+                ]
+                parts.append([f.is_train for f in segment])
+                parts += [[f.sub_action[k] for f in segment] for k in range(len(Config.LABEL_SIZE_LIST))]
+                parts += [segment[0].lstm_cell, segment[0].lstm_hidden]
+                rows.append(np.concatenate([np.asarray(part, dtype=np.float32) for part in parts]))
+            list_agents_samples.append(rows)
+        return list_agents_samples
+
+
+def collect(collectors, episodes, last_reward):
+    for frame_idx in range(max(len(frames) for frames in episodes)):
+        for agent_id, frames in enumerate(episodes):
+            if frame_idx < len(frames):
+                for collector in collectors:
+                    collector.save_frame(frames[frame_idx], agent_id)
+    for agent_id in range(len(episodes)):
+        for collector in collectors:
+            collector.save_last_frame(last_reward, agent_id)
+    return [collector.sample_process() for collector in collectors]
+
+
+def assert_same_samples(samples, ref_samples):
+    assert [len(rows) for rows in samples] == [len(rows) for rows in ref_samples]
+    for rows, ref_rows in zip(samples, ref_samples):
+        for row, ref_row in zip(rows, ref_rows):
+            assert row.shape == (Config.SAMPLE_DIM,)
+            np.testing.assert_allclose(row, ref_row, rtol=1e-5, atol=1e-5)
+
+
+def test_rows_match_frame_collector_with_clipped_rewards():
+    rng = np.random.default_rng(0)
+    # Rewards of a few hundred are clipped when passed to the previous frame, the final reward is not
+    # 几百的reward传给上一帧时被裁剪，最终奖励不裁剪
+    episodes = [[make_frame(rng, i, reward_scale=150.0) for i in range(5 * STEPS)] for _ in range(2)]
+    collectors = [ArrayFrameCollector(2, init_segments=2), ReferenceFrameCollector(2)]
+    samples, ref_samples = collect(collectors, episodes, 300.0)
+    assert any(abs(frame.reward) > 100.0 for frame in episodes[0])
+    assert_same_samples(samples, ref_samples)
+
+
+def test_final_partial_segment_is_dropped():
+    rng = np.random.default_rng(1)
+    episodes = [[make_frame(rng, i) for i in range(3 * STEPS + 5)], [make_frame(rng, i) for i in range(STEPS - 1)]]
+    samples, ref_samples = collect([ArrayFrameCollector(2, init_segments=1), ReferenceFrameCollector(2)], episodes, 1.0)
+    assert [len(rows) for rows in samples] == [3, 0]
+    assert_same_samples(samples, ref_samples)
+
+
+def test_row_layout_follows_data_split_shape():
+    rng = np.random.default_rng(2)
+    frames = [make_frame(rng, i) for i in range(2 * STEPS)]
+    collector = ArrayFrameCollector(1)
+    for frame in frames:
+        collector.save_frame(frame, 0)
+    collector.save_last_frame(0.0, 0)
+    rows = collector.sample_process()[0]
+
+    # Feature and legal action of each frame in turn, then one column per field, the lstm state of the first frame
+    # 依次为每帧的特征和合法动作，之后每个字段一列，最后是第一帧的lstm状态
+    frame_width = Config.DATA_SPLIT_SHAPE[0]
+    feature_width = Config.SERI_VEC_SPLIT_SHAPE[0][0]
+    second = rows[1]
+    np.testing.assert_array_equal(second[:feature_width], frames[STEPS].feature)
+    np.testing.assert_array_equal(second[frame_width : frame_width + feature_width], frames[STEPS + 1].feature)
+    lstm_cell = second[SPLIT_OFFSETS[LSTM_CELL_INDEX] : SPLIT_OFFSETS[LSTM_CELL_INDEX] + Config.LSTM_UNIT_SIZE]
+    np.testing.assert_array_equal(lstm_cell, frames[STEPS].lstm_cell)
+    lstm_hidden = second[SPLIT_OFFSETS[LSTM_HIDDEN_INDEX] : SPLIT_OFFSETS[LSTM_HIDDEN_INDEX] + Config.LSTM_UNIT_SIZE]
+    np.testing.assert_array_equal(lstm_hidden, frames[STEPS].lstm_hidden)
+    returns = second[SPLIT_OFFSETS[REWARD_SUM_INDEX] : SPLIT_OFFSETS[REWARD_SUM_INDEX] + STEPS]
+    advantages = second[SPLIT_OFFSETS[ADVANTAGE_INDEX] : SPLIT_OFFSETS[ADVANTAGE_INDEX] + STEPS]
+    np.testing.assert_allclose(returns - advantages, [frame.value for frame in frames[STEPS:]], rtol=1e-5, atol=1e-5)
+    assert rows[0].base is collector.rows[0]
+
+
+def test_sim_frames_fill_sample_rows():
+    agent = StubAgent(seed=3)
+    episode = []
+    for frame_no in range(2 * STEPS + 3):
+        agent.random_action()
+        state_dict = {"frame_state": {"frameNo": frame_no}, "reward": {"reward_sum": 0.5 * frame_no}}
+        episode.append(stub_build_frame(agent, state_dict))
+    samples, ref_samples = collect([ArrayFrameCollector(2), ReferenceFrameCollector(2)], [episode, []], -1.0)
+    assert [len(rows) for rows in samples] == [2, 0]
+    assert_same_samples(samples, ref_samples)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import os
+import pickle
+import threading
+
+from ppo.checkpoint import AsyncCheckpointer, list_checkpoints
+
+
+# Model with the state_dict of a torch module
+# 具有torch模块state_dict接口的模型
+class DictModel:
+    def __init__(self):
+        self.weights = {"step": 0, "layers": [0.0]}
+
+    def state_dict(self):
+        return self.weights
+
+
+class ModelAgent:
+    def __init__(self):
+        self.model = DictModel()
+
+
+# Writes like torch.save, recording the threads it runs on
+# 与torch.save一样写入，记录执行所在的线程
+class PickleWriter:
+    def __init__(self):
+        self.threads = []
+
+    def __call__(self, state_dict, path):
+        self.threads.append(threading.current_thread())
+        with open(path, "wb") as f:
+            pickle.dump(state_dict, f)
+
+
+class LiveAgent:
+    def __init__(self):
+        self.save_threads = []
+
+    def save_model(self):
+        self.save_threads.append(threading.current_thread())
+
+
+def load(checkpoint_dir, checkpoint_id):
+    with open(os.path.join(checkpoint_dir, f"model.ckpt-{checkpoint_id}.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def test_state_dict_is_copied_on_save_and_old_checkpoints_are_removed(tmp_path):
+    write_fn = PickleWriter()
+    checkpointer = AsyncCheckpointer(str(tmp_path), max_in_flight=8, keep=3, write_fn=write_fn)
+    agent = ModelAgent()
+    for step in range(5):
+        agent.model.weights["step"] = step
+        agent.model.weights["layers"][0] = float(step)
+        checkpointer.save(agent)
+        # The actor keeps training while the copy is written
+        # 写入副本时actor继续训练
+        agent.model.weights["step"] = -1
+        agent.model.weights["layers"][0] = -1.0
+    checkpointer.close()
+
+    checkpoint_ids = list_checkpoints(str(tmp_path))
+    checkpoints = [load(str(tmp_path), checkpoint_id) for checkpoint_id in checkpoint_ids]
+    assert checkpoints == [{"step": step, "layers": [float(step)]} for step in (4, 3, 2)]
+    assert all(checkpoint_id.endswith(f"-{os.getpid()}") for checkpoint_id in checkpoint_ids)
+    assert sorted(os.listdir(tmp_path)) == sorted(f"model.ckpt-{checkpoint_id}.pkl" for checkpoint_id in checkpoint_ids)
+    assert len(write_fn.threads) == 5 and threading.current_thread() not in write_fn.threads
+    stats = checkpointer.stats()
+    assert stats["checkpoint_saved"] == 5 and stats["checkpoint_removed"] == 2
+
+
+def test_checkpoints_of_another_process_are_kept_apart(tmp_path):
+    (tmp_path / "model.ckpt-1-1.pkl").write_bytes(pickle.dumps({"step": "other"}))
+    checkpointer = AsyncCheckpointer(str(tmp_path), keep=2, write_fn=PickleWriter())
+    checkpointer.save(ModelAgent())
+    checkpointer.close()
+    checkpoint_ids = list_checkpoints(str(tmp_path))
+    assert len(checkpoint_ids) == 2 and checkpoint_ids[1] == "1-1"
+
+
+def test_failed_write_leaves_no_checkpoint(tmp_path):
+    def write_fn(state_dict, path):
+        with open(path, "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+
+    checkpointer = AsyncCheckpointer(str(tmp_path), write_fn=write_fn)
+    checkpointer.save(ModelAgent())
+    checkpointer.close()
+    assert os.listdir(tmp_path) == []
+    assert checkpointer.stats()["checkpoint_failed"] == 1
+
+
+def test_agent_without_model_is_saved_on_the_calling_thread(tmp_path):
+    checkpointer = AsyncCheckpointer(str(tmp_path))
+    agent = LiveAgent()
+    checkpointer.save(agent)
+    assert agent.save_threads == [threading.current_thread()]
+    checkpointer.close()
+    assert checkpointer.stats()["checkpoint_sync_saved"] == 1
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+from ppo.env_agent import agent_state, env_agent, predict_actions, restore_agent_state, shared_agent_of
+from ppo.model_cache import ModelCache
+
+
+# Agent keeping an lstm state like the agent of the framework, predict adds the observation to the state
+# 与框架智能体一样保存lstm状态的智能体，predict将观测加到状态上
+class LstmAgent:
+    def __init__(self):
+        self.model = object()
+        self.lstm_hidden = 0
+        self.predict_calls = []
+        self.load_cnt = 0
+
+    def reset(self, camp, player_id):
+        self.lstm_hidden = 0
+
+    def load_model(self, path=None, id="latest"):
+        self.load_cnt += 1
+
+    def observation_process(self, state_dict):
+        return {"obs": state_dict["obs"], "lstm_hidden": self.lstm_hidden}
+
+    def predict(self, list_obs_data):
+        self.predict_calls.append(len(list_obs_data))
+        return [obs_data["lstm_hidden"] + obs_data["obs"] for obs_data in list_obs_data]
+
+    def update_status(self, obs_data, act_data):
+        self.lstm_hidden = act_data
+
+    def action_process(self, state_dict, act_data, is_stochastic):
+        return (act_data, is_stochastic)
+
+
+def test_env_agents_keep_their_own_lstm_state():
+    agent = LstmAgent()
+    views = [env_agent(agent) for _ in range(3)]
+    for step in range(4):
+        actions = predict_actions(views, [{"obs": index + 1} for index in range(len(views))], is_eval=False)
+        assert actions == [((index + 1) * (step + 1), True) for index in range(len(views))]
+    assert [view.lstm_hidden for view in views] == [4, 8, 12]
+    assert agent.lstm_hidden == 0
+    views[1].reset(0, 100)
+    assert [view.lstm_hidden for view in views] == [4, 0, 12]
+
+
+def test_one_predict_call_per_shared_agent():
+    agents = [LstmAgent(), LstmAgent()]
+    views = [env_agent(agent) for _ in range(3) for agent in agents]
+    actions = predict_actions(views, [{"obs": 1}] * len(views), is_eval=True)
+    assert actions == [(1, False)] * len(views)
+    assert [agent.predict_calls for agent in agents] == [[3], [3]]
+    assert all(shared_agent_of(view) is agents[index % 2] for index, view in enumerate(views))
+    assert isinstance(views[0], LstmAgent) and views[0].model is agents[0].model
+
+
+def test_model_cache_loads_once_for_the_env_agents_of_an_agent():
+    agent = LstmAgent()
+    model_cache = ModelCache(lambda logger: [])
+    for view in [env_agent(agent) for _ in range(4)]:
+        model_cache.load(view, 7)
+    assert agent.load_cnt == 1 and model_cache.skip_cnt == 3
+
+
+def test_restored_agent_state_predicts_like_the_snapshot():
+    agent = LstmAgent()
+    view = env_agent(agent)
+    view.reward_manager = "manager"
+    predict_actions([view], [{"obs": 2}], is_eval=False)
+    state = agent_state(view)
+    expected = [predict_actions([view], [{"obs": 3}], is_eval=False) for _ in range(2)]
+    # The snapshot can be restored more than once, the reward manager and the shared agent are left alone
+    # 快照可以多次恢复，奖励管理器和共享的智能体保持不变
+    for _ in range(2):
+        restore_agent_state(view, state)
+        assert view.lstm_hidden == 2 and view.reward_manager == "manager" and shared_agent_of(view) is agent
+        assert [predict_actions([view], [{"obs": 3}], is_eval=False) for _ in range(2)] == expected
+    view.extra = 1
+    restore_agent_state(view, state)
+    assert "extra" not in vars(view) and "shared_agent" not in state
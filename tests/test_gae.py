@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import numpy as np
+import pytest
+
+from ppo.config import Config
+from ppo.gae import gae_loop, gae_vectorized
+
+
+@pytest.mark.parametrize("frame_num", [0, 1, 7, 1024, 3001])
+@pytest.mark.parametrize("block", [1, 7, 64, 1024])
+def test_vectorized_matches_loop(frame_num, block):
+    rng = np.random.default_rng(frame_num * 31 + block)
+    rewards = rng.normal(size=(3, frame_num))
+    values = rng.normal(size=(3, frame_num))
+    dones = rng.random((3, frame_num)) < 0.01
+    advantages, returns = gae_vectorized(rewards, values, dones, block=block)
+    expected_advantages, expected_returns = gae_loop(rewards, values, dones)
+    np.testing.assert_allclose(advantages, expected_advantages, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(returns, expected_returns, rtol=1e-10, atol=1e-10)
+
+
+# The value after a done frame is 0, so the frames before it do not see the next episode
+# done帧之后的价值为0，其之前的帧不受下一局的影响
+def test_done_frame_cuts_the_bootstrap():
+    rewards = np.array([1.0, 2.0, 3.0, 4.0])
+    values = np.array([0.5, 0.5, 0.5, 9.0])
+    dones = np.array([False, True, False, False])
+    advantages, returns = gae_vectorized(rewards, values, dones)
+    first_delta = rewards[0] + Config.GAMMA * values[1] - values[0]
+    assert advantages[0, 1] == pytest.approx(rewards[1] - values[1])
+    assert advantages[0, 0] == pytest.approx(first_delta + Config.GAMMA * Config.LAMDA * advantages[0, 1])
+    np.testing.assert_allclose(returns, advantages + values)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import os
+import tempfile
+import threading
+
+import pytest
+
+from ppo.inference_server import InferenceClient, InferenceServer
+
+
+# Agent of the server, the act_data of an obs_data is twice the obs_data. The obs_data slow_on takes slow seconds
+# 服务端的智能体，obs_data的act_data为obs_data的两倍，obs_data slow_on耗时slow秒
+class DoubleModel:
+    def __init__(self, slow_on=None, slow=0.0):
+        self.slow_on = slow_on
+        self.slow = slow
+        self.load_ids = []
+
+    def load_model(self, path=None, id=None):
+        self.load_ids.append(id)
+
+    def predict(self, list_obs_data):
+        if self.slow_on in list_obs_data:
+            threading.Event().wait(self.slow)
+        return [obs_data * 2 for obs_data in list_obs_data]
+
+
+# Agent of the actor, the obs_data is the frame number of the state dict and the action the act_data
+# actor中的智能体，obs_data为state dict中的帧号，动作为act_data
+class DoubleAgent:
+    def __init__(self):
+        self.load_ids = []
+        self.act_data = []
+
+    def load_model(self, path=None, id=None):
+        self.load_ids.append(id)
+
+    def observation_process(self, state_dict):
+        return state_dict["frame_no"]
+
+    def update_status(self, obs_data, act_data):
+        self.act_data.append(act_data)
+
+    def action_process(self, state_dict, act_data, is_stochastic):
+        return act_data
+
+
+@pytest.fixture
+def address():
+    path = os.path.join(tempfile.mkdtemp(), "inference.sock")
+    yield path
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def test_predict_batches_the_agents_of_a_call(address):
+    server = InferenceServer([DoubleModel()], address, max_batch=4, max_wait=0.001)
+    client = InferenceClient(address, timeout=5)
+    try:
+        agents = [DoubleAgent(), DoubleAgent()]
+        for agent in agents:
+            assert client.load(agent, "latest")
+        assert client.predict(agents, [{"frame_no": 3}, {"frame_no": 5}], False) == [6, 10]
+        assert [agent.act_data for agent in agents] == [[6], [10]] and not agents[0].load_ids
+        assert client.stats()["inference_observations"] == 2
+    finally:
+        client.close()
+        server.close()
+
+
+def test_late_reply_is_not_taken_for_the_next_call(address):
+    model = DoubleModel(slow_on=7, slow=0.5)
+    server = InferenceServer([model], address, max_batch=1, max_wait=0.0)
+    client = InferenceClient(address, timeout=0.1, retry_interval=0)
+    agent = DoubleAgent()
+    try:
+        assert client.load(agent, "latest")
+        with pytest.raises(OSError):
+            client.predict([agent], [{"frame_no": 7}], False)
+        assert client.conn is None
+        assert client.stats()["inference_client_errors"] == 1
+
+        # The reply of frame 7 arrives on the closed connection, the next episode connects again
+        # 第7帧的回复到达已关闭的连接，下一局重新连接
+        threading.Event().wait(0.6)
+        assert client.load(agent, "latest")
+        assert client.predict([agent], [{"frame_no": 2}], False) == [4]
+        assert client.predict([agent], [{"frame_no": 4}], False) == [8]
+    finally:
+        client.close()
+        server.close()
+
+
+def test_agents_fall_back_to_local_predict_when_the_server_is_gone(address):
+    server = InferenceServer([DoubleModel()], address)
+    client = InferenceClient(address, timeout=1, retry_interval=60)
+    agents = [DoubleAgent(), DoubleAgent()]
+    try:
+        assert client.load(agents[0], "latest")
+        assert client.load(agents[1], "model-3")
+        server.close()
+        with pytest.raises(Exception):
+            client.predict(agents, [{"frame_no": 1}, {"frame_no": 1}], False)
+        client.fall_back(agents)
+        assert [agent.load_ids for agent in agents] == [["latest"], ["model-3"]]
+        assert not client.model_ids
+        assert client.stats()["inference_client_fallbacks"] == 2
+
+        # Until retry_interval passed load leaves the agents to load_model
+        # retry_interval到期之前load交由智能体自行load_model
+        assert not client.load(agents[0], "latest")
+    finally:
+        client.close()
+
+
+def test_least_recently_used_model_is_evicted(address):
+    model = DoubleModel()
+    server = InferenceServer([model], address, max_batch=1, max_wait=0.0)
+    client = InferenceClient(address, timeout=5)
+    agents = [DoubleAgent(), DoubleAgent()]
+    try:
+        assert client.load(agents[0], "latest")
+        assert client.load(agents[1], "model-3")
+        for agent in (agents[0], agents[0], agents[1], agents[0]):
+            assert client.predict([agent], [{"frame_no": 1}], False) == [2]
+        assert model.load_ids == ["latest", "model-3", "latest"]
+        assert client.stats()["inference_model_evictions"] == 2
+    finally:
+        client.close()
+        server.close()
+
+
+def test_client_connects_once_the_server_is_available(address):
+    client = InferenceClient(address, timeout=5, retry_interval=0)
+    agent = DoubleAgent()
+    assert not client.load(agent, "latest")
+    server = InferenceServer([DoubleModel()], address)
+    try:
+        assert client.load(agent, "latest")
+        assert client.predict([agent], [{"frame_no": 4}], False) == [8]
+    finally:
+        client.close()
+        server.close()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import os
+
+from ppo.model_cache import ModelCache, newest_checkpoint
+
+
+# Model with the state_dict / load_state_dict of a torch module
+# 具有torch模块state_dict / load_state_dict接口的模型
+class DictModel:
+    def __init__(self):
+        self.weights = {}
+
+    def state_dict(self):
+        return dict(self.weights)
+
+    def load_state_dict(self, state_dict):
+        self.weights = dict(state_dict)
+
+
+class CheckpointAgent:
+    def __init__(self, model_dir, model=None):
+        self.model_dir = model_dir
+        self.model = model
+        self.loaded_ids = []
+
+    def load_model(self, path=None, id="latest"):
+        self.loaded_ids.append(id)
+        if self.model is not None:
+            self.model.load_state_dict({"checkpoint": newest_checkpoint(self.model_dir)[0]})
+
+
+def write_checkpoint(model_dir, checkpoint_id, mtime_ns):
+    path = os.path.join(model_dir, f"model.ckpt-{checkpoint_id}.pkl")
+    with open(path, "wb") as f:
+        f.write(b"weights")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_latest_is_loaded_again_only_when_the_newest_checkpoint_changes(tmp_path):
+    write_checkpoint(tmp_path, 100, 1_000_000_000)
+    agent = CheckpointAgent(tmp_path)
+    model_cache = ModelCache(None, latest_dir=str(tmp_path))
+    assert model_cache.load(agent, "latest")
+    assert not model_cache.load(agent, "latest")
+    write_checkpoint(tmp_path, 200, 2_000_000_000)
+    assert model_cache.load(agent, "latest")
+    # A checkpoint rewritten under the same name is a new version
+    # 以相同名称重写的checkpoint是新的版本
+    write_checkpoint(tmp_path, 200, 3_000_000_000)
+    assert model_cache.load(agent, "latest")
+    assert agent.loaded_ids == ["latest"] * 3 and model_cache.skip_cnt == 1
+
+
+def test_latest_without_checkpoints_is_always_loaded(tmp_path):
+    agent = CheckpointAgent(tmp_path)
+    for model_cache in (ModelCache(None), ModelCache(None, latest_dir=str(tmp_path))):
+        assert model_cache.load(agent, "latest")
+        assert model_cache.load(agent, "latest")
+    assert model_cache.load(agent, 7)
+    assert not model_cache.load(agent, 7)
+
+
+def test_peer_holding_the_checkpoint_shares_its_weights(tmp_path):
+    write_checkpoint(tmp_path, 100, 1_000_000_000)
+    agent, peer = CheckpointAgent(tmp_path, DictModel()), CheckpointAgent(tmp_path, DictModel())
+    model_cache = ModelCache(None, latest_dir=str(tmp_path))
+    assert model_cache.load(peer, "latest", [agent, peer])
+    assert not model_cache.load(agent, "latest", [agent, peer])
+    assert agent.loaded_ids == [] and agent.model.weights == {"checkpoint": "model.ckpt-100.pkl"}
+    assert model_cache.share_cnt == 1
+
+
+def test_peer_without_a_model_does_not_share(tmp_path):
+    write_checkpoint(tmp_path, 100, 1_000_000_000)
+    agent, peer = CheckpointAgent(tmp_path), CheckpointAgent(tmp_path)
+    model_cache = ModelCache(None, latest_dir=str(tmp_path))
+    model_cache.load(peer, "latest", [agent, peer])
+    assert model_cache.load(agent, "latest", [agent, peer])
+    assert model_cache.share_cnt == 0
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ppo.reward_batch import extract_reward_columns, result_batch
+from ppo.reward_benchmark import SCENARIOS, make_scenario
+from ppo.reward_manager import FrameIndex, GameRewardManager
+
+# Rewards of the baseline GameRewardManager, recorded per case, player and frame in the order of "items"
+# 基线GameRewardManager的回报，按用例、玩家和帧记录，顺序与"items"相同
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "reward_golden.json")) as f:
+    GOLDEN = json.load(f)
+GOLDEN_CASES = {case["name"]: case for case in GOLDEN["cases"]}
+
+
+# Soldiers of a third camp are enemies of both heroes, enemy_soldiers_of must collect every other camp
+# 第三个阵营的小兵对两个英雄都是敌方，enemy_soldiers_of需要收集其他所有阵营
+def add_third_camp_soldiers(frame):
+    for j in range(3):
+        frame["npc_states"].append(
+            {
+                "camp": "PLAYERCAMP_3",
+                "sub_type": "ACTOR_SUB_SOLDIER",
+                "runtime_id": 3000 + j,
+                "hp": 300 + 100 * j,
+                "max_hp": 800,
+                "location": {"x": 1000 * j, "z": -1000 * j},
+            }
+        )
+
+
+# Frames of a golden case, its episodes one after the other
+# 金标用例的帧，各对局依次排列
+def golden_frames(case):
+    frames = []
+    for episode in case["episodes"]:
+        episode_frames = make_scenario(episode["scenario"], episode["frame_num"], seed=episode["seed"])
+        for frame in episode_frames:
+            if episode["move_towers"]:
+                for organ in frame["npc_states"]:
+                    if organ["sub_type"] == "ACTOR_SUB_TOWER":
+                        organ["location"]["x"] += 2000
+            if case["third_camp_soldiers"]:
+                add_third_camp_soldiers(frame)
+        frames += episode_frames
+    return frames
+
+
+def assert_golden_rewards(rewards, expected_rows):
+    assert len(rewards) == len(expected_rows)
+    for reward, expected_row in zip(rewards, expected_rows):
+        assert list(reward.keys()) == GOLDEN["items"]
+        for key, expected in zip(GOLDEN["items"], expected_row):
+            assert reward[key] == pytest.approx(expected, rel=1e-9, abs=1e-9), key
+
+
+# One manager per player over all the frames of a case, a second episode reuses the manager of the first one
+# 每个玩家一个奖励管理器处理用例的所有帧，第二局复用第一局的奖励管理器
+@pytest.mark.parametrize("name", sorted(GOLDEN_CASES))
+def test_result_matches_baseline(name):
+    case = GOLDEN_CASES[name]
+    frames = golden_frames(case)
+    for player_id, expected_rows in case["expected"].items():
+        manager = GameRewardManager(int(player_id))
+        assert_golden_rewards([dict(manager.result(frame)) for frame in frames], expected_rows)
+
+
+# One FrameIndex per frame shared by the managers of both agents gives the rewards of separate frames
+# 两个智能体的奖励管理器共享每帧一个FrameIndex，结果与各自构建时相同
+def test_shared_frame_index_matches_baseline():
+    case = GOLDEN_CASES["tower_dive"]
+    frames = golden_frames(case)
+    managers = {player_id: GameRewardManager(int(player_id)) for player_id in case["expected"]}
+    rewards = {player_id: [] for player_id in case["expected"]}
+    for frame in frames:
+        frame_index = FrameIndex(frame)
+        for player_id, manager in managers.items():
+            rewards[player_id].append(dict(manager.result(frame, frame_index)))
+    for player_id, expected_rows in case["expected"].items():
+        assert_golden_rewards(rewards[player_id], expected_rows)
+
+
+@pytest.mark.parametrize("scenario", sorted(SCENARIOS))
+def test_result_batch_matches_result(scenario):
+    frames = make_scenario(scenario, 120, seed=6)
+    manager = GameRewardManager(100)
+    per_frame = [dict(manager.result(frame)) for frame in frames]
+    batch = result_batch(extract_reward_columns(frames, 100), 100)
+    assert batch.keys() == per_frame[0].keys()
+    for key, values in batch.items():
+        np.testing.assert_allclose(values, [reward[key] for reward in per_frame], rtol=1e-9, atol=1e-9, err_msg=key)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import threading
+import time
+
+import pytest
+
+from ppo.sample_pipeline import SamplePipeline
+
+
+# Counts the calls running at the same time and the most seen
+# 统计同时执行的调用数及其最大值
+class Concurrency:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, fn):
+        def wrapped(*args):
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            try:
+                time.sleep(0.01)
+                return fn(*args)
+            finally:
+                with self.lock:
+                    self.running -= 1
+
+        return wrapped
+
+
+def test_only_process_runs_in_parallel():
+    process, learn = Concurrency(), Concurrency()
+    learned = []
+    pipeline = SamplePipeline(process(lambda episode: episode), learn(learned.append), workers=4, max_pending=8)
+    for episode in range(16):
+        pipeline.submit(episode)
+    pipeline.close()
+    assert sorted(learned) == list(range(16))
+    assert process.max_running > 1
+    assert learn.max_running == 1
+
+
+def test_learn_waits_for_agent_lock():
+    learned = []
+    pipeline = SamplePipeline(lambda episode: episode, learned.append, workers=2)
+    with pipeline.agent_lock:
+        pipeline.submit(0)
+        time.sleep(0.05)
+        assert learned == []
+    pipeline.close()
+    assert learned == [0]
+    assert pipeline.stats()["lock_wait_time"] > 0.0
+
+
+def test_first_error_is_raised_once():
+    def learn_fn(samples):
+        raise ValueError(samples)
+
+    pipeline = SamplePipeline(lambda episode: episode, learn_fn, workers=3, max_pending=8)
+    for episode in range(6):
+        pipeline.submit(episode)
+    with pytest.raises(ValueError):
+        pipeline.close()
+    pipeline._raise_error()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from ppo import sample_ring as sample_ring_module
+from ppo.config import Config
+from ppo.sample_ring import SampleRingReader, create_sample_rings, open_sample_ring
+
+
+# The actors of these tests run in the process of the learner or are forked from it and share its resource tracker,
+# which must keep tracking the rings the learner created
+# 这些测试中的actor运行在learner进程中或由其fork，与其共享resource tracker，该tracker需要继续跟踪learner创建的环形缓冲区
+@pytest.fixture
+def ring_name(monkeypatch):
+    monkeypatch.setattr(sample_ring_module, "_untrack", lambda shm: None)
+    return f"test_ring_{os.getpid()}"
+
+
+def sample_of(actor, index):
+    sample = np.full(Config.SAMPLE_DIM, index, dtype=np.float32)
+    sample[0] = actor
+    return sample
+
+
+def write_samples(ring_name, actor, sample_num, claimed, done):
+    sample_ring = open_sample_ring(ring_name)
+    claimed.put(None if sample_ring is None else sample_ring.name)
+    written = 0
+    while sample_ring is not None and written < sample_num:
+        if sample_ring.put(sample_of(actor, written)):
+            written += 1
+    # Keep the claim until every actor has claimed its ring
+    # 所有actor都占用环形缓冲区之前保持占用
+    done.wait(10)
+    if sample_ring is not None:
+        sample_ring.close()
+
+
+def test_round_trip_keeps_the_samples_in_order(ring_name):
+    reader = SampleRingReader(create_sample_rings(ring_name, 1, slot_num=8))
+    try:
+        sample_ring = open_sample_ring(ring_name)
+        assert sample_ring.put_samples([sample_of(1, i) for i in range(10)]) == 8
+        received = []
+        assert reader.drain(lambda views: received.append(np.concatenate(views).copy())) == 8
+        assert len(sample_ring) == 0
+        for i, sample in enumerate(received):
+            np.testing.assert_array_equal(sample, sample_of(1, i))
+        assert sample_ring.stats()["full"] == 1
+        assert reader.stats()["read"] == 8
+        sample_ring.close()
+    finally:
+        reader.close()
+
+
+def test_each_actor_process_claims_its_own_ring(ring_name):
+    sample_num = 50
+    reader = SampleRingReader(create_sample_rings(ring_name, 2, slot_num=16))
+    context = multiprocessing.get_context("fork")
+    claimed, done = context.Queue(), context.Event()
+    actors = [
+        context.Process(target=write_samples, args=(ring_name, actor, sample_num, claimed, done)) for actor in range(3)
+    ]
+    try:
+        for actor in actors:
+            actor.start()
+        # Two actors get a ring each, the third falls back to agent.learn
+        # 两个actor各占用一个环形缓冲区，第三个回退到agent.learn
+        names = [claimed.get(timeout=10) for _ in actors]
+        assert sorted(name for name in names if name is not None) == [f"{ring_name}-0", f"{ring_name}-1"]
+        received = {}
+
+        def consume(views):
+            sample = np.concatenate(views)
+            received.setdefault(int(sample[0]), []).append(int(sample[1]))
+
+        while sum(len(indexes) for indexes in received.values()) < 2 * sample_num:
+            reader.drain(consume)
+        done.set()
+        for actor in actors:
+            actor.join(10)
+        assert len(received) == 2
+        for indexes in received.values():
+            assert indexes == list(range(sample_num))
+    finally:
+        for actor in actors:
+            if actor.is_alive():
+                actor.kill()
+        reader.close()
+
+
+def test_missing_rings_fall_back(ring_name):
+    assert open_sample_ring(ring_name) is None
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+###########################################################################
+# Copyright © 1998 - 2024 Tencent. All Rights Reserved.
+###########################################################################
+"""
+Author: Tencent AI Arena Authors
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from ppo.array_frame_collector import ArrayFrameCollector
+from ppo.config import Config
+from ppo.sample_stream import StreamingFrameCollector
+from ppo.sim_env import StubAgent, stub_build_frame
+
+CHUNK_FRAMES = 2 * Config.LSTM_TIME_STEPS
+
+
+# Collector keeping the frames and the final reward it is given
+# 保存收到的帧和最终奖励的收集器
+class RecordingCollector:
+    def __init__(self, num_agents):
+        self.frames = [[] for _ in range(num_agents)]
+        self.last_rewards = [None] * num_agents
+
+    def save_frame(self, frame, agent_id):
+        self.frames[agent_id].append(frame)
+
+    def save_last_frame(self, reward, agent_id):
+        self.last_rewards[agent_id] = reward
+
+
+def make_frames(frame_num, agent_id=0):
+    return [SimpleNamespace(frame_no=i, reward=(i % 7 - 3) * 60.0, value=0.1 * i + agent_id) for i in range(frame_num)]
+
+
+def save_frames(collector, episodes, start, end):
+    for frame_idx in range(start, end):
+        for agent_id, frames in enumerate(episodes):
+            collector.save_frame(frames[frame_idx], agent_id)
+
+
+def test_chunks_bootstrap_from_the_next_frame():
+    episodes = [make_frames(2 * CHUNK_FRAMES + 5, agent_id) for agent_id in range(2)]
+    collector = StreamingFrameCollector(2, CHUNK_FRAMES, RecordingCollector)
+    chunks = []
+    for frame_idx in range(len(episodes[0])):
+        save_frames(collector, episodes, frame_idx, frame_idx + 1)
+        # A chunk is only ready once the frame after it is there
+        # 分段之后的一帧到达后分段才就绪
+        assert collector.chunk_ready() == (frame_idx - len(chunks) * CHUNK_FRAMES >= CHUNK_FRAMES)
+        if collector.chunk_ready():
+            chunks.append(collector.pop_chunk())
+    for agent_id in range(2):
+        collector.save_last_frame(50.0, agent_id)
+    last_chunk = collector.pop_last_chunk()
+
+    assert len(chunks) == 2
+    for k, chunk in enumerate(chunks):
+        for agent_id, frames in enumerate(episodes):
+            assert chunk.frames[agent_id] == frames[k * CHUNK_FRAMES : (k + 1) * CHUNK_FRAMES]
+            next_frame = frames[(k + 1) * CHUNK_FRAMES]
+            clipped = max(min(next_frame.reward, 100.0), -100.0)
+            assert chunk.last_rewards[agent_id] == pytest.approx(clipped + Config.GAMMA * next_frame.value)
+    assert last_chunk.frames == [frames[2 * CHUNK_FRAMES :] for frames in episodes]
+    assert last_chunk.last_rewards == [50.0, 50.0]
+    assert len(collector) == 0
+
+
+def test_restore_drops_the_frames_after_the_snapshot():
+    episodes = [make_frames(CHUNK_FRAMES, agent_id) for agent_id in range(2)]
+    collector = StreamingFrameCollector(2, CHUNK_FRAMES, RecordingCollector)
+    save_frames(collector, episodes, 0, 10)
+    state = collector.snapshot()
+    save_frames(collector, episodes, 10, 20)
+    collector.save_last_frame(7.0, 0)
+    assert collector.restore(state)
+    assert len(collector) == 10
+    assert collector.last_rewards == [None, None]
+
+    # The same frames saved again give the chunk of an episode without the restore
+    # 重新保存相同的帧，得到的分段与未恢复时相同
+    save_frames(collector, episodes, 10, CHUNK_FRAMES)
+    last_chunk = collector.pop_last_chunk()
+    assert last_chunk.frames == episodes
+
+
+def test_restore_fails_once_a_chunk_was_popped():
+    episodes = [make_frames(CHUNK_FRAMES + 3, agent_id) for agent_id in range(2)]
+    collector = StreamingFrameCollector(2, CHUNK_FRAMES, RecordingCollector)
+    save_frames(collector, episodes, 0, 3)
+    state = collector.snapshot()
+    save_frames(collector, episodes, 3, CHUNK_FRAMES + 3)
+    collector.pop_chunk()
+    assert not collector.restore(state)
+
+
+def test_truncate_bootstraps_the_last_chunk():
+    episodes = [make_frames(12, agent_id) for agent_id in range(2)]
+    collector = StreamingFrameCollector(2, CHUNK_FRAMES, RecordingCollector)
+    save_frames(collector, episodes, 0, 12)
+    assert collector.truncate()
+    last_chunk = collector.pop_last_chunk()
+    for agent_id, frames in enumerate(episodes):
+        assert last_chunk.frames[agent_id] == frames[:11]
+        clipped = max(min(frames[11].reward, 100.0), -100.0)
+        assert last_chunk.last_rewards[agent_id] == pytest.approx(clipped + Config.GAMMA * frames[11].value)
+
+
+# Chunks of ArrayFrameCollector are full sample rows, the frames of a chunk are all in its segments
+# ArrayFrameCollector的分段为完整的样本行，分段的帧都在其完整的LSTM分段中
+def test_array_chunks_are_full_sample_rows():
+    agent = StubAgent(seed=1)
+    collector = StreamingFrameCollector(1, CHUNK_FRAMES, ArrayFrameCollector)
+    samples = []
+    for frame_no in range(3 * CHUNK_FRAMES + 1):
+        agent.random_action()
+        state_dict = {"frame_state": {"frameNo": frame_no}, "reward": {"reward_sum": 1.0}}
+        collector.save_frame(stub_build_frame(agent, state_dict), 0)
+        if collector.chunk_ready():
+            samples += collector.pop_chunk().sample_process()[0]
+    assert len(samples) == 3 * CHUNK_FRAMES // Config.LSTM_TIME_STEPS
+    assert all(row.shape == (Config.SAMPLE_DIM,) for row in samples)
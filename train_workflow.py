@@ -8,8 +8,12 @@ Author: Tencent AI Arena Authors
 """
 
 import os
+import fcntl
 import time
 import random
+import tempfile
+import threading
+import contextlib
 from ppo.feature.definition import (
     sample_process,
     build_frame,
@@ -18,7 +22,16 @@ from ppo.feature.definition import (
     NONE_ACTION,
 )
 from kaiwu_agent.utils.common_func import attached
-from ppo.config import GameConfig
+from ppo.config import GameConfig, Config
+from ppo.reward_manager import FrameIndex
+from ppo.sample_pipeline import SamplePipeline
+from ppo.stage_timeline import StageStats
+from ppo.model_cache import ModelCache
+from ppo.checkpoint import AsyncCheckpointer, list_checkpoints
+from ppo.sample_stream import StreamingFrameCollector
+from ppo.array_frame_collector import ArrayFrameCollector
+from ppo.inference_server import InferenceClient, load_model_id, serve_inference
+from ppo.env_agent import agent_state, env_agent, predict_actions, restore_agent_state
 from tools.model_pool_utils import get_valid_model_pool
 
 
@@ -29,267 +42,882 @@ def workflow(envs, agents, logger=None, monitor=None):
     do_learns = [True, True]
     last_save_model_time = time.time()
 
-    while True:
-        for g_data in run_episodes(envs, agents, logger, monitor):
-            for index, (d_learn, agent) in enumerate(zip(do_learns, agents)):
-                if d_learn and len(g_data[index]) > 0:
-                    # The learner trains in a while true loop, here learn actually sends samples
-                    # learner 采用 while true 训练，此处 learn 实际为发送样本
-                    agent.learn(g_data[index])
-            g_data.clear()
-
-            now = time.time()
-            if now - last_save_model_time > GameConfig.MODEL_SAVE_INTERVAL:
-                agents[0].save_model()
-                last_save_model_time = now
-
-
-def run_episodes(envs, agents, logger, monitor):
-    # hok1v1 environment
-    # hok1v1环境
-    env = envs[0]
+    # With GameConfig.INFERENCE_SERVER_ADDRESS the actor taking the inference server role of the host serves the
+    # inference of the other actors with its agents as model slots and plays no episodes
+    # 配置了GameConfig.INFERENCE_SERVER_ADDRESS时，获得本主机推理服务角色的actor以其智能体为模型槽位为其他actor提供推理服务，不进行对局
+    if GameConfig.INFERENCE_SERVER_ADDRESS:
+        server_claim = claim_lock_file("ppo_inference_server.lock")
+        if server_claim is not None:
+            try:
+                serve_inference(agents, logger, monitor, threading.Event())
+            finally:
+                os.close(server_claim)
+            return
+
+    # This actor only plays eval episodes when it takes one of the GameConfig.EVAL_ACTORS eval roles of the host
+    # 本actor获得本主机GameConfig.EVAL_ACTORS个评估角色之一时只进行评估对局
+    eval_claim = claim_eval_actor(GameConfig.EVAL_ACTORS, logger)
+
+    # Latency of each stage, reported through monitor at the end of every episode
+    # 各阶段耗时，在每局结束时通过monitor上报
+    stage_stats = None
+    if GameConfig.STAGE_STATS_SAMPLE_EVERY > 0:
+        stage_stats = StageStats(GameConfig.STAGE_STATS_SAMPLE_EVERY)
+
+    def learn(g_data):
+        count(stage_stats, "samples", sum(len(samples) for samples in g_data))
+        timed(stage_stats, "learn", -1, learn_samples, agents, do_learns, g_data)
+
+    # With sample pipeline workers, sample_process and learn of finished episodes run in the background
+    # 配置了样本流水线工作线程时，已结束对局的sample_process和learn在后台执行
+    sample_pipeline = None
+    if GameConfig.SAMPLE_PIPELINE_WORKERS > 0:
+        sample_pipeline = SamplePipeline(
+            lambda frame_collector: timed(stage_stats, "sample_process", -1, process_samples, frame_collector),
+            learn,
+            workers=GameConfig.SAMPLE_PIPELINE_WORKERS,
+            max_pending=GameConfig.SAMPLE_PIPELINE_MAX_PENDING,
+            logger=logger,
+        )
+
+    # Model checkpoints are written in the background instead of stalling the actor loop
+    # 模型checkpoint在后台写入，不阻塞actor循环
+    checkpointer = None
+    if GameConfig.ASYNC_CHECKPOINT:
+        checkpointer = AsyncCheckpointer(
+            GameConfig.CHECKPOINT_DIR, GameConfig.CHECKPOINT_MAX_IN_FLIGHT, GameConfig.CHECKPOINT_KEEP, logger
+        )
+
+    try:
+        while True:
+            for g_data in run_episodes(
+                envs, agents, logger, monitor, stage_stats, sample_pipeline, eval_actor=eval_claim is not None
+            ):
+                # g_data is None when the samples have been handed to sample_pipeline
+                # 样本已交给sample_pipeline时g_data为None
+                if g_data is not None:
+                    learn(g_data)
+
+                now = time.time()
+                if now - last_save_model_time > GameConfig.MODEL_SAVE_INTERVAL:
+                    with agent_lock(sample_pipeline):
+                        if checkpointer is None:
+                            agents[0].save_model()
+                        else:
+                            checkpointer.save(agents[0])
+                    if checkpointer is not None:
+                        checkpoint_data = checkpointer.stats()
+                        if logger:
+                            logger.info(f"async checkpoint requested, stats:{checkpoint_data}")
+                        if monitor:
+                            monitor.put_data({os.getpid(): checkpoint_data})
+                    last_save_model_time = now
+    finally:
+        if checkpointer is not None:
+            checkpointer.close()
+        if sample_pipeline is not None:
+            sample_pipeline.close()
+        if eval_claim is not None:
+            os.close(eval_claim)
+
+
+# Take a role of the host, an exclusive flock on lock file name of the temp directory held until the file descriptor is
+# closed. Returns the file descriptor holding the flock, None when another process holds it
+# 获得本主机的一个角色，即对临时目录中名为name的锁文件加排他flock并持有到文件描述符关闭。返回持有flock的文件描述符，其他进程持有时返回None
+def claim_lock_file(name):
+    claim_fd = os.open(os.path.join(tempfile.gettempdir(), name), os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(claim_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(claim_fd)
+        return None
+    return claim_fd
+
+
+# Take one of the eval_actors eval roles of the host, an exclusive flock on its lock file held until the actor exits.
+# Returns the file descriptor holding the flock, None when every role is taken
+# 获得本主机eval_actors个评估角色之一，即对其锁文件加排他flock并持有到actor退出。返回持有flock的文件描述符，所有角色都被占用时返回None
+def claim_eval_actor(eval_actors, logger=None):
+    for index in range(eval_actors):
+        claim_fd = claim_lock_file(f"ppo_eval_actor_{index}.lock")
+        if claim_fd is None:
+            continue
+        if logger:
+            logger.info(f"actor {os.getpid()} takes eval role {index}, it only plays eval episodes")
+        return claim_fd
+    return None
+
+
+def learn_samples(agents, do_learns, g_data):
+    for index, (d_learn, agent) in enumerate(zip(do_learns, agents)):
+        if d_learn and len(g_data[index]) > 0:
+            # The learner trains in a while true loop, here learn actually sends samples
+            # learner 采用 while true 训练，此处 learn 实际为发送样本
+            agent.learn(g_data[index])
+    g_data.clear()
+
+
+def run_episodes(envs, agents, logger, monitor, timeline=None, sample_pipeline=None, eval_actor=False):
     # Number of agents, in hok1v1 the value is 2
     # 智能体数量，在hok1v1中值为2
     agent_num = len(agents)
+    # Every hok1v1 environment keeps its own frame collector, cumulative rewards and EnvAgents of the agents, which share
+    # the models of the agents while the lstm state, reward manager and other per game state belong to the environment.
+    # Environments share the models, every environment plays the model last loaded into an agent
+    # 每个hok1v1环境拥有独立的帧收集器、累积回报和智能体的EnvAgent，EnvAgent共享智能体的模型，lstm状态、奖励管理器等单局状态属于该环境。
+    # 各环境共享模型，每个环境使用最近一次加载到智能体的模型
+    env_slots = [
+        EnvSlot(i, env, [env_agent(agent) for agent in agents], new_frame_collector(agent_num))
+        for i, env in enumerate(envs)
+    ]
+    # Agents predict through the inference server of the host when it is configured and available
+    # 配置了本主机的推理服务且可用时，智能体经由其预测
+    inference_client = None
+    if GameConfig.INFERENCE_SERVER_ADDRESS:
+        inference_client = InferenceClient(GameConfig.INFERENCE_SERVER_ADDRESS, GameConfig.INFERENCE_TIMEOUT, logger=logger)
+
+    # An eval actor plays only eval episodes, the other actors only training episodes when there are eval actors
+    # 评估actor只进行评估对局，存在评估actor时其余actor只进行训练对局
+    if GameConfig.EVAL_ACTORS > 0:
+        for env_slot in env_slots:
+            env_slot.eval_mode = eval_actor
+
+    try:
+        if eval_actor:
+            run_eval_actor(env_slots, agent_num, logger, monitor, threading.Event(), inference_client)
+        else:
+            yield from run_env_slots(env_slots, agent_num, logger, monitor, timeline, sample_pipeline, inference_client)
+    finally:
+        if inference_client is not None:
+            inference_client.close()
+
+
+# Eval actor: play eval episodes in env_slots until stop is set, each round with the newest checkpoint of
+# GameConfig.CHECKPOINT_DIR or "latest" when there is none, waiting GameConfig.EVAL_ACTOR_INTERVAL seconds between
+# rounds. It reports the same monitor_data as eval episodes of the training actors, and after every round its liveness:
+# the rounds played and failed. A failed round is logged with its traceback and the next one starts from new episodes,
+# after a wait growing with the failures in a row
+# 评估actor：在env_slots中进行评估对局直到stop被设置，每轮使用GameConfig.CHECKPOINT_DIR中最新的checkpoint，没有checkpoint时
+# 使用"latest"，每轮之间等待GameConfig.EVAL_ACTOR_INTERVAL秒。上报与训练actor中评估对局相同的monitor_data，并在每轮之后上报存活状态：
+# 已完成和失败的轮数。失败的一轮连同调用栈记录到日志，下一轮从新的对局开始，开始前的等待时间随连续失败次数增长
+def run_eval_actor(env_slots, agent_num, logger, monitor, stop, inference_client=None):
+    episode_cnt = 0
+    lineup_iter = lineup_iterator_roundrobin_camp_heroes(camp_heroes=GameConfig.CAMP_HEROES)
+    round_cnt = failed_cnt = failures_in_a_row = 0
+    while not stop.is_set():
+        try:
+            episode_cnt = run_eval_round(
+                env_slots, agent_num, logger, monitor, stop, lineup_iter, episode_cnt, inference_client
+            )
+            round_cnt += 1
+            failures_in_a_row = 0
+        except Exception:
+            logger.exception("eval round failed, the eval actor starts a new round")
+            for env_slot in env_slots:
+                env_slot.running = False
+            failed_cnt += 1
+            failures_in_a_row += 1
+        report_eval_actor(monitor, logger, True, round_cnt, failed_cnt)
+        stop.wait(max(GameConfig.EVAL_ACTOR_INTERVAL, min(2**failures_in_a_row - 1, 60)))
+    report_eval_actor(monitor, logger, False, round_cnt, failed_cnt)
+
+
+# One eval round of run_eval_actor, every env_slot plays one episode with the newest checkpoint
+# run_eval_actor的一轮评估，每个env_slot使用最新的checkpoint进行一局
+def run_eval_round(env_slots, agent_num, logger, monitor, stop, lineup_iter, episode_cnt, inference_client=None):
+    checkpoint_ids = list_checkpoints(GameConfig.CHECKPOINT_DIR) if GameConfig.CHECKPOINT_DIR else []
+    train_model = (GameConfig.CHECKPOINT_DIR, checkpoint_ids[0]) if checkpoint_ids else "latest"
+    logger.info(f"eval round with model {train_model}")
+    for env_slot in env_slots:
+        while not env_slot.running and not stop.is_set():
+            episode_cnt = start_episode(
+                env_slot,
+                episode_cnt,
+                lineup_iter,
+                0,
+                logger,
+                inference_client=inference_client,
+                train_model=train_model,
+            )
+    while not stop.is_set() and any(env_slot.running for env_slot in env_slots):
+        running_slots = [env_slot for env_slot in env_slots if env_slot.running]
+        for env_slot in running_slots:
+            env_slot.actions = repeat_actions(env_slot, agent_num)
+        requests = [
+            (env_slot, index)
+            for env_slot in running_slots
+            for index, d_predict in enumerate(env_slot.do_predicts)
+            if d_predict and deciding(env_slot, index)
+        ]
+        if requests:
+            actions = batch_predict(
+                [env_slot.agents[index] for env_slot, index in requests],
+                [env_slot.state_dicts[index] for env_slot, index in requests],
+                True,
+                inference_client,
+            )
+            for (env_slot, index), action in zip(requests, actions):
+                env_slot.actions[index] = action
+        for env_slot in running_slots:
+            step_episode(env_slot, env_slot.env.step(env_slot.actions), logger, monitor)
+    return episode_cnt
+
+
+# Report the liveness of the eval actor, alive is 0 once it stops
+# 上报评估actor的存活状态，停止后alive为0
+def report_eval_actor(monitor, logger, alive, round_cnt, failed_cnt):
+    eval_actor_data = {
+        "eval_actor_alive": int(alive),
+        "eval_actor_rounds": round_cnt,
+        "eval_actor_failed_rounds": failed_cnt,
+        "eval_actor_report_time": round(time.time(), 3),
+    }
+    if logger:
+        logger.info(f"eval actor stats:{eval_actor_data}")
+    if monitor:
+        monitor.put_data({os.getpid(): eval_actor_data})
+
+
+def run_env_slots(env_slots, agent_num, logger, monitor, timeline, sample_pipeline, inference_client=None):
     # Episode counter
     # 对局数量计数器
     episode_cnt = 0
-    # ID of Agent to training
-    # 每一局要训练的智能体的id
-    train_agent_id = 0
     # Lineup iterator
     # 阵容生成器
     lineup_iter = lineup_iterator_roundrobin_camp_heroes(camp_heroes=GameConfig.CAMP_HEROES)
-    # Frame Collector
-    # 帧收集器
-    frame_collector = FrameCollector(agent_num)
     # Make eval matches as evenly distributed as possible
     # 引入随机因子，让eval对局尽可能平均分布
     random_eval_start = random.randint(0, GameConfig.EVAL_FREQ)
-    model_id = "31694"
-
-    # Single environment process (30 frame/s)
-    # 单局流程 (30 frame/s)
+    # Skip load_model when the agent already holds the checkpoint
+    # 智能体已持有checkpoint时跳过load_model
+    model_cache = None
+    if GameConfig.MODEL_CACHE:
+        model_cache = ModelCache(
+            get_valid_model_pool, GameConfig.MODEL_POOL_REFRESH_INTERVAL, GameConfig.LATEST_MODEL_DIR
+        )
+
+    # Environments are stepped in lockstep (30 frame/s each), an environment whose episode ends starts a new one on its own
+    # 所有环境同步推进 (每个30 frame/s)，对局结束的环境单独开始新的对局
     while True:
-        # Settings before starting a new environment
-        # 以下是启动一个新对局前的设置
+        for env_slot in env_slots:
+            while not env_slot.running:
+                with agent_lock(sample_pipeline):
+                    episode_cnt = start_episode(
+                        env_slot,
+                        episode_cnt,
+                        lineup_iter,
+                        random_eval_start,
+                        logger,
+                        timeline,
+                        model_cache,
+                        inference_client,
+                    )
+
+        # Initialize the default actions. If the agent does not make a decision, env.step uses the default action, or
+        # the last action between two decisions of GameConfig.DECISION_INTERVAL.
+        # Predictions of all environments are gathered into one batch for each of train and eval
+        # 初始化默认的actions，如果智能体不进行决策，则env.step使用默认action，GameConfig.DECISION_INTERVAL的两次决策之间使用上一次的action
+        # 所有环境的预测按训练和评估分别合并为一个批次
+        for env_slot in env_slots:
+            snapshot_episode(env_slot)
+            env_slot.actions = repeat_actions(env_slot, agent_num)
+        frames_to_save = []
+        for is_eval in (False, True):
+            requests = [
+                (env_slot, index)
+                for env_slot in env_slots
+                if env_slot.is_eval == is_eval
+                for index, d_predict in enumerate(env_slot.do_predicts)
+                if d_predict and deciding(env_slot, index)
+            ]
+            if not requests:
+                continue
+            with agent_lock(sample_pipeline):
+                actions = timed(
+                    timeline,
+                    "predict",
+                    -1,
+                    batch_predict,
+                    [env_slot.agents[index] for env_slot, index in requests],
+                    [env_slot.state_dicts[index] for env_slot, index in requests],
+                    is_eval,
+                    inference_client,
+                )
+            for (env_slot, index), action in zip(requests, actions):
+                env_slot.actions[index] = action
+                # Only when do_predict=True and is_eval=False, the agent's environment data is saved.
+                # 仅do_predict=True且is_eval=False时，智能体的对局数据保存。即评估对局数据不训练，不是最新模型产生的数据不训练
+                if not is_eval:
+                    frames_to_save.append((env_slot, index))
+
+        save_frames(env_slots, frames_to_save, timeline)
+        step_results = [
+            timed(timeline, "env_step", env_slot.index, env_slot.env.step, env_slot.actions) for env_slot in env_slots
+        ]
+        count(timeline, "frames", len(env_slots))
+
+        for env_slot, step_result in zip(env_slots, step_results):
+            frame_collector = env_slot.frame_collector
+            streaming = isinstance(frame_collector, StreamingFrameCollector)
+            learnable = step_episode(env_slot, step_result, logger, monitor, timeline, sample_pipeline)
+            if not env_slot.running:
+                report_stage_stats(timeline, monitor, logger)
+                report_reward_profile(env_slot, monitor, logger)
+                report_model_cache(model_cache, monitor, logger)
+                report_inference(inference_client, monitor, logger)
+            if learnable:
+                # Training episode ended, hand the frames to sample_pipeline or process them here
+                # 训练对局结束，将帧交给sample_pipeline或在此处理
+                if streaming:
+                    frame_collector = frame_collector.pop_last_chunk()
+                elif sample_pipeline is not None:
+                    env_slot.frame_collector = new_frame_collector(agent_num)
+                yield hand_off_samples(frame_collector, sample_pipeline, timeline)
+            elif streaming and env_slot.running and frame_collector.chunk_ready():
+                # Streaming mode emits every full chunk during the episode
+                # 流式模式在对局中输出每个完整的分段
+                yield hand_off_samples(frame_collector.pop_chunk(), sample_pipeline, timeline)
+
+
+# In streaming mode the frames of an episode are emitted every SAMPLE_CHUNK_SEGMENTS * LSTM_TIME_STEPS frames
+# 流式模式下对局的帧每SAMPLE_CHUNK_SEGMENTS * LSTM_TIME_STEPS帧输出一次
+def new_frame_collector(agent_num):
+    collector_factory = ArrayFrameCollector if GameConfig.ARRAY_FRAME_COLLECTOR else FrameCollector
+    if GameConfig.SAMPLE_CHUNK_SEGMENTS > 0:
+        return StreamingFrameCollector(
+            agent_num, GameConfig.SAMPLE_CHUNK_SEGMENTS * Config.LSTM_TIME_STEPS, collector_factory
+        )
+    return collector_factory(agent_num)
+
+
+# The array backend formats its own samples, they are views of its buffers until the next reset
+# 数组后端自行格式化样本，样本在下一次reset之前是其缓冲区的视图
+def process_samples(frame_collector):
+    if isinstance(frame_collector, ArrayFrameCollector):
+        return frame_collector.sample_process()
+    return sample_process(frame_collector)
+
+
+# Lock to hold while the actor uses the agents, so learn in the sample_pipeline workers never runs at the same time
+# 使用智能体时需要持有的锁，使sample_pipeline工作线程中的learn不会同时执行
+def agent_lock(sample_pipeline):
+    if sample_pipeline is None:
+        return contextlib.nullcontext()
+    return sample_pipeline.agent_lock
+
+
+# Samples to yield from run_episodes, None when frame_collector went to sample_pipeline
+# run_episodes要输出的样本，frame_collector交给sample_pipeline时为None
+def hand_off_samples(frame_collector, sample_pipeline, timeline=None):
+    if sample_pipeline is not None:
+        sample_pipeline.submit(frame_collector)
+        return None
+    return timed(timeline, "sample_process", -1, process_samples, frame_collector)
+
+
+# State of one environment in run_episodes
+# run_episodes中单个环境的状态
+class EnvSlot:
+    def __init__(self, index, env, agents, frame_collector):
+        self.index = index
+        self.env = env
+        self.agents = agents
+        self.frame_collector = frame_collector
+        # ID of Agent to training
+        # 每一局要训练的智能体的id
+        self.train_agent_id = 0
+        self.running = False
+        # True in an eval actor, False in training actors beside eval actors, None evaluates every EVAL_FREQ
+        # 评估actor中为True，存在评估actor时训练actor中为False，None表示每EVAL_FREQ局评估一次
+        self.eval_mode = None
+        self.episode_cnt = 0
+        self.is_eval = False
+        self.do_predicts = []
+        # Steps between two decisions of each agent, see GameConfig.DECISION_INTERVAL
+        # 每个智能体两次决策之间的步数，见GameConfig.DECISION_INTERVAL
+        self.decision_intervals = []
+        self.state_dicts = None
+        self.actions = None
+        self.frame_no = 0
+        self.step = 0
+        self.total_reward_dicts = []
+        # Last EpisodeSnapshot of the running episode, see GameConfig.EPISODE_SNAPSHOT_INTERVAL
+        # 当前对局最近的EpisodeSnapshot，见GameConfig.EPISODE_SNAPSHOT_INTERVAL
+        self.episode_snapshot = None
+
+
+# State of the episode of env_slot at the start of a step, after the rewards of its state_dicts and before predict:
+# the reward managers, the per environment state of the agents such as the lstm state, the frame collector, the
+# cumulative rewards, the step counters and the actions repeated between decisions
+# env_slot中对局在一步开始时的状态，即state_dicts的回报已计算、尚未预测时：奖励管理器、智能体的单环境状态(例如lstm状态)、帧收集器、
+# 累积回报、步数计数和决策之间重复的动作
+class EpisodeSnapshot:
+    def __init__(self, env_slot):
+        self.frame_no = env_slot.frame_no
+        self.step = env_slot.step
+        self.actions = None if env_slot.actions is None else list(env_slot.actions)
+        self.total_reward_dicts = [dict(total_reward_dict) for total_reward_dict in env_slot.total_reward_dicts]
+        self.reward_managers = [agent.reward_manager.snapshot() for agent in env_slot.agents]
+        self.agent_states = [agent_state(agent) for agent in env_slot.agents]
+        self.frame_collector = env_slot.frame_collector.snapshot()
+
+    # Put env_slot back to this snapshot with state_dicts of frame_no returned by env.resume, False when the frame
+    # collector can no longer go back to it
+    # 用env.resume返回的frame_no帧的state_dicts将env_slot恢复到该快照，帧收集器已无法恢复到该快照时返回False
+    def restore(self, env_slot, state_dicts):
+        if not env_slot.frame_collector.restore(self.frame_collector):
+            return False
+        for state_dict, agent, reward_manager in zip(state_dicts, env_slot.agents, self.reward_managers):
+            state_dict["reward"] = agent.reward_manager.restore(reward_manager)
+        for agent, state in zip(env_slot.agents, self.agent_states):
+            restore_agent_state(agent, state)
+        env_slot.state_dicts = state_dicts
+        env_slot.frame_no = self.frame_no
+        env_slot.step = self.step
+        env_slot.actions = None if self.actions is None else list(self.actions)
+        env_slot.total_reward_dicts = [dict(total_reward_dict) for total_reward_dict in self.total_reward_dicts]
+        return True
+
+
+# Whether the environment declares supports_resume, then its resume(frame_no) returns (frame_no, state_dicts) of an
+# earlier frame of the running episode like reset
+# 环境是否声明了supports_resume，此时其resume(frame_no)与reset一样返回当前对局中之前某帧的(frame_no, state_dicts)
+def supports_resume(env):
+    return getattr(env, "supports_resume", False)
+
+
+# Take an EpisodeSnapshot of env_slot every GameConfig.EPISODE_SNAPSHOT_INTERVAL steps if its environment supports
+# resume and its frame collector supports snapshots
+# 环境支持resume且帧收集器支持快照时，每GameConfig.EPISODE_SNAPSHOT_INTERVAL步为env_slot保存一次EpisodeSnapshot
+def snapshot_episode(env_slot):
+    interval = GameConfig.EPISODE_SNAPSHOT_INTERVAL
+    if (
+        interval > 0
+        and env_slot.step % interval == 0
+        and supports_resume(env_slot.env)
+        and hasattr(env_slot.frame_collector, "snapshot")
+    ):
+        env_slot.episode_snapshot = EpisodeSnapshot(env_slot)
+
+
+# After env.step failed, continue the episode of env_slot from its last snapshot when the environment supports resume.
+# Returns whether the episode goes on
+# env.step失败后，环境支持resume时从最近的快照继续env_slot的对局。返回对局是否继续
+def resume_episode(env_slot, logger):
+    snapshot = env_slot.episode_snapshot
+    if not supports_resume(env_slot.env) or snapshot is None:
+        return False
+    try:
+        _, state_dicts = env_slot.env.resume(snapshot.frame_no)
+    except Exception as e:
+        logger.error(f"episode {env_slot.episode_cnt}, resume from frame {snapshot.frame_no} failed: {e}")
+        return False
+    if state_dicts is None or not snapshot.restore(env_slot, state_dicts):
+        return False
+    logger.info(f"episode {env_slot.episode_cnt} resumed from step {snapshot.step}, frame {snapshot.frame_no}")
+    return True
+
+
+# Turn the frames of a failed training episode into truncated samples with GameConfig.SALVAGE_FAILED_EPISODES, when the
+# frame collector supports it. Returns whether there are frames to learn
+# 开启GameConfig.SALVAGE_FAILED_EPISODES且帧收集器支持时，将失败的训练对局的帧截断为样本。返回是否有待训练的帧
+def salvage_episode(env_slot, logger):
+    truncate = getattr(env_slot.frame_collector, "truncate", None)
+    if not GameConfig.SALVAGE_FAILED_EPISODES or env_slot.is_eval or truncate is None:
+        return False
+    salvaged = truncate()
+    if salvaged:
+        logger.info(f"episode {env_slot.episode_cnt} salvaged {len(env_slot.frame_collector)} truncated frames")
+    return salvaged
+
+
+# Run func(*args), recorded as a span of stage when timeline is given
+# 执行func(*args)，提供timeline时记录为stage的一个区间
+def timed(timeline, stage, env_index, func, *args):
+    if timeline is None:
+        return func(*args)
+    return timeline.timed(stage, env_index, func, *args)
+
+
+# Add n to the counter name of timeline when it is given
+# 提供timeline时将其计数器name增加n
+def count(timeline, name, n=1):
+    if timeline is not None:
+        timeline.count(name, n)
+
+
+# Report the stage stats of the window ending with an episode, for every episode and not only eval ones
+# 上报截至本局结束的窗口内的各阶段统计，每局都上报而不仅是评估对局
+def report_stage_stats(timeline, monitor, logger):
+    if not isinstance(timeline, StageStats):
+        return
+    stage_data = timeline.report()
+    logger.info(f"stage stats:{stage_data}")
+    if monitor:
+        monitor.put_data({os.getpid(): stage_data})
+
+
+# Report the cost of each reward item in the episode summed over the agents of env_slot, with GameConfig.REWARD_PROFILE
+# 开启GameConfig.REWARD_PROFILE时，上报本局每个奖励子项的耗时，按env_slot的智能体求和
+def report_reward_profile(env_slot, monitor, logger):
+    if not GameConfig.REWARD_PROFILE:
+        return
+    profile_data = {}
+    for agent in env_slot.agents:
+        for reward_name, stats in (agent.reward_manager.profile_snapshot() or {}).items():
+            for phase in ("extract", "combine"):
+                calls_key, ms_key = f"reward_{reward_name}_{phase}_calls", f"reward_{reward_name}_{phase}_ms"
+                profile_data[calls_key] = profile_data.get(calls_key, 0) + stats[f"{phase}_calls"]
+                profile_data[ms_key] = round(profile_data.get(ms_key, 0) + stats[f"{phase}_time"] * 1e3, 3)
+    logger.info(f"reward profile:{profile_data}")
+    if monitor:
+        monitor.put_data({os.getpid(): profile_data})
+
+
+# Report the loads of model_cache and the load time it saved per hour
+# 上报model_cache的加载次数及其每小时节省的加载时间
+def report_model_cache(model_cache, monitor, logger):
+    if model_cache is None:
+        return
+    cache_data = model_cache.stats()
+    logger.info(f"model cache:{cache_data}")
+    if monitor:
+        monitor.put_data({os.getpid(): cache_data})
+
+
+def report_inference(inference_client, monitor, logger):
+    if inference_client is None:
+        return
+    inference_data = inference_client.stats()
+    logger.info(f"inference server:{inference_data}")
+    if monitor:
+        monitor.put_data({os.getpid(): inference_data})
+
+
+# Load model_id into the agent of env_slot, through model_cache when it is given. Agents predicting through the
+# inference server only record model_id. A (path, checkpoint id) model_id is a checkpoint of AsyncCheckpointer,
+# loaded without model_cache
+# 将model_id加载到env_slot的智能体，提供model_cache时经由其加载。经由推理服务预测的智能体只记录model_id。
+# (path, checkpoint id)形式的model_id为AsyncCheckpointer的checkpoint，不经由model_cache加载
+def load_model(env_slot, agent, model_id, model_cache, timeline, inference_client=None):
+    if inference_client is not None and inference_client.load(agent, model_id):
+        return
+    if model_cache is None or isinstance(model_id, tuple):
+        timed(timeline, "load_model", env_slot.index, load_model_id, agent, model_id)
+    else:
+        timed(timeline, "load_model", env_slot.index, model_cache.load, agent, model_id, env_slot.agents)
+
+
+# The save_frame stage includes build_frame, which is also timed on its own
+# save_frame阶段包含build_frame，build_frame也单独计时
+def save_frame(env_slot, index, timeline=None):
+    agent, state_dict = env_slot.agents[index], env_slot.state_dicts[index]
+    frame = timed(timeline, "build_frame", env_slot.index, build_frame, agent, state_dict)
+    env_slot.frame_collector.save_frame(frame, agent_id=index)
+
+
+# build_frame and save_frame of the agents that predicted a training action before env.step
+# env.step之前对预测了训练动作的智能体执行build_frame和save_frame
+def save_frames(env_slots, frames_to_save, timeline):
+    for env_slot, index in frames_to_save:
+        timed(timeline, "save_frame", env_slot.index, save_frame, env_slot, index, timeline)
+
+
+# Predict the actions of the agents of all environments, stacked into one model call per agent of the framework, or
+# one call of the inference server when they predict through it. When the inference server fails the agents load their
+# models and predict locally
+# 预测所有环境中智能体的动作，框架的每个智能体合并为一次模型调用，经由推理服务预测时合并为一次推理服务调用。
+# 推理服务失败时智能体加载各自的模型并在本地预测
+def batch_predict(agents, state_dicts, is_eval, inference_client=None):
+    if inference_client is not None and all(agent in inference_client.model_ids for agent in agents):
+        try:
+            return inference_client.predict(agents, state_dicts, is_eval)
+        except Exception:
+            inference_client.fall_back(agents)
+    return predict_actions(agents, state_dicts, is_eval)
+
+
+# Reward generation, both agents share the index of the same game frame. total_reward_dicts adds up the reward of
+# every frame, while an agent with a decision interval gets the rewards summed since its last decision on the frames
+# it decides and on the last frame
+# 计算回报，作为当前环境状态state_dicts的一部分，双方智能体共享同一帧的索引。total_reward_dicts累加每一帧的回报，
+# 有决策间隔的智能体在其决策的帧和最后一帧得到自上一次决策以来累加的回报
+def update_rewards(env_slot, last_frame=False):
+    state_dicts = env_slot.state_dicts
+    frame_index = FrameIndex(state_dicts[0]["frame_state"])
+    for i, agent in enumerate(env_slot.agents):
+        reward = agent.reward_manager.result(state_dicts[i]["frame_state"], frame_index)
+        total_reward_dict = env_slot.total_reward_dicts[i]
+        for key, value in reward.items():
+            if key in total_reward_dict:
+                total_reward_dict[key] += value
+            else:
+                total_reward_dict[key] = value
+        if env_slot.decision_intervals[i] > 1 and (last_frame or deciding(env_slot, i)):
+            reward = agent.reward_manager.take_accumulated_reward()
+        state_dicts[i]["reward"] = reward
+
+
+# Whether agent index of env_slot predicts at the current step, every agent decides on the first step
+# env_slot的第index个智能体在当前步是否预测，所有智能体在第一步都会决策
+def deciding(env_slot, index):
+    return env_slot.step % env_slot.decision_intervals[index] == 0
+
+
+# Actions of env_slot before predict, NONE_ACTION for the agents deciding at this step and the last action for the
+# others, which repeat it until their next decision
+# env_slot在预测前的动作，当前步决策的智能体为NONE_ACTION，其余智能体重复上一次的动作直到下一次决策
+def repeat_actions(env_slot, agent_num):
+    if env_slot.step == 0 or env_slot.actions is None:
+        return [NONE_ACTION] * agent_num
+    return [NONE_ACTION if deciding(env_slot, index) else action for index, action in enumerate(env_slot.actions)]
+
+
+# Decision interval of GameConfig.DECISION_INTERVAL for the hero of state_dict, 1 for heroes not listed
+# state_dict中英雄在GameConfig.DECISION_INTERVAL中的决策间隔，未列出的英雄为1
+def decision_interval_of(state_dict):
+    for hero in state_dict["frame_state"]["hero_states"]:
+        if hero["player_id"] == state_dict["player_id"]:
+            return max(1, GameConfig.DECISION_INTERVAL.get(hero["actor_state"].get("config_id"), 1))
+    return 1
+
+
+# Start a new episode in env_slot, returns the updated episode counter
+# 在env_slot中启动新对局，返回更新后的对局计数器
+def start_episode(
+    env_slot,
+    episode_cnt,
+    lineup_iter,
+    random_eval_start,
+    logger,
+    timeline=None,
+    model_cache=None,
+    inference_client=None,
+    train_model="latest",
+):
+    # Settings before starting a new environment
+    # 以下是启动一个新对局前的设置
+    agents = env_slot.agents
+    model_id = "31694"
 
-        # Set the id of the agent to be trained. id=0 means the blue side, id=1 means the red side.
-        # 设置要训练的智能体的id，id=0表示蓝方，id=1表示红方，每一局都切换一次阵营。默认对手智能体是selfplay即自己
-        train_agent_id = 1 - train_agent_id
+    # Set the id of the agent to be trained. id=0 means the blue side, id=1 means the red side.
+    # 设置要训练的智能体的id，id=0表示蓝方，id=1表示红方，每一局都切换一次阵营。默认对手智能体是selfplay即自己
+    train_agent_id = env_slot.train_agent_id = 1 - env_slot.train_agent_id
+    opponent_agent = "common_ai"
+    #opponent_agent = model_id
+
+    # Evaluate at a certain frequency during training to reflect the improvement of the agent during training
+    # 智能体支持边训练边评估，训练中按一定的频率进行评估，反映智能体在训练中的水平
+    is_eval = (episode_cnt + random_eval_start) % GameConfig.EVAL_FREQ == 0
+    if env_slot.eval_mode is not None:
+        is_eval = env_slot.eval_mode
+    if is_eval:
+        # The model used by the opponent: "common_ai" - rule-based agent, model_id - opponent model ID, see kaiwu.json for details
+        # 设置评估时的对手智能体类型，默认采用了common_ai，可选择: "common_ai" - 基于规则的智能体, model_id - 对手模型的ID, 模型ID内容可在kaiwu.json里查看和设置
         opponent_agent = "common_ai"
         #opponent_agent = model_id
-
-        # Evaluate at a certain frequency during training to reflect the improvement of the agent during training
-        # 智能体支持边训练边评估，训练中按一定的频率进行评估，反映智能体在训练中的水平
-        is_eval = (episode_cnt + random_eval_start) % GameConfig.EVAL_FREQ == 0
-        if is_eval:
-            # The model used by the opponent: "common_ai" - rule-based agent, model_id - opponent model ID, see kaiwu.json for details
-            # 设置评估时的对手智能体类型，默认采用了common_ai，可选择: "common_ai" - 基于规则的智能体, model_id - 对手模型的ID, 模型ID内容可在kaiwu.json里查看和设置
-            opponent_agent = "common_ai"
-            #opponent_agent = model_id
-            # opponent_agent_list = ["common_ai", "25649"]
-            # opponent_agent = opponent_agent_list[random.randint(0,len(opponent_agent_list)-1)]
-
-        # Generate a new set of agent configurations
-        # 生成一组新的智能体配置
-        heroes_config = next(lineup_iter)
-
-        usr_conf = {
-            "diy": {
-                # The side reporting the environment metrics
-                # 上报对局指标的阵营
-                "monitor_side": train_agent_id,
-                # The label for reporting environment metrics: selfplay - "selfplay", common_ai - "common_ai", opponent model - model_id
-                # 上报对局指标的标签： 自对弈 - "selfplay", common_ai - "common_ai", 对手模型 - model_id
-                "monitor_label": opponent_agent,
-                # Indicates the lineups used by both sides
-                # 表示双方使用的阵容
-                "lineups": heroes_config,
-            }
+        # opponent_agent_list = ["common_ai", "25649"]
+        # opponent_agent = opponent_agent_list[random.randint(0,len(opponent_agent_list)-1)]
+
+    # Generate a new set of agent configurations
+    # 生成一组新的智能体配置
+    heroes_config = next(lineup_iter)
+
+    usr_conf = {
+        "diy": {
+            # The side reporting the environment metrics
+            # 上报对局指标的阵营
+            "monitor_side": train_agent_id,
+            # The label for reporting environment metrics: selfplay - "selfplay", common_ai - "common_ai", opponent model - model_id
+            # 上报对局指标的标签： 自对弈 - "selfplay", common_ai - "common_ai", 对手模型 - model_id
+            "monitor_label": opponent_agent,
+            # Indicates the lineups used by both sides
+            # 表示双方使用的阵容
+            "lineups": heroes_config,
         }
-
-        if train_agent_id not in [0, 1]:
-            raise Exception("monitor_side is not valid, valid monitor_side list is [0, 1], please check")
-
-        # Start a new environment
-        # 启动新对局，返回初始环境状态
-        _, state_dicts = env.reset(usr_conf=usr_conf)
-        if state_dicts is None:
-            logger.info(f"episode {episode_cnt}, reset is None happened!")
-            continue
-
-        # Game variables
-        # 对局变量
-        episode_cnt += 1
-        frame_no = 0
-        step = 0
-        # Record the cumulative rewards of the agent in the environment
-        # 记录对局中智能体的累积回报，用于上报监控
-        total_reward_dicts = [{}, {}]
-        logger.info(f"Episode {episode_cnt} start, usr_conf is {usr_conf}")
-
-        # Reset agent
-        # 重置agent
-
-        # The 'do_predicts' specifies which agents are to perform model predictions.
-        # Since the default opponent model is 'selfplay', it is set to [True, True] by default.
-        # do_predicts指定哪些智能体要进行模型预测，由于默认对手模型是selfplay，默认设置[True, True]
-        do_predicts = [True, True]
-        for i, agent in enumerate(agents):
-            player_id = state_dicts[i]["player_id"]
-            camp = state_dicts[i]["player_camp"]
-            agent.reset(camp, player_id)
-
-            # The agent to be trained should load the latest model
-            # 要训练的智能体应加载最新的模型
-            if i == train_agent_id:
-                # train_agent_id uses the latest model
-                # train_agent_id 使用最新模型
-                agent.load_model(id="latest")
+    }
+
+    if train_agent_id not in [0, 1]:
+        raise Exception("monitor_side is not valid, valid monitor_side list is [0, 1], please check")
+
+    # Start a new environment
+    # 启动新对局，返回初始环境状态
+    _, state_dicts = timed(timeline, "env_reset", env_slot.index, lambda: env_slot.env.reset(usr_conf=usr_conf))
+    if state_dicts is None:
+        logger.info(f"episode {episode_cnt}, reset is None happened!")
+        return episode_cnt
+
+    # Game variables
+    # 对局变量
+    episode_cnt += 1
+    env_slot.running = True
+    env_slot.episode_cnt = episode_cnt
+    env_slot.is_eval = is_eval
+    env_slot.state_dicts = state_dicts
+    env_slot.frame_no = 0
+    env_slot.step = 0
+    env_slot.episode_snapshot = None
+    # Record the cumulative rewards of the agent in the environment
+    # 记录对局中智能体的累积回报，用于上报监控
+    env_slot.total_reward_dicts = [{} for _ in agents]
+    logger.info(f"Episode {episode_cnt} start, usr_conf is {usr_conf}")
+
+    # Reset agent
+    # 重置agent
+
+    # The 'do_predicts' specifies which agents are to perform model predictions.
+    # Since the default opponent model is 'selfplay', it is set to [True, True] by default.
+    # do_predicts指定哪些智能体要进行模型预测，由于默认对手模型是selfplay，默认设置[True, True]
+    do_predicts = env_slot.do_predicts = [True] * len(agents)
+    env_slot.decision_intervals = [decision_interval_of(state_dict) for state_dict in state_dicts]
+    for i, agent in enumerate(agents):
+        player_id = state_dicts[i]["player_id"]
+        camp = state_dicts[i]["player_camp"]
+        agent.reset(camp, player_id)
+        agent.reward_manager.set_accumulate(env_slot.decision_intervals[i] > 1)
+
+        # The agent to be trained should load the latest model
+        # 要训练的智能体应加载最新的模型
+        if i == train_agent_id:
+            # train_agent_id uses the latest model, eval actors may give a checkpoint instead
+            # train_agent_id 使用最新模型，评估actor可以指定checkpoint
+            load_model(env_slot, agent, train_model, model_cache, timeline, inference_client)
+        else:
+            if opponent_agent == "common_ai":
+                # common_ai does not need to load a model, no need to predict
+                # 如果对手是 common_ai 则不需要加载模型, 也不需要进行预测
+                do_predicts[i] = False
+            elif opponent_agent == "selfplay":
+                # Training model, "latest" - latest model, "random" - random model from the model pool
+                # 加载训练过的模型，可以选择最新模型，也可以选择随机模型 "latest" - 最新模型, "random" - 模型池中随机模型
+                load_model(env_slot, agent, "latest", model_cache, timeline, inference_client)
             else:
-                if opponent_agent == "common_ai":
-                    # common_ai does not need to load a model, no need to predict
-                    # 如果对手是 common_ai 则不需要加载模型, 也不需要进行预测
-                    do_predicts[i] = False
-                elif opponent_agent == "selfplay":
-                    # Training model, "latest" - latest model, "random" - random model from the model pool
-                    # 加载训练过的模型，可以选择最新模型，也可以选择随机模型 "latest" - 最新模型, "random" - 模型池中随机模型
-                    agent.load_model(id="latest")
-                else:
-                    # Opponent model, model_id is checked from kaiwu.json
-                    # 选择kaiwu.json中设置的对手模型, model_id 即 opponent_agent，必须设置正确否则报错
+                # Opponent model, model_id is checked from kaiwu.json
+                # 选择kaiwu.json中设置的对手模型, model_id 即 opponent_agent，必须设置正确否则报错
+                if model_cache is None:
                     eval_candidate_model = get_valid_model_pool(logger)
-                    if int(opponent_agent) not in eval_candidate_model:
-                        raise Exception(f"model_id {opponent_agent} not in {eval_candidate_model}")
-                    else:
-                        agent.load_model(id=opponent_agent)
-
-            logger.info(f"agent_{i} reset playerid:{player_id} camp:{camp}")
-
-        # Reward initialization
-        # 回报初始化，作为当前环境状态state_dicts的一部分
-        for i in range(agent_num):
-            reward = agents[i].reward_manager.result(state_dicts[i]["frame_state"])
-            state_dicts[i]["reward"] = reward
-            for key, value in reward.items():
-                if key in total_reward_dicts[i]:
-                    total_reward_dicts[i][key] += value
                 else:
-                    total_reward_dicts[i][key] = value
-
-        # Reset environment frame collector
-        # 重置环境帧收集器
-        frame_collector.reset(num_agents=agent_num)
-
-        while True:
-            # Initialize the default actions. If the agent does not make a decision, env.step uses the default action.
-            # 初始化默认的actions，如果智能体不进行决策，则env.step使用默认action
-            actions = [
-                NONE_ACTION,
-            ] * agent_num
-
-            for index, (d_predict, agent) in enumerate(zip(do_predicts, agents)):
-                if d_predict:
-                    if not is_eval:
-                        actions[index] = agent.train_predict(state_dicts[index])
-                    else:
-                        actions[index] = agent.eval_predict(state_dicts[index])
-
-                    # Only when do_predict=True and is_eval=False, the agent's environment data is saved.
-                    # 仅do_predict=True且is_eval=False时，智能体的对局数据保存。即评估对局数据不训练，不是最新模型产生的数据不训练
-                    if not is_eval:
-                        frame = build_frame(agent, state_dicts[index])
-                        frame_collector.save_frame(frame, agent_id=index)
-
-            """
-            The format of action is like [[2, 10, 1, 14, 8, 0], [1, 3, 10, 10, 9, 0]]
-            There are 2 agents, so the length of the array is 2, and the order of values in
-            each element is: button, move (2), skill (2), target
-            action格式形如[[2, 10, 1, 14, 8, 0], [1, 3, 10, 10, 9, 0]]
-            2个agent, 故数组的长度为2, 每个元素里面的值的顺序是:button, move(2个), skill(2个), target
-            """
-
-            # Step forward
-            # 推进环境到下一帧，得到新的状态
-            frame_no, _, _, terminated, truncated, state_dicts = env.step(actions)
-
-            # Disaster recovery
-            # 容灾
-            if state_dicts is None:
-                logger.info(f"episode {episode_cnt}, step({step}) is None happened!")
-                break
-
-            # Reward generation
-            # 计算回报，作为当前环境状态state_dicts的一部分
-            for i in range(agent_num):
-                reward = agents[i].reward_manager.result(state_dicts[i]["frame_state"])
-                state_dicts[i]["reward"] = reward
-                for key, value in reward.items():
-                    if key in total_reward_dicts[i]:
-                        total_reward_dicts[i][key] += value
-                    else:
-                        total_reward_dicts[i][key] = value
-            #print(reward)
-            step += 1
-
-            # Normal end or timeout exit
-            # 正常结束或超时退出
-            if terminated or truncated:
-                logger.info(
-                    f"episode_{episode_cnt} terminated in fno_{frame_no}, truncated:{truncated}, eval:{is_eval}, total_reward_dicts:{total_reward_dicts}"
-                )
-                # Reward for saving the last state of the environment
-                # 保存环境最后状态的reward
-                for index, (d_predict, agent) in enumerate(zip(do_predicts, agents)):
-                    if d_predict and not is_eval:
-                        
-                        frame_data=state_dicts[index]["frame_state"]
-                        camp = state_dicts[index]["player_camp"]
-                        npc_list = frame_data["npc_states"]
-                        main_tower = None
-                        enemy_tower = None
-                        for organ in npc_list:
-                            organ_camp = organ["camp"]
-                            organ_subtype = organ["sub_type"]
-                            if organ_camp == camp:
-                                if organ_subtype == "ACTOR_SUB_TOWER":  # 21 is ACTOR_SUB_TOWER, normal tower
-                                    main_tower = organ
-                                # elif organ_subtype == "ACTOR_SUB_CRYSTAL":  # 24 is ACTOR_SUB_CRYSTAL, base crystal
-                                #     main_spring = organ
-                                # elif organ_subtype == "ACTOR_SUB_SOLDIER":
-                                #     self.main_soldiers.append(organ)
-                            else:
-                                if organ_subtype == "ACTOR_SUB_TOWER":  # 21 is ACTOR_SUB_TOWER, normal tower
-                                    enemy_tower = organ
-                                # elif organ_subtype == "ACTOR_SUB_CRYSTAL":  # 24 is ACTOR_SUB_CRYSTAL, base crystal
-                                #     enemy_spring = organ
-                                # elif organ_subtype == "ACTOR_SUB_SOLDIER":
-                                #     self.enemy_soldiers.append(organ)
-                        if main_tower == None or main_tower['hp'] <= enemy_tower['hp']:
-                            r = -15 * (1 - frame_no / 20000)
-                        elif enemy_tower == None or main_tower['hp']>enemy_tower['hp']:
-                            r = 15 * (1 - frame_no / 20000)
-
-
-                        frame_collector.save_last_frame(
-                            agent_id=index,
-                            
-                            reward=state_dicts[index]["reward"]["reward_sum"]+r,
-                        )
-
-                monitor_data = {
-                    "reward": round(total_reward_dicts[train_agent_id]["reward_sum"], 2),
-                    "diy1": round(total_reward_dicts[train_agent_id]["forward"], 2),
-                    "diy2": round(total_reward_dicts[train_agent_id]["tower_hp_point"], 2),
-                }
-
-                if monitor and is_eval:
-                    monitor.put_data({os.getpid(): monitor_data})
-
-                # Sample process
-                # 进行样本处理，准备训练
-                if len(frame_collector) > 0 and not is_eval:
-                    list_agents_samples = sample_process(frame_collector)
-                    yield list_agents_samples
-                break
+                    eval_candidate_model = model_cache.valid_model_pool(logger)
+                if int(opponent_agent) not in eval_candidate_model:
+                    raise Exception(f"model_id {opponent_agent} not in {eval_candidate_model}")
+                else:
+                    load_model(env_slot, agent, opponent_agent, model_cache, timeline, inference_client)
+
+        logger.info(f"agent_{i} reset playerid:{player_id} camp:{camp}")
+
+    # Reward initialization
+    # 回报初始化
+    update_rewards(env_slot)
+
+    # Reset environment frame collector
+    # 重置环境帧收集器
+    env_slot.frame_collector.reset(num_agents=len(agents))
+    return episode_cnt
+
+
+# Handle the result of env.step for env_slot, returns True when a training episode ends with frames to learn
+# 处理env_slot的env.step结果，训练对局结束且有待训练的帧时返回True
+def step_episode(env_slot, step_result, logger, monitor, timeline=None, sample_pipeline=None):
+    episode_cnt = env_slot.episode_cnt
+    is_eval = env_slot.is_eval
+    train_agent_id = env_slot.train_agent_id
+    frame_collector = env_slot.frame_collector
+    total_reward_dicts = env_slot.total_reward_dicts
+
+    """
+    The format of action is like [[2, 10, 1, 14, 8, 0], [1, 3, 10, 10, 9, 0]]
+    There are 2 agents, so the length of the array is 2, and the order of values in
+    each element is: button, move (2), skill (2), target
+    action格式形如[[2, 10, 1, 14, 8, 0], [1, 3, 10, 10, 9, 0]]
+    2个agent, 故数组的长度为2, 每个元素里面的值的顺序是:button, move(2个), skill(2个), target
+    """
+
+    # Step forward, env.step has been called by run_env_slots
+    # 推进环境到下一帧，得到新的状态，env.step已由run_env_slots调用
+    frame_no, _, _, terminated, truncated, state_dicts = step_result
+
+    # Disaster recovery, continue from the last snapshot or salvage the frames collected so far
+    # 容灾，从最近的快照继续，或保留已收集的帧
+    if state_dicts is None:
+        logger.info(f"episode {episode_cnt}, step({env_slot.step}) is None happened!")
+        if resume_episode(env_slot, logger):
+            return False
+        env_slot.running = False
+        return salvage_episode(env_slot, logger)
+
+    env_slot.frame_no = frame_no
+    env_slot.state_dicts = state_dicts
+    env_slot.step += 1
+
+    # Normal end or timeout exit
+    # 正常结束或超时退出
+    if not (terminated or truncated):
+        timed(timeline, "reward", env_slot.index, update_rewards, env_slot)
+        return False
+
+    # The rewards of the last frame count in the final reward and the monitor data
+    # 最后一帧的回报计入最终奖励和监控上报
+    timed(timeline, "reward", env_slot.index, update_rewards, env_slot, True)
+
+    env_slot.running = False
+    logger.info(
+        f"episode_{episode_cnt} terminated in fno_{frame_no}, truncated:{truncated}, eval:{is_eval}, total_reward_dicts:{total_reward_dicts}"
+    )
+
+    # Reward for saving the last state of the environment
+    # 保存环境最后状态的reward
+    for index, (d_predict, agent) in enumerate(zip(env_slot.do_predicts, env_slot.agents)):
+        if d_predict and not is_eval:
+
+            frame_data=state_dicts[index]["frame_state"]
+            camp = state_dicts[index]["player_camp"]
+            npc_list = frame_data["npc_states"]
+            main_tower = None
+            enemy_tower = None
+            for organ in npc_list:
+                organ_camp = organ["camp"]
+                organ_subtype = organ["sub_type"]
+                if organ_camp == camp:
+                    if organ_subtype == "ACTOR_SUB_TOWER":  # 21 is ACTOR_SUB_TOWER, normal tower
+                        main_tower = organ
+                    # elif organ_subtype == "ACTOR_SUB_CRYSTAL":  # 24 is ACTOR_SUB_CRYSTAL, base crystal
+                    #     main_spring = organ
+                    # elif organ_subtype == "ACTOR_SUB_SOLDIER":
+                    #     self.main_soldiers.append(organ)
+                else:
+                    if organ_subtype == "ACTOR_SUB_TOWER":  # 21 is ACTOR_SUB_TOWER, normal tower
+                        enemy_tower = organ
+                    # elif organ_subtype == "ACTOR_SUB_CRYSTAL":  # 24 is ACTOR_SUB_CRYSTAL, base crystal
+                    #     enemy_spring = organ
+                    # elif organ_subtype == "ACTOR_SUB_SOLDIER":
+                    #     self.enemy_soldiers.append(organ)
+            if main_tower == None or main_tower['hp'] <= enemy_tower['hp']:
+                r = -15 * (1 - frame_no / 20000)
+            elif enemy_tower == None or main_tower['hp']>enemy_tower['hp']:
+                r = 15 * (1 - frame_no / 20000)
+
+
+            frame_collector.save_last_frame(
+                agent_id=index,
+
+                reward=state_dicts[index]["reward"]["reward_sum"]+r,
+            )
+
+    monitor_data = {
+        "reward": round(total_reward_dicts[train_agent_id]["reward_sum"], 2),
+        # Reward items of weight 0 are not computed and may be missing
+        # 权重为0的奖励子项不计算，可能不存在
+        "diy1": round(total_reward_dicts[train_agent_id].get("forward", 0), 2),
+        "diy2": round(total_reward_dicts[train_agent_id].get("tower_hp_point", 0), 2),
+    }
+    if sample_pipeline is not None:
+        # Episodes waiting for sample_process and learn
+        # 等待sample_process和learn的对局数
+        monitor_data["diy3"] = sample_pipeline.queue_depth()
+
+    if monitor and is_eval:
+        monitor.put_data({os.getpid(): monitor_data})
+
+    # Sample process is left to the caller, so that it can run in the background
+    # 样本处理交给调用方，以便在后台执行
+    return len(frame_collector) > 0 and not is_eval